@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import os
 import sys
 import traceback
@@ -13,6 +14,8 @@ from src.ui.windows.main import MainWindow
 from src.version import version_string
 
 if __name__ == "__main__":
+    # Пул процессов (проверка файла импорта) в собранном приложении запускает этот же exe
+    multiprocessing.freeze_support()
     app = wx.App(False, useBestVisual=True)
 
     def show_exception(e: Exception):
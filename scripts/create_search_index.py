@@ -0,0 +1,30 @@
+"""
+Создает расширение pg_trgm и триграммные индексы по названиям объектов для поиска в дереве объектов.
+Выполняется администратором БД один раз (и после восстановления БД), пользователю с правом создавать расширения
+"""
+
+import os
+import sys
+
+import wx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.database import connect
+from src.objects.search import ObjectSearch, create_search_index
+from src.ui.windows.login import LoginDialog
+
+app = wx.App(False)
+dlg = LoginDialog(None, without_config=True)
+if dlg.ShowModal() != wx.ID_OK:
+    exit(0)
+connect(dlg.login, dlg.password, dlg.host, dlg.port, dlg.database)
+dlg.Destroy()
+
+missing = ObjectSearch().check_index()
+if len(missing) == 0:
+    print("Все индексы уже созданы")
+    exit(0)
+print("Создание индексов: %s" % ", ".join(missing))
+create_search_index(missing)
+print("Готово")
@@ -17,15 +17,14 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.database import (
     PmPerformedTask,
-    PmProperty,
     PMSample,
     PmSamplePropertyValue,
     PMSampleSet,
-    PmTaskMethodForSample,
-    PmTestEquipment,
-    PmTestMethod,
     connect,
 )
+from src.pm.aliases import NameAliases
+from src.pm.bulk_writer import PmValuesBulkWriter
+from src.pm.import_resolver import FmsImportResolver
 from src.ui.windows.login import LoginDialog
 
 app = wx.App(False)
@@ -45,12 +44,14 @@ if dlg.ShowModal() != wx.ID_OK:
     exit(0)
 file_path = dlg.GetPath()
 
-with db_session:
-
+with db_session(ddl=True):
     pm_samples = select(s for s in PMSample).prefetch(PMSample.pm_sample_set, PMSampleSet.pm_test_series)[:]
-    pm_properties = select(s for s in PmProperty)[:]
-    pm_methods = select(s for s in PmTestMethod)[:]
-    pm_equipments = select(s for s in PmTestEquipment)[:]
+    pm_property_values = {
+        (sample, property, method): value
+        for sample, property, method, value in select(
+            (v.pm_sample, v.pm_property, v.pm_test_method, v.Value) for v in PmSamplePropertyValue
+        )
+    }
 
     threshold = 90
 
@@ -68,32 +69,20 @@ with db_session:
                 return result
         return None
 
-    def find_property(name):
-        global pm_properties
-        r = process.extractOne(name, [a.Name for a in pm_properties], scorer=fuzz.ratio, score_cutoff=threshold)
-        if r is None:
-            return None
-        return pm_properties[r[2]]
-
-    def find_method(name):
-        global pm_methods
-        r = process.extractOne(name, [a.Name for a in pm_methods], scorer=fuzz.ratio, score_cutoff=threshold)
-        if r is None:
-            return None
-        return pm_methods[r[2]]
-
-    def find_equipment(name):
-        global pm_equipments
-        r = process.extractOne(name, [a.Name for a in pm_equipments], scorer=fuzz.ratio, score_cutoff=threshold)
-        if r is None:
-            return None
-        return pm_equipments[r[2]]
+    # Свойства, методы и оборудование сначала ищутся среди сопоставлений, запомненных прошлыми импортами
+    datadir = os.path.expanduser(os.path.expandvars(os.environ.get("GEOMECH_CONFDIR", "~/.geomech")))
+    aliases = NameAliases(os.path.join(datadir, "fms_aliases.json"))
+    resolver = FmsImportResolver(threshold, aliases)
+    find_property = resolver.find_property
+    find_method = resolver.find_method
+    find_equipment = resolver.find_equipment
 
     samples_not_found = []
     props_not_found = []
     methods_not_found = []
     equipment_not_found = []
 
+    values = []
     df = pd.read_csv(file_path, sep=";", encoding="utf-8-sig", header=0, dtype=str)
     for row in df.iterrows():
         sample = find_sample(row[1][2], row[1][1], row[1][0])
@@ -116,13 +105,10 @@ with db_session:
         else:
             equipment = None
         value = float(row[1][6])
-        if PmTaskMethodForSample.get(pm_sample=sample, pm_method=method, pm_performed_task=PmPerformedTask[1]) is None:
-            PmTaskMethodForSample(pm_sample=sample, pm_method=method, pm_performed_task=PmPerformedTask[1])
-        pm_property_value = PmSamplePropertyValue.get(pm_sample=sample, pm_property=property, pm_test_method=method)
-        if pm_property_value is None:
-            PmSamplePropertyValue(pm_sample=sample, pm_property=property, pm_test_method=method, Value=value)
-        else:
-            if pm_property_value.Value != value:
+        values.append((sample, property, method, value))
+        stored_value = pm_property_values.get((sample, property, method))
+        if stored_value is not None:
+            if stored_value != value:
                 print(
                     "Обновление значения свойства для образца ",
                     sample.Number,
@@ -134,7 +120,7 @@ with db_session:
                     property.Name,
                     " ",
                     method.Name,
-                    pm_property_value.Value,
+                    stored_value,
                     "->",
                     value,
                 )
@@ -155,3 +141,15 @@ with db_session:
     ):
         rollback()
         exit(1)
+
+    # Значения пишутся пакетами через COPY, существующие значения не меняются
+    writer = PmValuesBulkWriter(
+        overwrite=False, on_flush=lambda written, rate: print("Записано значений: %d (%d в секунду)" % (written, rate))
+    )
+    performed_task = PmPerformedTask[1]
+    for sample, property, method, value in values:
+        writer.add_task_method(sample, method, performed_task)
+        writer.set_value(sample, property, method, value)
+    writer.flush()
+    resolver.learn_aliases()
+    aliases.flush()
@@ -2,9 +2,16 @@
 Создает таблицу свойств близкую к PMSamplePropertyValues из переданого файла БД ФМС
 """
 
+import os
+import sys
+
 import pandas as pd
 import wx
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.pm.fms_reader import FmsWorkbookReader
+
 app = wx.App(False)
 dlg = wx.FileDialog(
     None,
@@ -50,44 +57,36 @@ PROPS = [
     ("Показатель абразивности", 79, 80, 81),
 ]
 SAMPLE_FIELDS = [("Набор испытаний", 1), ("Проба", 9), ("Образец", 14)]
-column_list = []
-df_column = pd.read_excel(file_path, 0).columns
-for i in df_column:
-    column_list.append(i)
-converter = {col: str for col in column_list}
-df = pd.read_excel(file_path, sheet_name=0, header=0, converters=converter)
-
 rows = []
-for index, row in enumerate(df.iterrows()):
-    if index == 0:
-        continue
-    _new_row = []
-    _skip = False
-    _i = 0
-    for name, index in SAMPLE_FIELDS:
-        if not row[1][index] or isinstance(row[1][index], str) and row[1][index].strip() in ("", "-"):
-            print(_new_row, "skipped")
-            _skip = True
-            break
-        if _i == 0:
-            _new_row.append("№" + str(row[1][0]) + " " + ".".join(reversed(str(row[1][1]).split(" ")[0].split("-"))))
-        else:
-            _new_row.append(row[1][index])
-        _i += 1
-    if not _skip:
-        for name, index in HANDMADE_PROPS:
-            if not row[1][index] or isinstance(row[1][index], str) and row[1][index].strip() in ("", "-"):
-                continue
-            rows.append(_new_row + [name, "Физическая энциклопедия", "", row[1][index]])
-        for name, i_value, i_method, i_equipment in PROPS:
-            if not row[1][i_value] or isinstance(row[1][i_value], str) and row[1][i_value].strip() in ("", "-"):
-                continue
-            _props = []
-            _props.append(name)
-            _props.append(row[1][i_method])
-            _props.append(row[1][i_equipment])
-            _props.append(row[1][i_value])
-            rows.append(_new_row + _props)
+with FmsWorkbookReader(file_path) as reader:
+    for _, row in reader.rows():
+        _new_row = []
+        _skip = False
+        _i = 0
+        for name, index in SAMPLE_FIELDS:
+            if row[index].strip() in ("", "-"):
+                print(_new_row, "skipped")
+                _skip = True
+                break
+            if _i == 0:
+                _new_row.append("№" + row[0] + " " + ".".join(reversed(row[1].split(" ")[0].split("-"))))
+            else:
+                _new_row.append(row[index])
+            _i += 1
+        if not _skip:
+            for name, index in HANDMADE_PROPS:
+                if row[index].strip() in ("", "-"):
+                    continue
+                rows.append(_new_row + [name, "Физическая энциклопедия", "", row[index]])
+            for name, i_value, i_method, i_equipment in PROPS:
+                if row[i_value].strip() in ("", "-"):
+                    continue
+                _props = []
+                _props.append(name)
+                _props.append(row[i_method])
+                _props.append(row[i_equipment])
+                _props.append(row[i_value])
+                rows.append(_new_row + _props)
 
 
 column_names = [i[0] for i in SAMPLE_FIELDS] + ["Свойство", "Метод", "Оборудование", "Значение"]
@@ -14,6 +14,11 @@ def is_entity(o: object) -> bool:
     return isinstance(o, db.Entity)
 
 
+def queries_count() -> int:
+    """Количество запросов к БД, выполненных в текущем потоке."""
+    return sum(stat.db_count for stat in db.local_stats.values())
+
+
 class MineObject(db.Entity):
     _table_ = "MineObjects"
 
@@ -676,6 +681,37 @@ class PmSamplePropertyValue(db.Entity):
     def sp_own_type(self):
         return None
 
+    # Статистика проб (PMSampleSetPropertyValues) обновляется при любом изменении значений
+    def before_insert(self):
+        from src.pm.aggregates import sample_set_aggregates
+
+        sample_set_aggregates.value_inserting(self)
+
+    def after_insert(self):
+        from src.pm.aggregates import sample_set_aggregates
+
+        sample_set_aggregates.value_saved(self)
+
+    def before_update(self):
+        from src.pm.aggregates import sample_set_aggregates
+
+        sample_set_aggregates.value_saving(self, old=True)
+
+    def after_update(self):
+        from src.pm.aggregates import sample_set_aggregates
+
+        sample_set_aggregates.value_saved(self)
+
+    def before_delete(self):
+        from src.pm.aggregates import sample_set_aggregates
+
+        sample_set_aggregates.value_saving(self)
+
+    def after_delete(self):
+        from src.pm.aggregates import sample_set_aggregates
+
+        sample_set_aggregates.value_saved(self, deleted=True)
+
 
 class PmPerformedTask(db.Entity):
     _table_ = "PMPerformedTasks"
@@ -1,6 +1,6 @@
 import re
 from dataclasses import dataclass, field
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List
 
 import wx
 import wx.lib.agw.flatnotebook
@@ -14,12 +14,13 @@ from src.datetimeutil import decode_date
 from src.document.ui.choice import Choice as FoundationChoice
 from src.ui.grid import (
     EVT_GRID_EDITOR_STATE_CHANGED,
+    CellBlock,
     CellType,
     Column,
     FloatCellType,
     GridEditor,
-    Model,
     NumberCellType,
+    ObservableModel,
     StringCellType,
 )
 from src.ui.icon import get_icon
@@ -31,6 +32,8 @@ class _Row:
     o: any
     fields: Dict = field(default_factory=lambda: {})
     changed_fields: Dict = field(default_factory=lambda: {})
+    # Ошибки ячеек строки по id столбца, обновляются при изменении ячейки
+    errors: Dict = field(default_factory=lambda: {})
 
 
 class VecCellType(CellType):
@@ -73,15 +76,23 @@ class VecCellType(CellType):
         return isinstance(o, VecCellType)
 
 
-class DMModel(Model):
+class DMModel(ObservableModel):
     def __init__(self, core=None, config_provider=None) -> None:
         super().__init__()
         self._core = core
         self._config_provider = config_provider
         self._rows = []
         self._columns = self._build_columns()
+        # Индекс столбца -> id, чтобы не строить список ключей на каждое обращение к ячейке
+        self._column_ids = list(self._columns.keys())
         self._changed_columns = 0
         self._deleted_rows = []
+        # Строки с ошибками в ячейках и индекс номеров замеров для проверки уникальности, по id(row)
+        self._invalid_rows: Dict[int, _Row] = {}
+        self._sample_numbers: Dict[str, Dict[int, _Row]] = {}
+        self._duplicates = set()
+        # Номера строк по id(row), строятся при проверке и сбрасываются при вставке и удалении строк
+        self._row_positions: Dict[int, int] = None
         self.load()
 
     def _prepare_o(self, o):
@@ -146,6 +157,7 @@ class DMModel(Model):
             o: DischargeMeasurement
             for o in dm:
                 self._rows.append(self._prepare_o(o))
+        self._rebuild_validation()
 
     def _get_column_width(self, name):
         if self._config_provider is not None:
@@ -306,14 +318,42 @@ class DMModel(Model):
         return self._rows[row]
 
     def get_value_at(self, col: int, row: int) -> str:
-        _id = list(self._columns.keys()).__getitem__(col)
+        _id = self._column_ids[col]
         row = self._rows[row]
         return row.fields[_id] if _id not in row.changed_fields else row.changed_fields[_id]
 
     def set_value_at(self, col: int, row: int, value: str):
-        if self.get_value_at(col, row) != value:
-            _id = list(self._columns.keys()).__getitem__(col)
-            self._rows[row].changed_fields[_id] = value
+        if self._set_field(self._rows[row], self._column_ids[col], value):
+            self._notify_cells_changed([(row, col)])
+
+    def get_values(self, block: CellBlock) -> List[List[str]]:
+        ids = self._column_ids[block.left : block.right + 1]
+        table = []
+        for row in self._rows[block.top : block.bottom + 1]:
+            table.append([row.changed_fields[_id] if _id in row.changed_fields else row.fields[_id] for _id in ids])
+        return table
+
+    def set_values(self, block: CellBlock, table: List[List[str]]):
+        changed = []
+        for row_index, values in zip(block.rows(), table):
+            row = self._rows[row_index]
+            for col_index, value in zip(block.cols(), values):
+                if self._set_field(row, self._column_ids[col_index], value):
+                    changed.append((row_index, col_index))
+        if len(changed) > 0:
+            self._notify_cells_changed(changed)
+
+    def _set_field(self, row: _Row, _id, value: str) -> bool:
+        old_value = row.changed_fields[_id] if _id in row.changed_fields else row.fields[_id]
+        if old_value == value:
+            return False
+        if _id == "SampleNumber":
+            self._unindex_row(row)
+        row.changed_fields[_id] = value
+        if _id == "SampleNumber":
+            self._index_row(row)
+        self._check_cell(row, _id)
+        return True
 
     def insert_row(self, row: int):
         fields = {
@@ -338,17 +378,31 @@ class DMModel(Model):
             "SampleNumber": "",
             "RockType": "",
         }
-        self._rows.insert(row, _Row(None, fields, fields))
+        state = _Row(None, fields, fields)
+        self._check_row(state)
+        self._index_row(state)
+        self._rows.insert(row, state)
+        self._row_positions = None
+        self._notify_rows_inserted(row)
 
     def restore_row(self, row, state):
         if state.o is not None:
             self._deleted_rows.remove(state.o.RID)
         self._rows.insert(row, state)
+        self._row_positions = None
+        if len(state.errors) > 0:
+            self._invalid_rows[id(state)] = state
+        self._index_row(state)
+        self._notify_rows_inserted(row)
 
     def delete_row(self, row: int):
         if self._rows[row].o is not None:
             self._deleted_rows.append(self._rows[row].o.RID)
+        self._invalid_rows.pop(id(self._rows[row]), None)
+        self._unindex_row(self._rows[row])
         self._rows.__delitem__(row)
+        self._row_positions = None
+        self._notify_rows_removed(row)
 
     def total_rows(self) -> int:
         return len(self._rows)
@@ -359,39 +413,86 @@ class DMModel(Model):
                 return True
         return len(self._deleted_rows) > 0
 
+    def can_validate_incrementally(self) -> bool:
+        return True
+
+    def _get_field(self, row: _Row, _id) -> str:
+        return row.changed_fields[_id] if _id in row.changed_fields else row.fields[_id]
+
+    def _check_cell(self, row: _Row, _id):
+        col = self._columns[_id]
+        value = self._get_field(row, _id)
+        msg = None
+        if len(value) == 0:
+            if not col.optional:
+                msg = "Значение не должно быть пустым."
+        elif not col.cell_type.test_repr(value):
+            msg = 'Неподходящее значение для ячейки типа "%s"' % col.cell_type.get_type_descr()
+        if msg is not None:
+            row.errors[_id] = msg
+        else:
+            row.errors.pop(_id, None)
+        if len(row.errors) > 0:
+            self._invalid_rows[id(row)] = row
+        else:
+            self._invalid_rows.pop(id(row), None)
+
+    def _check_row(self, row: _Row):
+        for _id in self._column_ids:
+            self._check_cell(row, _id)
+
+    def _index_row(self, row: _Row):
+        value = self._get_field(row, "SampleNumber")
+        if len(value) == 0:
+            return
+        rows = self._sample_numbers.setdefault(value, {})
+        rows[id(row)] = row
+        if len(rows) > 1:
+            self._duplicates.add(value)
+
+    def _unindex_row(self, row: _Row):
+        value = self._get_field(row, "SampleNumber")
+        rows = self._sample_numbers.get(value)
+        if rows is None or id(row) not in rows:
+            return
+        del rows[id(row)]
+        if len(rows) < 2:
+            self._duplicates.discard(value)
+        if len(rows) == 0:
+            del self._sample_numbers[value]
+
+    def _rebuild_validation(self):
+        self._row_positions = None
+        self._invalid_rows = {}
+        self._sample_numbers = {}
+        self._duplicates = set()
+        for row in self._rows:
+            self._check_row(row)
+            self._index_row(row)
+
     def validate(self):
+        """
+        Собирает ошибки из результатов проверки ячеек, которые обновляются при каждом изменении,
+        и индекса номеров замеров. Сами значения здесь повторно не проверяются, номера строк
+        пересчитываются только после вставки или удаления строк, а не после правки ячеек.
+        """
+        if len(self._invalid_rows) == 0 and len(self._duplicates) == 0:
+            return []
+        if self._row_positions is None:
+            self._row_positions = {id(row): index for index, row in enumerate(self._rows)}
+        positions = self._row_positions
+        col_order = {_id: index for index, _id in enumerate(self._column_ids)}
         errors = []
-        for col in self._columns.values():
-            for row_index, row in enumerate(self._rows):
-                if col.id in row.changed_fields:
-                    value = row.changed_fields[col.id]
-                else:
-                    value = row.fields[col.id]
-                if len(value) == 0:
-                    if col.optional:
-                        continue
-                    else:
-                        _msg = "Значение не должно быть пустым."
-                        errors.append((col, row_index, _msg))
-                if len(value) > 0 and not col.cell_type.test_repr(value):
-                    _msg = 'Неподходящее значение для ячейки типа "%s"' % col.cell_type.get_type_descr()
-                    errors.append((col, row_index, _msg))
-
-        duplicates = {}
-        for index, row in enumerate(self._rows):
-            if "SampleNumber" in row.changed_fields:
-                _v = row.changed_fields["SampleNumber"]
-            else:
-                _v = row.fields["SampleNumber"]
-            if len(_v) == 0:
-                continue
-            if _v not in duplicates:
-                duplicates[_v] = []
-            duplicates[_v].append(index)
+        for row in self._invalid_rows.values():
+            for _id, msg in row.errors.items():
+                errors.append((col_order[_id], positions[id(row)], msg))
+        errors.sort(key=lambda x: (x[0], x[1]))
+        errors = [(self._columns[self._column_ids[col_index]], row_index, msg) for col_index, row_index, msg in errors]
+
         col = self._columns["SampleNumber"]
-        for indexes in duplicates.values():
-            if len(indexes) > 1:
-                errors.append((col, indexes[0], "Номер замера должен быть уникален"))
+        first_rows = sorted(min(positions[key] for key in self._sample_numbers[value]) for value in self._duplicates)
+        for row_index in first_rows:
+            errors.append((col, row_index, "Номер замера должен быть уникален"))
 
         return errors
 
@@ -471,6 +572,7 @@ class DMModel(Model):
                 o = DischargeMeasurement(**fields)
                 new_rows.append(self._prepare_o(o))
         self._rows = new_rows
+        self._rebuild_validation()
         commit()
         return True
 
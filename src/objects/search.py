@@ -0,0 +1,184 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from pony.orm import commit, db_session
+
+from src.database import BoreHole, MineObject, OrigSampleSet, Station, db
+
+KINDS = ["REGION", "ROCKS", "FIELD", "HORIZON", "EXCAVATION", "STATION", "BORE_HOLE", "STUFF", "DISPERSE"]
+
+ENTITY_BY_KIND = {
+    "REGION": MineObject,
+    "ROCKS": MineObject,
+    "FIELD": MineObject,
+    "HORIZON": MineObject,
+    "EXCAVATION": MineObject,
+    "STATION": Station,
+    "BORE_HOLE": BoreHole,
+    "STUFF": OrigSampleSet,
+    "DISPERSE": OrigSampleSet,
+}
+
+# Таблицы, по колонке "Name" которых строится триграммный индекс
+_INDEXED_TABLES = ["MineObjects", "Stations", "BoreHoles", "OrigSampleSets"]
+
+_SEARCH_SQL = """
+    WITH hits AS (
+        SELECT "Type" AS kind, "RID", "Name" FROM "MineObjects" WHERE "Name" ILIKE $pattern
+        UNION ALL
+        SELECT 'STATION', "RID", "Name" FROM "Stations" WHERE "Name" ILIKE $pattern
+        UNION ALL
+        SELECT 'BORE_HOLE', "RID", "Name" FROM "BoreHoles" WHERE "Name" ILIKE $pattern
+        UNION ALL
+        SELECT "SampleType", "RID", "Name" FROM "OrigSampleSets"
+        WHERE "SampleType" IN ('STUFF', 'DISPERSE') AND "Name" ILIKE $pattern
+    ), ranked AS (
+        SELECT kind, "RID", "Name",
+            count(*) OVER (PARTITION BY kind) AS total,
+            row_number() OVER (PARTITION BY kind ORDER BY %s DESC, "Name", "RID") AS pos
+        FROM hits
+        WHERE kind = ANY($kinds)
+    )
+    SELECT kind, "RID", "Name", total FROM ranked
+    WHERE pos > $offset AND pos <= $offset + $limit
+    ORDER BY kind, pos
+"""
+
+# Полное совпадение выше совпадения по началу, дальше по триграммному сходству (если доступно)
+_RANK_SQL = """(CASE WHEN lower("Name") = lower($q) THEN 2 WHEN "Name" ILIKE $prefix THEN 1 ELSE 0 END)"""
+_TRGM_RANK_SQL = _RANK_SQL + """ + similarity("Name", $q)"""
+
+
+class SearchCancelled(Exception): ...
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    rid: int
+    name: str
+
+
+@dataclass
+class SearchGroup:
+    kind: str
+    total: int = 0
+    hits: List[SearchHit] = field(default_factory=list)
+
+
+class ObjectSearch:
+    """
+    Поиск объектов по части названия сразу по всем типам одним запросом.
+    Использует триграммные индексы pg_trgm, если они созданы (create_search_index).
+    """
+
+    def __init__(self, page_size=100):
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._connections = []
+        self._cancelled = set()
+        self._use_trgm = None
+
+    def search(self, q: str, kinds: List[str], offset=0, limit=None) -> Dict[str, SearchGroup]:
+        if self._use_trgm is None:
+            self._use_trgm = self.prepare_index()
+        return self._search(q, kinds, offset, limit if limit is not None else self.page_size)
+
+    @db_session
+    def _search(self, q: str, kinds: List[str], offset: int, limit: int) -> Dict[str, SearchGroup]:
+        connection = db.get_connection()
+        with self._lock:
+            self._connections.append(connection)
+        try:
+            params = {
+                "q": q,
+                "pattern": "%" + _escape_like(q) + "%",
+                "prefix": _escape_like(q) + "%",
+                "kinds": list(kinds),
+                "offset": offset,
+                "limit": limit,
+            }
+            rows = db.select(_SEARCH_SQL % (_TRGM_RANK_SQL if self._use_trgm else _RANK_SQL), params)
+        except Exception as e:
+            if self._is_cancelled(connection):
+                raise SearchCancelled() from e
+            raise
+        finally:
+            with self._lock:
+                self._connections.remove(connection)
+                self._cancelled.discard(id(connection))
+        groups = {kind: SearchGroup(kind) for kind in kinds}
+        for kind, rid, name, total in rows:
+            group = groups[kind]
+            group.total = total
+            group.hits.append(SearchHit(kind, rid, name))
+        return groups
+
+    def cancel(self):
+        """Прерывает все выполняющиеся запросы поиска (из любого потока)."""
+        with self._lock:
+            for connection in self._connections:
+                self._cancelled.add(id(connection))
+                try:
+                    connection.cancel()
+                except Exception as e:
+                    logging.warning("Не удалось прервать запрос поиска: %s" % e)
+
+    def _is_cancelled(self, connection) -> bool:
+        with self._lock:
+            return id(connection) in self._cancelled
+
+    @db_session
+    def check_index(self) -> List[str]:
+        """Возвращает таблицы, для которых нет триграммного индекса (все, если нет расширения pg_trgm)."""
+        if db.select("SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'")[0] == 0:
+            return list(_INDEXED_TABLES)
+        names = [_index_name(table) for table in _INDEXED_TABLES]
+        existing = set(db.select("SELECT indexname FROM pg_indexes WHERE indexname = ANY($names)", {"names": names}))
+        return [table for table in _INDEXED_TABLES if _index_name(table) not in existing]
+
+    def prepare_index(self) -> bool:
+        """
+        Проверяет, что триграммные индексы созданы. Возвращает False, если pg_trgm или индексов нет:
+        тогда поиск работает через ILIKE без ранжирования по сходству.
+        Сами индексы создаются отдельно, скриптом scripts/create_search_index.py.
+        """
+        try:
+            missing = self.check_index()
+        except Exception as e:
+            logging.warning("Не удалось проверить триграммный индекс для поиска: %s" % e)
+            return False
+        if len(missing) > 0:
+            logging.warning("Нет триграммного индекса для поиска по таблицам: %s" % ", ".join(missing))
+            return False
+        return True
+
+
+@db_session(ddl=True)
+def create_search_index(tables: List[str] = None):
+    """
+    Создает расширение pg_trgm и триграммные индексы для поиска. Действие администратора:
+    индексы строятся через CREATE INDEX CONCURRENTLY вне транзакции, не блокируя запись в таблицы.
+    """
+    commit()
+    connection = db.get_connection()
+    autocommit = connection.autocommit
+    connection.autocommit = True
+    try:
+        cursor = connection.cursor()
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in tables if tables is not None else _INDEXED_TABLES:
+            sql = 'CREATE INDEX CONCURRENTLY IF NOT EXISTS "%s" ON "%s" USING gin ("Name" gin_trgm_ops)'
+            cursor.execute(sql % (_index_name(table), table))
+    finally:
+        connection.autocommit = autocommit
+
+
+def _index_name(table: str) -> str:
+    return "%s_Name_trgm_idx" % table
+
+
+def _escape_like(q: str) -> str:
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import wx
+from pony.orm import db_session, select
+
+from src.ctx import app_ctx
+from src.database import BoreHole, MineObject, OrigSampleSet, Station, db, queries_count
+
+_COUNT_MINE_OBJECTS_SQL = """
+    SELECT 'M', "PID", count(*) FROM "MineObjects" WHERE "PID" = ANY($mine_object_rids) GROUP BY "PID"
+"""
+
+_COUNT_OTHER_SQL = """
+    SELECT 'M', "MOID", count(*) FROM "BoreHoles"
+    WHERE "MOID" = ANY($mine_object_rids) AND "SID" IS NULL GROUP BY "MOID"
+    UNION ALL
+    SELECT 'M', "MOID", count(*) FROM "Stations" WHERE "MOID" = ANY($mine_object_rids) GROUP BY "MOID"
+    UNION ALL
+    SELECT 'M', "MOID", count(*) FROM "OrigSampleSets"
+    WHERE "MOID" = ANY($mine_object_rids) AND "SampleType" IN ('STUFF', 'DISPERSE') GROUP BY "MOID"
+    UNION ALL
+    SELECT 'S', "SID", count(*) FROM "BoreHoles" WHERE "SID" = ANY($station_rids) GROUP BY "SID"
+"""
+
+
+@dataclass
+class LevelChildren:
+    bore_holes: List[BoreHole] = field(default_factory=list)
+    stations: List[Station] = field(default_factory=list)
+    stuf: List[OrigSampleSet] = field(default_factory=list)
+    disperse: List[OrigSampleSet] = field(default_factory=list)
+    mine_objects: List[MineObject] = field(default_factory=list)
+    # Количество дочерних узлов у станций и горных объектов уровня по RID
+    station_counts: Dict[int, int] = field(default_factory=dict)
+    mine_object_counts: Dict[int, int] = field(default_factory=dict)
+
+
+@dataclass
+class SubnodesCounts:
+    stations: Dict[int, int] = field(default_factory=dict)
+    mine_objects: Dict[int, int] = field(default_factory=dict)
+
+
+class TreeLevelLoader:
+    """
+    Загружает дочерние объекты сразу для одного или нескольких родителей одним запросом с prefetch.
+    Сущности возвращаются уже загруженными, узлы дерева строятся из них без отдельных сессий.
+    """
+
+    def __init__(self, mine_objects_only=False):
+        self._mine_objects_only = mine_objects_only
+        self.last_queries_count = 0
+
+    @db_session(optimistic=False)
+    def load_mine_objects(self, rids: List[int]) -> Dict[int, LevelChildren]:
+        start = queries_count()
+        query = select(o for o in MineObject if o.RID in rids)
+        if self._mine_objects_only:
+            query = query.prefetch(MineObject.childrens)
+        else:
+            query = query.prefetch(
+                MineObject.childrens, MineObject.bore_holes, MineObject.stations, MineObject.orig_sample_sets
+            )
+        levels = {}
+        for o in query:
+            level = LevelChildren()
+            if not self._mine_objects_only:
+                level.bore_holes = [bh for bh in o.bore_holes if bh.station is None]
+                level.stations = sorted(o.stations, key=lambda x: x.RID, reverse=True)
+                for orig_sample_set in o.orig_sample_sets:
+                    if orig_sample_set.SampleType == "STUFF":
+                        level.stuf.append(orig_sample_set)
+                    elif orig_sample_set.SampleType == "DISPERSE":
+                        level.disperse.append(orig_sample_set)
+            level.mine_objects = sorted(o.childrens, key=lambda x: x.RID, reverse=True)
+            levels[o.RID] = level
+        counts = self.count_subnodes(
+            [x.RID for level in levels.values() for x in level.mine_objects],
+            [x.RID for level in levels.values() for x in level.stations],
+        )
+        for level in levels.values():
+            level.mine_object_counts = {x.RID: counts.mine_objects.get(x.RID, 0) for x in level.mine_objects}
+            level.station_counts = {x.RID: counts.stations.get(x.RID, 0) for x in level.stations}
+        self._report(start, len(rids))
+        return levels
+
+    @db_session(optimistic=False)
+    def count_subnodes(self, mine_object_rids: List[int], station_rids: List[int] = ()) -> SubnodesCounts:
+        """Считает дочерние узлы для всего уровня одним сгруппированным запросом."""
+        counts = SubnodesCounts()
+        if len(mine_object_rids) == 0 and len(station_rids) == 0:
+            return counts
+        parts = [_COUNT_MINE_OBJECTS_SQL]
+        if not self._mine_objects_only:
+            parts.append(_COUNT_OTHER_SQL)
+        params = {"mine_object_rids": list(mine_object_rids), "station_rids": list(station_rids)}
+        for kind, rid, count in db.select(" UNION ALL ".join(parts), params):
+            target = counts.mine_objects if kind == "M" else counts.stations
+            target[rid] = target.get(rid, 0) + count
+        return counts
+
+    @db_session(optimistic=False)
+    def load_stations(self, rids: List[int]) -> Dict[int, List[BoreHole]]:
+        start = queries_count()
+        levels = {}
+        for o in select(o for o in Station if o.RID in rids).prefetch(Station.bore_holes):
+            levels[o.RID] = sorted(o.bore_holes, key=lambda x: x.RID, reverse=True)
+        self._report(start, len(rids))
+        return levels
+
+    def _report(self, start: int, parents_count: int):
+        self.last_queries_count = queries_count() - start
+        # Загрузка может идти не в потоке GUI
+        text = "Дерево: загружено уровней: %d, запросов к БД: %d" % (parents_count, self.last_queries_count)
+        if app_ctx().main is not None:
+            wx.CallAfter(app_ctx().main.statusbar.SetStatusText, text, 3)
@@ -17,6 +17,8 @@ from src.database import (
     Station,
 )
 from src.delete_object import delete_object
+from src.objects.search import ENTITY_BY_KIND, KINDS, ObjectSearch, SearchCancelled, SearchGroup, SearchHit
+from src.objects.ui.page._tree_loader import TreeLevelLoader
 from src.ui.icon import get_art, get_icon
 from src.ui.tree import (
     EVT_WIDGET_TREE_ACTIVATED,
@@ -28,11 +30,15 @@ from src.ui.tree import (
 
 
 class _MineObject_Node(TreeNode):
-    @db_session
-    def __init__(self, o: MineObject, mine_objects_only=False):
-        self.o = MineObject[o.RID]
+    def __init__(self, o: MineObject, mine_objects_only=False, preloaded=False, subnodes_count=None):
+        self.o = o if preloaded else self._fetch(o)
         self.p = self.o.parent
         self._mine_objects_only = mine_objects_only
+        self._subnodes_count = subnodes_count
+
+    @db_session
+    def _fetch(self, o):
+        return MineObject[o.RID]
 
     @db_session
     def self_reload(self):
@@ -63,32 +69,47 @@ class _MineObject_Node(TreeNode):
     def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
         return "folder-open", get_icon("folder-open", 16)
 
-    @db_session(optimistic=False)
     def get_subnodes(self) -> List[TreeNode]:
+        level = TreeLevelLoader(self._mine_objects_only).load_mine_objects([self.o.RID]).get(self.o.RID)
+        if level is None:
+            return []
         nodes = []
-        if not self._mine_objects_only:
-            for o in select(o for o in BoreHole if o.mine_object.RID == self.o.RID and o.station == None):  # noqa: E711
-                nodes.append(_BoreHole_Node(o))
-            for o in select(o for o in Station if o.mine_object.RID == self.o.RID).order_by(lambda x: desc(x.RID)):
-                nodes.append(_Station_Node(o))
-            for o in select(o for o in OrigSampleSet if o.mine_object.RID == self.o.RID and o.SampleType == "STUFF"):
-                nodes.append(_Stuf_Node(o))
-            for o in select(o for o in OrigSampleSet if o.mine_object.RID == self.o.RID and o.SampleType == "DISPERSE"):
-                nodes.append(_Disperse_Node(o))
-        for o in select(o for o in MineObject if o.parent == self.o).order_by(lambda x: desc(x.RID)):
-            nodes.append(_MineObject_Node(o, mine_objects_only=self._mine_objects_only))
+        for o in level.bore_holes:
+            nodes.append(_BoreHole_Node(o, preloaded=True))
+        for o in level.stations:
+            nodes.append(_Station_Node(o, preloaded=True, subnodes_count=level.station_counts.get(o.RID)))
+        for o in level.stuf:
+            nodes.append(_Stuf_Node(o, preloaded=True))
+        for o in level.disperse:
+            nodes.append(_Disperse_Node(o, preloaded=True))
+        for o in level.mine_objects:
+            nodes.append(
+                _MineObject_Node(
+                    o,
+                    mine_objects_only=self._mine_objects_only,
+                    preloaded=True,
+                    subnodes_count=level.mine_object_counts.get(o.RID),
+                )
+            )
         return nodes
 
+    def get_subnodes_count(self) -> int | None:
+        return self._subnodes_count
+
     def __eq__(self, node):
         return isinstance(node, _MineObject_Node) and node.o.RID == self.o.RID
 
 
 class _Station_Node(TreeNode):
-    @db_session
-    def __init__(self, o: Station, root_as_parent=False):
-        self.o = Station[o.RID]
+    def __init__(self, o: Station, root_as_parent=False, preloaded=False, subnodes_count=None):
+        self.o = o if preloaded else self._fetch(o)
         self.p = self.o.mine_object
         self._root_as_parent = root_as_parent
+        self._subnodes_count = subnodes_count
+
+    @db_session
+    def _fetch(self, o):
+        return Station[o.RID]
 
     @db_session
     def self_reload(self):
@@ -108,25 +129,30 @@ class _Station_Node(TreeNode):
     def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
         return "folder-open", get_icon("folder-open", 16)
 
-    @db_session(optimistic=False)
     def get_subnodes(self) -> List[TreeNode]:
         nodes = []
-        for o in select(o for o in BoreHole if o.station == self.o).order_by(lambda x: desc(x.RID)):
-            nodes.append(_BoreHole_Node(o))
+        for o in TreeLevelLoader().load_stations([self.o.RID]).get(self.o.RID, []):
+            nodes.append(_BoreHole_Node(o, preloaded=True))
         return nodes
 
+    def get_subnodes_count(self) -> int | None:
+        return self._subnodes_count
+
     def __eq__(self, o):
         return isinstance(o, _Station_Node) and o.o.RID == self.o.RID
 
 
 class _BoreHole_Node(TreeNode):
-    @db_session
-    def __init__(self, o: BoreHole, root_as_parent=False):
-        self.o = BoreHole[o.RID]
+    def __init__(self, o: BoreHole, root_as_parent=False, preloaded=False):
+        self.o = o if preloaded else self._fetch(o)
         self.p_mine_object = self.o.mine_object
         self.p_station = self.o.station
         self._root_as_parent = root_as_parent
 
+    @db_session
+    def _fetch(self, o):
+        return BoreHole[o.RID]
+
     @db_session
     def self_reload(self):
         self.o = BoreHole[self.o.RID]
@@ -153,11 +179,14 @@ class _BoreHole_Node(TreeNode):
 
 
 class _Stuf_Node(TreeNode):
-    @db_session
-    def __init__(self, o: OrigSampleSet):
-        self.o = OrigSampleSet[o.RID]
+    def __init__(self, o: OrigSampleSet, preloaded=False):
+        self.o = o if preloaded else self._fetch(o)
         self.p_mine_object = self.o.mine_object
 
+    @db_session
+    def _fetch(self, o):
+        return OrigSampleSet[o.RID]
+
     @db_session
     def self_reload(self):
         self.o = OrigSampleSet[self.o.RID]
@@ -179,11 +208,14 @@ class _Stuf_Node(TreeNode):
 
 
 class _Disperse_Node(TreeNode):
-    @db_session
-    def __init__(self, o: OrigSampleSet):
-        self.o = OrigSampleSet[o.RID]
+    def __init__(self, o: OrigSampleSet, preloaded=False):
+        self.o = o if preloaded else self._fetch(o)
         self.p_mine_object = self.o.mine_object
 
+    @db_session
+    def _fetch(self, o):
+        return OrigSampleSet[o.RID]
+
     @db_session
     def self_reload(self):
         self.o = OrigSampleSet[self.o.RID]
@@ -214,8 +246,10 @@ class _Root_Node(TreeNode):
     @db_session(optimistic=False)
     def get_subnodes(self) -> List[TreeNode]:
         nodes = []
-        for o in select(o for o in MineObject if o.Level == 0).order_by(lambda x: desc(x.RID)):
-            nodes.append(_MineObject_Node(o))
+        objects = select(o for o in MineObject if o.Level == 0).order_by(lambda x: desc(x.RID))[:]
+        counts = TreeLevelLoader().count_subnodes([o.RID for o in objects])
+        for o in objects:
+            nodes.append(_MineObject_Node(o, preloaded=True, subnodes_count=counts.mine_objects.get(o.RID, 0)))
         return nodes
 
     def is_root(self) -> bool:
@@ -235,8 +269,14 @@ class _MineObjectsRoot_Node(TreeNode):
     @db_session(optimistic=False)
     def get_subnodes(self) -> List[TreeNode]:
         nodes = []
-        for o in select(o for o in MineObject if o.Level == 0).order_by(lambda x: desc(x.RID)):
-            nodes.append(_MineObject_Node(o, mine_objects_only=True))
+        objects = select(o for o in MineObject if o.Level == 0).order_by(lambda x: desc(x.RID))[:]
+        counts = TreeLevelLoader(mine_objects_only=True).count_subnodes([o.RID for o in objects])
+        for o in objects:
+            nodes.append(
+                _MineObject_Node(
+                    o, mine_objects_only=True, preloaded=True, subnodes_count=counts.mine_objects.get(o.RID, 0)
+                )
+            )
         return nodes
 
     def is_root(self) -> bool:
@@ -256,8 +296,12 @@ class _StationsRoot_Node(TreeNode):
     @db_session(optimistic=False)
     def get_subnodes(self) -> List[TreeNode]:
         nodes = []
-        for o in select(o for o in Station).order_by(lambda x: desc(x.RID)):
-            nodes.append(_Station_Node(o, root_as_parent=True))
+        stations = select(o for o in Station).order_by(lambda x: desc(x.RID))[:]
+        counts = TreeLevelLoader().count_subnodes([], [o.RID for o in stations])
+        for o in stations:
+            nodes.append(
+                _Station_Node(o, root_as_parent=True, preloaded=True, subnodes_count=counts.stations.get(o.RID, 0))
+            )
         return nodes
 
     def is_root(self) -> bool:
@@ -290,217 +334,112 @@ class _BoreHolesRoot_Node(TreeNode):
 OpenSelfEditorEvent, EVT_TREE_OPEN_SELF_EDITOR = wx.lib.newevent.NewEvent()
 
 
-class _Q_Result_Node(TreeNode):
-    def __init__(self, o, parent):
-        self.o = o
-        self.parent = parent
-
-    def get_name(self):
-        return self.o.get_tree_name()
-
-    def get_parent(self):
-        return self.parent
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "file", get_icon("file", 16)
-
-    def __eq__(self, node):
-        return isinstance(node, _Q_Result_Node) and isinstance(node.o, self.o.__class__) and node.o.RID == self.o.RID
-
-    def is_leaf(self):
-        return True
+_Q_KIND_LABELS = {
+    "REGION": ("Регионы", "Регион"),
+    "ROCKS": ("Горные массивы", "Горный массив"),
+    "FIELD": ("Месторождения", "Месторождение"),
+    "HORIZON": ("Горизонты", "Горизонт"),
+    "EXCAVATION": ("Выработки", "Выработка"),
+    "STATION": ("Станции", "Станция"),
+    "BORE_HOLE": ("Скважины", "Скважина"),
+    "STUFF": ("Штуфы", "Штуф"),
+    "DISPERSE": ("Дисперсные материалы", "Дисперсный материал"),
+}
+
+_Q_MODE_KINDS = {
+    "region": ["REGION"],
+    "rocks": ["ROCKS"],
+    "fields": ["FIELD"],
+    "horizons": ["HORIZON"],
+    "excavations": ["EXCAVATION"],
+    "stations": ["STATION"],
+    "bore_holes": ["BORE_HOLE"],
+    "stuff": ["STUFF"],
+    "disperse": ["DISPERSE"],
+}
 
 
-class _Q_Region_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
+class _Q_Result_Node(TreeNode):
+    def __init__(self, hit: SearchHit, parent):
+        self.hit = hit
         self.parent = parent
+        self._o = None
 
-    @db_session
-    def get_name(self) -> str:
-        return "Регионы (%s)" % self.query().count()
-
-    def get_parent(self):
-        return self.parent
-
-    @db_session
-    def query(self):
-        return select(o for o in MineObject if o.Type == "REGION" and self.q in o.Name)
-
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in self.query():
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
-
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
-
-    def __eq__(self, node):
-        return isinstance(node, _Q_Region_Node)
-
-
-class _Q_Rocks_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
-        self.parent = parent
+    @property
+    def o(self):
+        # Сущность нужна только для меню и открытия редактора, поэтому загружается по требованию
+        if self._o is None:
+            self._o = self._fetch()
+        return self._o
 
     @db_session
-    def query(self):
-        return select(o for o in MineObject if o.Type == "ROCKS" and self.q in o.Name)
+    def _fetch(self):
+        return ENTITY_BY_KIND[self.hit.kind][self.hit.rid]
 
-    @db_session
-    def get_name(self) -> str:
-        return "Горные массивы (%s)" % self.query().count()
+    def get_name(self):
+        return "[%s] %s" % (_Q_KIND_LABELS[self.hit.kind][1], self.hit.name)
 
     def get_parent(self):
         return self.parent
 
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in select(o for o in MineObject if o.Type == "ROCKS" and self.q in o.Name):
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
     def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
+        return "file", get_icon("file", 16)
 
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
+    def get_key(self):
+        return (self.__class__.__name__, ENTITY_BY_KIND[self.hit.kind].__name__, self.hit.rid)
 
     def __eq__(self, node):
-        return isinstance(node, _Q_Rocks_Node)
-
-
-class _Q_Fields_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
-        self.parent = parent
-
-    @db_session
-    def query(self):
-        return select(o for o in MineObject if o.Type == "FIELD" and self.q in o.Name)
-
-    @db_session
-    def get_name(self) -> str:
-        return "Месторождения (%s)" % self.query().count()
-
-    def get_parent(self):
-        return self.parent
-
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in select(o for o in MineObject if o.Type == "FIELD" and self.q in o.Name):
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
-
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
+        return isinstance(node, _Q_Result_Node) and node.get_key() == self.get_key()
 
-    def __eq__(self, node):
-        return isinstance(node, _Q_Fields_Node)
+    def is_leaf(self):
+        return True
 
 
-class _Q_Horizons_Node(TreeNode):
-    def __init__(self, q, parent):
+class _Q_More_Node(TreeNode):
+    def __init__(self, parent):
         self.o = None
-        self.q = q
         self.parent = parent
 
-    @db_session
-    def get_name(self) -> str:
-        return "Горизонты (%s)" % self.query().count()
-
-    @db_session
-    def query(self):
-        return select(o for o in MineObject if o.Type == "HORIZON" and self.q in o.Name)
+    def get_name(self):
+        return "Показать еще (%d из %d)..." % (len(self.parent.group.hits), self.parent.group.total)
 
     def get_parent(self):
         return self.parent
 
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in select(o for o in MineObject if o.Type == "HORIZON" and self.q in o.Name):
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
+    def is_leaf(self):
+        return True
 
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
+    def get_key(self):
+        return (self.__class__.__name__, self.parent.group.kind)
 
     def __eq__(self, node):
-        return isinstance(node, _Q_Horizons_Node)
+        return isinstance(node, _Q_More_Node) and node.get_key() == self.get_key()
 
 
-class _Q_Excavations_Node(TreeNode):
-    def __init__(self, q, parent):
+class _Q_Kind_Node(TreeNode):
+    def __init__(self, group: SearchGroup, parent):
         self.o = None
-        self.q = q
+        self.group = group
         self.parent = parent
 
-    @db_session
     def get_name(self) -> str:
-        return "Выработки (%s)" % self.query().count()
-
-    @db_session
-    def query(self):
-        return select(o for o in MineObject if o.Type == "EXCAVATIO" and self.q in o.Name)
+        return "%s (%d)" % (_Q_KIND_LABELS[self.group.kind][0], self.group.total)
 
     def get_parent(self):
         return self.parent
 
-    @db_session
     def get_subnodes(self):
-        nodes = []
-        for o in select(o for o in MineObject if o.Type == "EXCAVATION" and self.q in o.Name):
-            nodes.append(_Q_Result_Node(o, self))
+        nodes = [_Q_Result_Node(hit, self) for hit in self.group.hits]
+        if self.group.total > len(self.group.hits):
+            nodes.append(_Q_More_Node(self))
         return nodes
 
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
-
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
-
-    def __eq__(self, node):
-        return isinstance(node, _Q_Excavations_Node)
-
-
-class _Q_Stations_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
-        self.parent = parent
-
-    @db_session
-    def get_name(self) -> str:
-        return "Станции (%s)" % self.query().count()
-
-    @db_session
-    def query(self):
-        return select(o for o in Station if self.q in o.Name)
+    def get_subnodes_count(self) -> int | None:
+        return len(self.group.hits) + (1 if self.group.total > len(self.group.hits) else 0)
 
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in self.query():
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
+    def load_more(self):
+        groups = self.parent.search.search(self.parent.q, [self.group.kind], offset=len(self.group.hits))
+        self.group.hits.extend(groups[self.group.kind].hits)
 
     def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
         return "folder", get_icon("folder", 16)
@@ -508,108 +447,19 @@ class _Q_Stations_Node(TreeNode):
     def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
         return "folder-open", get_icon("folder-open", 16)
 
-    def __eq__(self, node):
-        return isinstance(node, _Q_Stations_Node)
-
-
-class _Q_BoreHoles_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
-        self.parent = parent
-
-    @db_session
-    def get_name(self) -> str:
-        return "Скважины (%s)" % self.query().count()
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
-
-    @db_session
-    def query(self):
-        return select(o for o in BoreHole if self.q in o.Name)
-
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in self.query():
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
-
-    def __eq__(self, node):
-        return isinstance(node, _Q_BoreHoles_Node)
-
-
-class _Q_Stuf_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
-        self.parent = parent
-
-    @db_session
-    def get_name(self) -> str:
-        return "Штуфы (%s)" % self.query().count()
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
-
-    @db_session
-    def query(self):
-        return select(o for o in OrigSampleSet if self.q in o.Name and o.SampleType == "STUFF")
-
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in self.query():
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
+    def get_key(self):
+        return (self.__class__.__name__, self.group.kind)
 
     def __eq__(self, node):
-        return isinstance(node, _Q_Stuf_Node)
-
-
-class _Q_Disperse_Node(TreeNode):
-    def __init__(self, q, parent):
-        self.o = None
-        self.q = q
-        self.parent = parent
-
-    @db_session
-    def get_name(self) -> str:
-        return "Дисперсные материалы (%s)" % self.query().count()
-
-    def get_icon(self) -> Tuple[str, wx.Bitmap] | None:
-        return "folder", get_icon("folder", 16)
-
-    @db_session
-    def query(self):
-        return select(o for o in OrigSampleSet if self.q in o.Name and o.SampleType == "DISPERSE")
-
-    @db_session
-    def get_subnodes(self):
-        nodes = []
-        for o in self.query():
-            nodes.append(_Q_Result_Node(o, self))
-        return nodes
-
-    def get_icon_open(self) -> Tuple[str | wx.Bitmap] | None:
-        return "folder-open", get_icon("folder-open", 16)
-
-    def __eq__(self, node):
-        return isinstance(node, _Q_Disperse_Node)
+        return isinstance(node, _Q_Kind_Node) and node.group.kind == self.group.kind
 
 
 class _Q_Root_Node(TreeNode):
-    def __init__(self, q, mode="all"):
+    def __init__(self, q, mode="all", search: ObjectSearch = None):
         self.o = None
         self.q = q
         self.mode = mode
+        self.search = search if search is not None else ObjectSearch()
 
     def get_name(self) -> str:
         return "Объекты"
@@ -617,28 +467,13 @@ class _Q_Root_Node(TreeNode):
     def get_parent(self) -> TreeNode:
         return _Root_Node()
 
-    @db_session(optimistic=False)
     def get_subnodes(self) -> List[TreeNode]:
-        nodes = []
-        if self.mode == "all" or self.mode == "region":
-            nodes.append(_Q_Region_Node(self.q, self))
-        if self.mode == "all" or self.mode == "rocks":
-            nodes.append(_Q_Rocks_Node(self.q, self))
-        if self.mode == "all" or self.mode == "fields":
-            nodes.append(_Q_Fields_Node(self.q, self))
-        if self.mode == "all" or self.mode == "horizons":
-            nodes.append(_Q_Horizons_Node(self.q, self))
-        if self.mode == "all" or self.mode == "excavations":
-            nodes.append(_Q_Excavations_Node(self.q, self))
-        if self.mode == "all" or self.mode == "stations":
-            nodes.append(_Q_Stations_Node(self.q, self))
-        if self.mode == "all" or self.mode == "bore_holes":
-            nodes.append(_Q_BoreHoles_Node(self.q, self))
-        if self.mode == "all" or self.mode == "stuff":
-            nodes.append(_Q_Stuf_Node(self.q, self))
-        if self.mode == "all" or self.mode == "disperse":
-            nodes.append(_Q_Disperse_Node(self.q, self))
-        return nodes
+        try:
+            groups = self.search.search(self.q, _Q_MODE_KINDS.get(self.mode, KINDS))
+        except SearchCancelled:
+            # Запрос прерван более новым поиском, результат все равно будет отброшен
+            return []
+        return [_Q_Kind_Node(group, self) for group in groups.values()]
 
     def is_root(self) -> bool:
         return True
@@ -649,10 +484,11 @@ class _Q_Root_Node(TreeNode):
 
 class _TreeWidget(TreeWidget):
     def __init__(self, parent):
-        super().__init__(parent)
+        super().__init__(parent, async_load=True)
         self.bind_all()
         self.set_root_node(_Root_Node())
         self._mode = "all"
+        self._search = ObjectSearch()
         self.Bind(EVT_WIDGET_TREE_MENU, self._on_node_context_menu)
         self.Bind(EVT_WIDGET_TREE_ACTIVATED, self._on_node_activated)
         pubsub.pub.subscribe(self.on_objects_changed, "object.added")
@@ -666,28 +502,10 @@ class _TreeWidget(TreeWidget):
             node = _Station_Node(o)
         elif isinstance(o, BoreHole):
             node = _BoreHole_Node(o)
-        elif isinstance(o, OrigSampleSet) and o.SampleType == "STUFF" and not self.find_mode:
+        elif isinstance(o, OrigSampleSet) and o.SampleType == "STUFF" and not self.is_in_find_mode():
             node = _Stuf_Node(o)
-        elif isinstance(o, OrigSampleSet) and o.SampleType == "DISPERSE" and not self.find_mode:
+        elif isinstance(o, OrigSampleSet) and o.SampleType == "DISPERSE" and not self.is_in_find_mode():
             node = _Disperse_Node(o)
-        elif isinstance(o, MineObject) and self.find_mode and o.Type == "REGION":
-            node = _Q_Result_Node(o, _Q_Region_Node(self.q, self.get_current_root()))
-        elif isinstance(o, MineObject) and self.find_mode and o.Type == "ROCKS":
-            node = _Q_Result_Node(o, _Q_Rocks_Node(self.q, self.get_current_root()))
-        elif isinstance(o, MineObject) and self.find_mode and o.Type == "FIELD":
-            node = _Q_Result_Node(o, _Q_Fields_Node(self.q, self.get_current_root()))
-        elif isinstance(o, MineObject) and self.find_mode and o.Type == "HORIZON":
-            node = _Q_Result_Node(o, _Q_Horizons_Node(self.q, self.get_current_root()))
-        elif isinstance(o, MineObject) and self.find_mode and o.Type == "EXCAVATION":
-            node = _Q_Result_Node(o, _Q_Excavations_Node(self.q, self.get_current_root()))
-        elif isinstance(o, Station) and self.find_mode:
-            node = _Q_Result_Node(o, _Q_Stations_Node(self.q, self.get_current_root()))
-        elif isinstance(o, BoreHole) and self.find_mode:
-            node = _Q_Result_Node(o, _Q_BoreHoles_Node(self.q, self.get_current_root()))
-        elif isinstance(o, OrigSampleSet) and o.SampleType == "STUFF" and self.find_mode:
-            node = _Q_Result_Node(o, _Q_Stuf_Node(self.q, self.get_current_root()))
-        elif isinstance(o, OrigSampleSet) and o.SampleType == "DISPERSE" and self.find_mode:
-            node = _Q_Result_Node(o, _Q_Disperse_Node(self.q, self.get_current_root()))
 
         return node
 
@@ -711,6 +529,11 @@ class _TreeWidget(TreeWidget):
 
     @db_session
     def _on_node_activated(self, event):
+        if isinstance(event.node, _Q_More_Node):
+            event.node.parent.load_more()
+            self.soft_reload_childrens(event.node.parent)
+            self.soft_reload_node(event.node)
+            return
         if isinstance(event.node.o, MineObject):
             app_ctx().main.open("mine_object_editor", is_new=False, o=event.node.o)
         elif isinstance(event.node.o, Station):
@@ -1006,9 +829,12 @@ class _TreeWidget(TreeWidget):
         self.select_node(node)
 
     def start_find(self, q, mode):
-        self.set_root_node(_Q_Root_Node(q, mode))
+        # Прерываем предыдущий поиск, если он еще выполняется
+        self._search.cancel()
+        self.set_root_node(_Q_Root_Node(q, mode, self._search))
 
     def end_find(self):
+        self._search.cancel()
         self.set_root_node(_Root_Node())
 
     def is_in_find_mode(self):
@@ -1043,6 +869,9 @@ class PageTree(wx.Panel):
         item = menu.AppendRadioItem(10, "Только Дисперсные материалы")
         self.tree_search.SetMenu(menu)
         self.tree_search.Bind(wx.EVT_SEARCH, self.on_search)
+        self.tree_search.Bind(wx.EVT_TEXT, self.on_search_text)
+        # Поиск при наборе запускается с задержкой, чтобы не выполнять запрос на каждый символ
+        self._search_delay = None
         self.tree_search.Bind(wx.EVT_KEY_DOWN, self.on_key)
         menu.Bind(wx.EVT_MENU, self.on_mode_changed)
         self.tree_search.SetDescriptiveText("Введите часть названия")
@@ -1103,15 +932,27 @@ class PageTree(wx.Panel):
             "disperse",
         ]
         self.mode = modes[_id - 1]
+        if self.tree.is_in_find_mode():
+            self.do_search()
+
+    def on_search_text(self, event):
+        if self._search_delay is not None:
+            self._search_delay.Stop()
+        self._search_delay = wx.CallLater(300, self.do_search)
 
     def on_search(self, event):
+        self.do_search()
+
+    def do_search(self):
+        if self._search_delay is not None:
+            self._search_delay.Stop()
+            self._search_delay = None
         q = self.tree_search.GetValue()
-        print(q)
         if len(q.strip()) == 0:
             if self.tree.is_in_find_mode():
                 self.tree.end_find()
         else:
-            self.tree.start_find(self.tree_search.GetValue(), self.mode)
+            self.tree.start_find(q.strip(), self.mode)
 
     def get_name(self):
         return "Дерево"
@@ -1123,5 +964,7 @@ class PageTree(wx.Panel):
         return {}
 
     def on_close(self):
+        if self._search_delay is not None:
+            self._search_delay.Stop()
         self.tree.unbind_pubsub()
         return True
@@ -0,0 +1,174 @@
+import threading
+from typing import List, Set, Tuple
+
+from pony.orm import commit, db_session
+
+from src.database import db
+
+# Пересчет таблицы статистики проб одним запросом: обновление существующих строк,
+# добавление недостающих и удаление строк, для которых не осталось значений.
+# %(stats_where)s и %(deleted_where)s ограничивают пересчет списком проб или ключей
+_REBUILD_SQL = """
+    WITH stats AS (
+        SELECT
+            s."SSID",
+            v."PRID",
+            v."TMID",
+            min(v."Value") AS min_value,
+            max(v."Value") AS max_value,
+            avg(v."Value") AS avg_value,
+            count(*) AS sample_cnt,
+            stddev_pop(v."Value") AS root_mean_sqr_dev
+        FROM "PMSamplePropertyValues" v
+            JOIN "PMSamples" s ON s."RID" = v."RSID"
+        %(stats_where)s
+        GROUP BY s."SSID", v."PRID", v."TMID"
+    ), deleted AS (
+        DELETE FROM "PMSampleSetPropertyValues" a
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stats
+            WHERE stats."SSID" = a."SSID" AND stats."PRID" = a."PRID" AND stats."TMID" = a."TMID"
+        )
+        %(deleted_where)s
+    ), updated AS (
+        UPDATE "PMSampleSetPropertyValues" a SET
+            "MinValue" = stats.min_value,
+            "MaxValue" = stats.max_value,
+            "AvgValue" = stats.avg_value,
+            "SampleCnt" = stats.sample_cnt,
+            "RootMeanSqrDev" = stats.root_mean_sqr_dev,
+            "VariationCoef" = CASE WHEN stats.avg_value = 0 THEN 0 ELSE stats.root_mean_sqr_dev / stats.avg_value END
+        FROM stats
+        WHERE stats."SSID" = a."SSID" AND stats."PRID" = a."PRID" AND stats."TMID" = a."TMID"
+        RETURNING a."SSID", a."PRID", a."TMID"
+    )
+    INSERT INTO "PMSampleSetPropertyValues" (
+        "SSID", "PRID", "TMID", "MinValue", "MaxValue", "AvgValue", "SampleCnt", "RootMeanSqrDev", "VariationCoef"
+    )
+    SELECT
+        stats."SSID",
+        stats."PRID",
+        stats."TMID",
+        stats.min_value,
+        stats.max_value,
+        stats.avg_value,
+        stats.sample_cnt,
+        stats.root_mean_sqr_dev,
+        CASE WHEN stats.avg_value = 0 THEN 0 ELSE stats.root_mean_sqr_dev / stats.avg_value END
+    FROM stats
+    WHERE NOT EXISTS (
+        SELECT 1 FROM updated
+        WHERE updated."SSID" = stats."SSID" AND updated."PRID" = stats."PRID" AND updated."TMID" = stats."TMID"
+    )
+"""
+
+# Ограничение пересчета списком ключей (проба, свойство, метод), переданных тремя массивами
+_KEYS_FILTER = "IN (SELECT * FROM unnest($ssids::integer[], $prids::integer[], $tmids::integer[]))"
+
+
+class SampleSetAggregates:
+    """
+    Поддерживает таблицу статистики проб (PMSampleSetPropertyValues) в соответствии со значениями свойств образцов.
+    Вызывается из обработчиков сохранения PmSamplePropertyValue, поэтому работает для любого кода,
+    меняющего значения через ORM.
+
+    Pony вызывает сначала все before-обработчики, затем сохраняет все объекты и только потом вызывает
+    все after-обработчики, поэтому таблицу значений посреди сохранения читать нельзя. Обработчики только
+    собирают затронутые ключи (проба, свойство, метод) из самих объектов, а последний after-обработчик
+    сохранения пересчитывает их все одним запросом. rebuild() пересчитывает всю таблицу.
+    """
+
+    def __init__(self):
+        # Состояние сохранения в текущем потоке
+        self._local = threading.local()
+
+    def value_inserting(self, value):
+        """before_insert: новые пробы и образцы получают RID только при сохранении, ключ берется в after_insert"""
+        self._get_state(value).expected += 1
+
+    def value_saving(self, value, old=False):
+        """before-обработчик: old - взять ключ значения до изменения (before_update)"""
+        state = self._get_state(value)
+        state.expected += 1
+        state.keys.add(_value_key(value, old))
+
+    def value_saved(self, value, deleted=False):
+        """after-обработчик: у удаленного объекта ключ уже собран в before_delete"""
+        state = self._get_state(value)
+        if not deleted:
+            state.keys.add(_value_key(value))
+        state.expected -= 1
+        if state.expected <= 0:
+            keys = list(state.keys)
+            state.keys.clear()
+            state.expected = 0
+            self.rebuild_keys(keys)
+
+    def _get_state(self, value):
+        # Сохранение, прерванное ошибкой, не доходит до after-обработчиков: его состояние отбрасывается
+        # вместе с кешем сессии, который Pony заменяет после отката
+        state = getattr(self._local, "state", None)
+        if state is None or state.cache is not value._session_cache_:
+            state = _SaveState(value._session_cache_)
+            self._local.state = state
+        return state
+
+    def rebuild_keys(self, keys: List[Tuple[int, int, int]]):
+        """Пересчет статистики указанных ключей (проба, свойство, метод) в текущей сессии"""
+        if len(keys) == 0:
+            return
+        db.execute(
+            _REBUILD_SQL
+            % {
+                "stats_where": 'WHERE (s."SSID", v."PRID", v."TMID") ' + _KEYS_FILTER,
+                "deleted_where": 'AND (a."SSID", a."PRID", a."TMID") ' + _KEYS_FILTER,
+            },
+            {
+                "ssids": [key[0] for key in keys],
+                "prids": [key[1] for key in keys],
+                "tmids": [key[2] for key in keys],
+            },
+        )
+
+    @db_session
+    def rebuild(self):
+        """Полный пересчет таблицы статистики проб одним запросом"""
+        db.execute(_REBUILD_SQL % {"stats_where": "", "deleted_where": ""})
+        commit()
+
+    def rebuild_sample_sets(self, ssids: List[int]):
+        """
+        Пересчет статистики указанных проб в текущей сессии. Нужен после записи значений
+        в обход ORM (например, через COPY), когда обработчики сохранения не вызываются.
+        """
+        if len(ssids) == 0:
+            return
+        db.execute(
+            _REBUILD_SQL
+            % {"stats_where": 'WHERE s."SSID" = ANY($ssids)', "deleted_where": 'AND a."SSID" = ANY($ssids)'},
+            {"ssids": list(ssids)},
+        )
+
+
+class _SaveState:
+    def __init__(self, cache):
+        self.cache = cache
+        # Число before-обработчиков, для которых after-обработчик еще не вызван
+        self.expected = 0
+        self.keys: Set[Tuple[int, int, int]] = set()
+
+
+def _value_key(value, old=False) -> Tuple[int, int, int]:
+    """Ключ (проба, свойство, метод) значения свойства; old - по значениям атрибутов, прочитанным из БД"""
+
+    def get(attr):
+        if old and attr in value._dbvals_:
+            return value._dbvals_[attr]
+        return getattr(value, attr.name)
+
+    entity = type(value)
+    sample = get(entity.pm_sample)
+    return sample.pm_sample_set.RID, get(entity.pm_property).RID, get(entity.pm_test_method).RID
+
+
+sample_set_aggregates = SampleSetAggregates()
@@ -0,0 +1,42 @@
+import json
+import os
+import shutil
+from typing import Dict
+
+
+class NameAliases:
+    """
+    Подтвержденные сопоставления названий из файлов импорта объектам БД: вид объекта -> название -> RID.
+    Хранятся в JSON-файле, чтобы повторные импорты не выполняли нечеткий поиск
+    для уже встречавшихся написаний.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._aliases: Dict[str, Dict[str, int]] = {}
+        self._changed = False
+        if os.path.exists(filename):
+            with open(filename, "r", encoding="utf-8") as f:
+                self._aliases = json.load(f)
+
+    def get(self, kind: str, name: str) -> int:
+        return self._aliases.get(kind, {}).get(name)
+
+    def add(self, kind: str, name: str, rid: int):
+        if self.get(kind, name) != rid:
+            self._aliases.setdefault(kind, {})[name] = rid
+            self._changed = True
+
+    def remove(self, kind: str, name: str):
+        if self._aliases.get(kind, {}).pop(name, None) is not None:
+            self._changed = True
+
+    def flush(self):
+        if not self._changed:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        _tmp_filename = self.filename + ".tmp"
+        with open(_tmp_filename, "w", encoding="utf-8") as f:
+            json.dump(self._aliases, f, ensure_ascii=False, indent=4)
+        shutil.move(_tmp_filename, self.filename)
+        self._changed = False
@@ -0,0 +1,122 @@
+import io
+import time
+from typing import Callable, Dict, Set, Tuple
+
+from pony.orm import commit, flush
+
+from src.database import PMSample, PmPerformedTask, PmProperty, PmTestMethod, db
+from src.pm.aggregates import sample_set_aggregates
+
+_VALUES_STAGING = "pm_values_staging"
+_TASK_METHODS_STAGING = "pm_task_methods_staging"
+
+_UPDATE_VALUES_SQL = """
+    UPDATE "PMSamplePropertyValues" v SET "Value" = st.value
+    FROM %(staging)s st
+    WHERE v."RSID" = st.rsid AND v."PRID" = st.prid AND v."TMID" = st.tmid AND v."Value" IS DISTINCT FROM st.value
+"""
+
+_INSERT_VALUES_SQL = """
+    INSERT INTO "PMSamplePropertyValues" ("RSID", "PRID", "TMID", "Value")
+    SELECT st.rsid, st.prid, st.tmid, st.value
+    FROM %(staging)s st
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "PMSamplePropertyValues" v
+        WHERE v."RSID" = st.rsid AND v."PRID" = st.prid AND v."TMID" = st.tmid
+    )
+"""
+
+_INSERT_TASK_METHODS_SQL = """
+    INSERT INTO "PMTasksMethodsForSamples" ("RSID", "TMID", "PTID")
+    SELECT st.rsid, st.tmid, st.ptid
+    FROM %(staging)s st
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "PMTasksMethodsForSamples" t
+        WHERE t."RSID" = st.rsid AND t."TMID" = st.tmid AND t."PTID" = st.ptid
+    )
+"""
+
+_SAMPLE_SETS_SQL = """
+    SELECT DISTINCT s."SSID"
+    FROM %(staging)s st
+        JOIN "PMSamples" s ON s."RID" = st.rsid
+"""
+
+
+class PmValuesBulkWriter:
+    """
+    Пакетная запись значений свойств образцов и методов испытаний образцов.
+    Значения копятся в буферах и по chunk_size записываются через COPY во временную таблицу,
+    из которой одним запросом обновляются существующие строки и другим добавляются новые,
+    после каждого пакета выполняется commit().
+
+    Используется внутри db_session. Записанные так значения не проходят через обработчики ORM,
+    поэтому статистика затронутых проб пересчитывается после каждого пакета.
+    Если overwrite=False, существующие значения не меняются.
+    """
+
+    def __init__(self, chunk_size=5000, overwrite=True, on_flush: Callable = None):
+        self.chunk_size = chunk_size
+        self.overwrite = overwrite
+        # on_flush(written, rows_per_second) вызывается после записи каждого пакета, считаются только значения
+        self.on_flush = on_flush
+        self.written = 0
+        self.elapsed = 0.0
+        self._values: Dict[Tuple[PMSample, PmProperty, PmTestMethod], float] = {}
+        self._task_methods: Set[Tuple[PMSample, PmTestMethod, PmPerformedTask]] = set()
+
+    def set_value(self, sample: PMSample, property: PmProperty, method: PmTestMethod, value: float):
+        self._values[(sample, property, method)] = value
+        if len(self._values) >= self.chunk_size:
+            self.flush()
+
+    def add_task_method(self, sample: PMSample, method: PmTestMethod, performed_task: PmPerformedTask):
+        self._task_methods.add((sample, method, performed_task))
+
+    def pending(self) -> int:
+        return len(self._values) + len(self._task_methods)
+
+    def rows_per_second(self) -> float:
+        return self.written / self.elapsed if self.elapsed > 0 else 0.0
+
+    def flush(self):
+        if self.pending() == 0:
+            return
+        start = time.monotonic()
+        # Образцы, созданные через ORM, должны получить RID и попасть в БД до COPY
+        flush()
+        cursor = db.get_connection().cursor()
+        self._copy(
+            cursor,
+            _TASK_METHODS_STAGING,
+            "rsid integer, tmid integer, ptid integer",
+            ["%d\t%d\t%d\n" % (sample.RID, method.RID, task.RID) for sample, method, task in self._task_methods],
+        )
+        self._copy(
+            cursor,
+            _VALUES_STAGING,
+            "rsid integer, prid integer, tmid integer, value double precision",
+            [
+                "%d\t%d\t%d\t%r\n" % (sample.RID, property.RID, method.RID, float(value))
+                for (sample, property, method), value in self._values.items()
+            ],
+        )
+        db.execute(_INSERT_TASK_METHODS_SQL % {"staging": _TASK_METHODS_STAGING})
+        if self.overwrite:
+            db.execute(_UPDATE_VALUES_SQL % {"staging": _VALUES_STAGING})
+        db.execute(_INSERT_VALUES_SQL % {"staging": _VALUES_STAGING})
+        ssids = db.select(_SAMPLE_SETS_SQL % {"staging": _VALUES_STAGING})
+        sample_set_aggregates.rebuild_sample_sets(ssids)
+        commit()
+        self.written += len(self._values)
+        self.elapsed += time.monotonic() - start
+        self._values = {}
+        self._task_methods = set()
+        if self.on_flush is not None:
+            self.on_flush(self.written, self.rows_per_second())
+
+    def _copy(self, cursor, table, columns, lines):
+        cursor.execute("DROP TABLE IF EXISTS %s" % table)
+        cursor.execute("CREATE TEMP TABLE %s (%s) ON COMMIT DROP" % (table, columns))
+        if len(lines) > 0:
+            cursor.copy_expert("COPY %s FROM STDIN" % table, io.StringIO("".join(lines)))
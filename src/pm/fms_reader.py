@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+HANDMADE_PROPS = [
+    "Масса в естественно-влажном состоянии",
+    "Масса в воде",
+    "Масса в водонасыщенном состоянии",
+    "Масса в водонасыщенном состоянии в воде",
+    "Масса в сухом состоянии",
+]
+# Измеряемые свойства: (название, столбец значения, столбец метода, столбец оборудования).
+# Номера столбцов отсчитываются от первого столбца после ручных свойств HANDMADE_PROPS,
+# несколько свойств одного испытания делят столбцы метода и оборудования
+PROPS = [
+    ("Естественная влажность", 0, 1, 2),
+    ("Водопоглощение", 3, 4, 5),
+    ("Плотность", 6, 7, 8),
+    ("Удельный вес", 9, 10, 11),
+    ("Разрушающая нагрузка при одноосном сжатии", 12, 14, 15),
+    ("Предел прочности при одноосном сжатии", 13, 14, 15),
+    ("Разрушающая нагрузка при одноосном растяжении", 16, 18, 19),
+    ("Предел прочности при одноосном растяжении", 17, 18, 19),
+    ("Коэффициент хрупкости", 20, 21, 22),
+    ("Модуль упругости", 23, 24, 25),
+    ("Модуль деформации", 26, 27, 28),
+    ("Модуль спада", 29, 30, 31),
+    ("Коэффициент Пуассона", 32, 33, 34),
+    ("Коэффициент поперечных деформаций", 35, 36, 37),
+    ("Коэффициент удароопасности", 38, 39, 40),
+    ("Коэффициент крепости по М.М. Протодьяконову", 41, 42, 43),
+    ("Коэффициент бокового распора", 44, 45, 46),
+    ("Модуль сдвига", 47, 48, 49),
+    ("Боковое давление", 50, 53, 54),
+    ("Дифференциальная прочность", 51, 53, 54),
+    ("Предел прочности при объемном сжатии", 52, 53, 54),
+    ("Показатель абразивности", 55, 56, 57),
+]
+
+
+@dataclass
+class PmDbPropertyHeader:
+    name: str
+    field: int
+    method: int
+    equipment: int
+    is_handmade_property: bool = False
+
+
+@dataclass
+class PmDbHeader:
+    test_series_field: int
+    doc_date_field: int
+    sample_set_field: int
+    mine_object_field: int
+    sample_set_field: int
+    bore_hole_field: int
+    box_number_field: int
+    depth_start_field: int
+    depth_end_field: int
+    petrotype_field: int
+    petrotype_struct_field: int
+    sample_type_field: int
+    sample_field: int
+    length1_field: int
+    length2_field: int
+    height_field: int
+    mass_air_dry_field: int
+    properties: List[PmDbPropertyHeader]
+
+
+def find_header(columns: List[str]) -> PmDbHeader:
+    """Номера столбцов по названиям в первой строке листа"""
+    h = PmDbHeader(
+        test_series_field=columns.index("Отчет по х/д №"),
+        doc_date_field=columns.index("Дата заключения х/д"),
+        sample_set_field=columns.index("№ пробы"),
+        mine_object_field=columns.index("Месторождение"),
+        bore_hole_field=columns.index("№ скважины"),
+        box_number_field=columns.index("№ ящиков"),
+        depth_start_field=columns.index("№ ящиков") + 1,
+        depth_end_field=columns.index("№ ящиков") + 2,
+        sample_type_field=columns.index("Тип каменного материала"),
+        sample_field=columns.index("№ образца"),
+        length1_field=columns.index("Диаметр, см"),
+        length2_field=columns.index("Высота, см"),
+        height_field=columns.index("Высота, см"),
+        petrotype_field=columns.index("Петротип"),
+        petrotype_struct_field=columns.index("Описание структуры петротипа"),
+        mass_air_dry_field=columns.index("Масса в воздушно-сухом состоянии, г"),
+        properties=[],
+    )
+    for prop_name in HANDMADE_PROPS:
+        h.properties.append(
+            PmDbPropertyHeader(
+                name=prop_name, field=columns.index(prop_name), method=-1, equipment=-1, is_handmade_property=True
+            )
+        )
+    props_start = h.properties[-1].field + 1
+    for prop_name, value_offset, method_offset, equipment_offset in PROPS:
+        h.properties.append(
+            PmDbPropertyHeader(
+                name=prop_name,
+                field=props_start + value_offset,
+                method=props_start + method_offset,
+                equipment=props_start + equipment_offset,
+            )
+        )
+    last_field = props_start + max(offset for _, _, _, offset in PROPS)
+    if last_field >= len(columns):
+        raise ValueError("нет столбцов измеряемых свойств (ожидается %d столбцов)" % (last_field + 1))
+    return h
+
+
+def _cell_text(value) -> str:
+    # Так же, как pandas.read_excel со строковыми конвертерами: целые числа без ".0"
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class FmsWorkbookReader:
+    """
+    Потоковое чтение первого листа файла БД ФМС через openpyxl в режиме read-only.
+    Заголовок разбирается один раз при открытии, строки читаются по мере обхода rows(),
+    поэтому расход памяти не зависит от размера файла.
+    """
+
+    def __init__(self, path):
+        from openpyxl import load_workbook
+
+        self._wb = load_workbook(path, read_only=True, data_only=True)
+        self._ws = self._wb.worksheets[0]
+        self._rows = self._ws.iter_rows(values_only=True)
+        self.columns = [_cell_text(value) for value in next(self._rows, ())]
+        try:
+            self.header = find_header(self.columns)
+        except ValueError as e:
+            self.close()
+            raise Exception("Файл не похож на БД ФМС: %s" % e) from e
+        # Вторая строка - подзаголовки столбцов (например, интервал "от" и "до")
+        next(self._rows, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._wb.close()
+
+    def total_rows(self) -> int:
+        """Примерное число строк данных по размерам листа, -1 если неизвестно"""
+        return self._ws.max_row - 2 if self._ws.max_row is not None else -1
+
+    def rows(self) -> Iterator[Tuple[int, List[str]]]:
+        """(номер строки файла, значения ячеек строками) для каждой непустой строки данных"""
+        for line, record in enumerate(self._rows, start=3):
+            values = [_cell_text(value) for value in record]
+            if len(values) < len(self.columns):
+                values.extend([""] * (len(self.columns) - len(values)))
+            if all(len(value) == 0 for value in values):
+                continue
+            yield line, values
@@ -0,0 +1,256 @@
+import math
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Set, Tuple
+
+from pony.orm import select
+from rapidfuzz import fuzz, process
+
+from src.database import (
+    FoundationDocument,
+    MineObject,
+    OrigSampleSet,
+    Petrotype,
+    PetrotypeStruct,
+    PmProperty,
+    PMSample,
+    PMSampleSet,
+    PmTestEquipment,
+    PmTestMethod,
+    PMTestSeries,
+)
+from src.pm.aliases import NameAliases
+
+
+def _match_names(names: List[str], choices: List[str], threshold: int) -> List[List[int]]:
+    """
+    Выполняется в процессе пула: для каждого названия индексы всех подходящих вариантов,
+    лучший - первым
+    """
+    return [
+        [index for _, _, index in process.extract(name, choices, scorer=fuzz.ratio, score_cutoff=threshold, limit=None)]
+        for name in names
+    ]
+
+
+class _FuzzyIndex:
+    """
+    Нечеткий поиск объекта по названию. Точное совпадение ищется по словарю, затем в сохраненных
+    сопоставлениях aliases (по виду kind), результат нечеткого поиска запоминается для каждой различной строки.
+    """
+
+    def __init__(
+        self, label: str, objects: List, get_name: Callable, threshold: int, aliases: NameAliases = None, kind=None
+    ):
+        self.label = label
+        self._aliases = aliases
+        self._kind = kind
+        # Сопоставления сохраняются только для объектов, которые уже были в БД
+        self._by_rid = {o.RID: o for o in objects}
+        self._rids = {o: o.RID for o in objects}
+        self._objects = []
+        self._names = []
+        self._exact = {}
+        # Название -> (найденный объект или None, названия всех подходящих вариантов)
+        self._cache = {}
+        self._get_name = get_name
+        self._threshold = threshold
+        for o in objects:
+            self.add(o)
+
+    def add(self, o):
+        name = self._get_name(o)
+        self._objects.append(o)
+        self._names.append(name)
+        self._exact.setdefault(name, o)
+        # Новый объект может подойти к строкам, для которых раньше ничего не нашлось,
+        # найденные совпадения сохраняются
+        self._cache = {name: match for name, match in self._cache.items() if match[0] is not None}
+
+    def find(self, name: str):
+        o = self._exact.get(name)
+        if o is not None:
+            return o
+        o = self._find_alias(name)
+        if o is not None:
+            return o
+        if name not in self._cache:
+            self._set_matches(name, _match_names([name], self._names, self._threshold)[0])
+        return self._cache[name][0]
+
+    def prefetch(self, names: Set[str], executor: Executor, chunks: int):
+        """Нечеткий поиск сразу для многих названий, частями в пуле процессов"""
+        names = [
+            name
+            for name in names
+            if name not in self._exact and name not in self._cache and self._find_alias(name) is None
+        ]
+        if len(names) == 0:
+            return
+        size = max(1, math.ceil(len(names) / chunks))
+        parts = [names[i : i + size] for i in range(0, len(names), size)]
+        futures = [executor.submit(_match_names, part, self._names, self._threshold) for part in parts]
+        for part, future in zip(parts, futures):
+            for name, matches in zip(part, future.result()):
+                self._set_matches(name, matches)
+
+    def get_ambiguous(self) -> List[Tuple[str, List[str]]]:
+        """Названия, которым нечетко подошло несколько вариантов, и эти варианты"""
+        return [(name, candidates) for name, (_, candidates) in self._cache.items() if len(candidates) > 1]
+
+    def learn_aliases(self):
+        """Сохраняет найденные нечетким поиском объекты как сопоставления для следующих импортов"""
+        if self._aliases is None:
+            return
+        for name, (o, _) in self._cache.items():
+            if o is not None and o in self._rids:
+                self._aliases.add(self._kind, name, self._rids[o])
+
+    def _find_alias(self, name):
+        if self._aliases is None:
+            return None
+        rid = self._aliases.get(self._kind, name)
+        if rid is None:
+            return None
+        o = self._by_rid.get(rid)
+        if o is None:
+            # Объект удален из БД
+            self._aliases.remove(self._kind, name)
+        return o
+
+    def _set_matches(self, name, matches: List[int]):
+        o = self._objects[matches[0]] if len(matches) > 0 else None
+        self._cache[name] = (o, [self._names[index] for index in matches])
+
+
+class FmsImportResolver:
+    """
+    Поиск объектов БД для строк файла БД ФМС. Все нужные таблицы загружаются один раз,
+    пробы и образцы ищутся по хеш-индексам, названия - через _FuzzyIndex.
+    Значения свойств не загружаются: PmValuesBulkWriter сам сопоставляет их с существующими.
+    Созданные при импорте объекты нужно добавлять через add_*, чтобы следующие строки их находили.
+    Если передан aliases, названия сначала ищутся в нем, а learn_aliases() после успешного импорта
+    запоминает принятые нечеткие совпадения.
+    """
+
+    def __init__(self, threshold=90, aliases: NameAliases = None):
+        self.threshold = threshold
+        self._test_series = _FuzzyIndex(
+            "Серия испытаний",
+            select(o for o in PMTestSeries)[:],
+            lambda o: o.Name,
+            threshold,
+            aliases,
+            "test_series",
+        )
+        self._properties = _FuzzyIndex(
+            "Свойство", select(o for o in PmProperty)[:], lambda o: o.Name, threshold, aliases, "property"
+        )
+        self._methods = _FuzzyIndex(
+            "Метод", select(o for o in PmTestMethod)[:], lambda o: o.Name, threshold, aliases, "method"
+        )
+        self._equipments = _FuzzyIndex(
+            "Оборудование", select(o for o in PmTestEquipment)[:], lambda o: o.Name, threshold, aliases, "equipment"
+        )
+        self._petrotypes = _FuzzyIndex(
+            "Петротип", select(o for o in Petrotype)[:], lambda o: o.Name, threshold, aliases, "petrotype"
+        )
+        self._petrotype_structs: Dict[Petrotype, _FuzzyIndex] = {}
+        for o in select(o for o in PetrotypeStruct)[:]:
+            self.add_petrotype_struct(o)
+        self._sample_sets: Dict[Tuple[PMTestSeries, str], PMSampleSet] = {}
+        for o in select(o for o in PMSampleSet)[:]:
+            self.add_sample_set(o)
+        self._samples: Dict[Tuple[PMSampleSet, str], PMSample] = {}
+        for o in select(o for o in PMSample)[:]:
+            self.add_sample(o)
+        self._documents: Dict[str, FoundationDocument] = {}
+        self._mine_objects: Dict[str, MineObject] = {}
+        self._orig_sample_sets: Dict[Tuple[MineObject, str, str], OrigSampleSet] = {}
+
+    def prefetch_names(
+        self, executor: Executor, chunks: int, test_series=(), properties=(), methods=(), equipments=(), petrotypes=()
+    ):
+        """
+        Заранее выполняет нечеткий поиск всех переданных названий в пуле процессов (частями по chunks),
+        после чего find_* берут результат из памяти
+        """
+        for index, names in [
+            (self._test_series, test_series),
+            (self._properties, properties),
+            (self._methods, methods),
+            (self._equipments, equipments),
+            (self._petrotypes, petrotypes),
+        ]:
+            index.prefetch(set(names), executor, chunks)
+
+    def learn_aliases(self):
+        for index in [self._test_series, self._properties, self._methods, self._equipments, self._petrotypes]:
+            index.learn_aliases()
+
+    def get_ambiguous(self) -> List[Tuple[str, str, List[str]]]:
+        """(что искали, название, подходящие варианты) для неоднозначных совпадений"""
+        indexes = [self._test_series, self._properties, self._methods, self._equipments, self._petrotypes]
+        indexes.extend(self._petrotype_structs.values())
+        return [(index.label, name, candidates) for index in indexes for name, candidates in index.get_ambiguous()]
+
+    def find_test_series(self, name) -> PMTestSeries:
+        return self._test_series.find(name)
+
+    def add_test_series(self, o: PMTestSeries):
+        self._test_series.add(o)
+
+    def find_property(self, name) -> PmProperty:
+        return self._properties.find(name)
+
+    def find_method(self, name) -> PmTestMethod:
+        return self._methods.find(name)
+
+    def find_equipment(self, name) -> PmTestEquipment:
+        return self._equipments.find(name)
+
+    def find_petrotype(self, name) -> Petrotype:
+        return self._petrotypes.find(name)
+
+    def add_petrotype(self, o: Petrotype):
+        self._petrotypes.add(o)
+
+    def find_petrotype_struct(self, name, petrotype: Petrotype) -> PetrotypeStruct:
+        index = self._petrotype_structs.get(petrotype)
+        return index.find(name) if index is not None else None
+
+    def add_petrotype_struct(self, o: PetrotypeStruct):
+        if o.petrotype not in self._petrotype_structs:
+            self._petrotype_structs[o.petrotype] = _FuzzyIndex(
+                "Структура петротипа", [], lambda o: o.Name, self.threshold
+            )
+        self._petrotype_structs[o.petrotype].add(o)
+
+    def find_sample_set(self, test_series: PMTestSeries, number) -> PMSampleSet:
+        return self._sample_sets.get((test_series, number))
+
+    def add_sample_set(self, o: PMSampleSet):
+        self._sample_sets.setdefault((o.pm_test_series, o.Number), o)
+
+    def find_sample(self, sample_set: PMSampleSet, number) -> PMSample:
+        return self._samples.get((sample_set, number))
+
+    def add_sample(self, o: PMSample):
+        self._samples.setdefault((o.pm_sample_set, o.Number), o)
+
+    def find_document(self, number) -> FoundationDocument:
+        if number not in self._documents:
+            self._documents[number] = select(o for o in FoundationDocument if o.Number == number).first()
+        return self._documents[number]
+
+    def find_mine_object(self, name) -> MineObject:
+        if name not in self._mine_objects:
+            self._mine_objects[name] = select(o for o in MineObject if name in o.Name and o.Type == "FIELD").first()
+        return self._mine_objects[name]
+
+    def find_orig_sample_set(self, mine_object: MineObject, name, _type) -> OrigSampleSet:
+        key = (mine_object, name, _type)
+        if key not in self._orig_sample_sets:
+            self._orig_sample_sets[key] = select(
+                o for o in OrigSampleSet if o.SampleType == _type and o.mine_object == mine_object and name in o.Number
+            ).first()
+        return self._orig_sample_sets[key]
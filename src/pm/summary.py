@@ -0,0 +1,419 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from pony.orm import db_session
+from pubsub import pub
+
+from src.database import db
+from src.datetimeutil import encode_date
+
+# Сообщение pubsub об изменении значений свойств образцов (запись, импорт)
+PM_VALUES_CHANGED = "pm.values.changed"
+
+# Образцы с данными для столбцов сводной таблицы. Условия фильтра подставляются в %(where)s
+_SAMPLES_SQL = """
+    SELECT
+        s."RID" AS "RID",
+        ts."Number" AS test_series,
+        mo."Name" AS mine_object,
+        ss."Number" AS sample_set,
+        s."Number" AS sample,
+        ss."TestDate" AS test_date,
+        CASE WHEN os."SampleType" = 'CORE' THEN split_part(bh."Number", '@', 1) END AS bore_hole,
+        pt."Name" AS petrotype,
+        s."MassAirDry" AS mass_air_dry,
+        s."Length1" AS length_1,
+        s."Length2" AS length_2,
+        s."Height" AS height,
+        pt."RID" AS petrotype_rid
+    FROM "PMSamples" s
+        JOIN "PMSampleSets" ss ON ss."RID" = s."SSID"
+        JOIN "PMTestSeries" ts ON ts."RID" = ss."TSID"
+        JOIN "MineObjects" mo ON mo."RID" = ss."MOID"
+        JOIN "PetrotypeStructs" pts ON pts."RID" = ss."PTSID"
+        JOIN "Petrotypes" pt ON pt."RID" = pts."PTID"
+        JOIN "OrigSampleSets" os ON os."RID" = s."OSSID"
+        LEFT JOIN "BoreHoles" bh ON bh."RID" = os."HID"
+    WHERE %(where)s
+"""
+
+# Временная таблица отобранных образцов (существует до конца транзакции)
+_SAMPLES_TABLE = "pm_summary_samples"
+
+# Свойства, значения которых есть у отобранных образцов
+_PROPERTIES_SQL = """
+    SELECT p."RID", p."Code", p."Name", p."Unit" FROM "PMProperties" p
+    WHERE %(where)s
+    ORDER BY p."RID"
+"""
+
+_USED_PROPERTIES_WHERE = """
+    p."RID" IN (
+        SELECT v."PRID" FROM "PMSamplePropertyValues" v
+        WHERE v."RSID" IN (SELECT "RID" FROM (%(samples)s) samples)
+    )
+"""
+
+# Разворот значений свойств в столбцы: по одному агрегату с FILTER на свойство (и метод в расширенном режиме)
+_PIVOT_SQL = """
+    WITH samples AS (%(samples)s),
+    pivot AS (
+        SELECT v."RSID"%(aggregates)s
+        FROM "PMSamplePropertyValues" v
+            JOIN "PMTestMethods" m ON m."RID" = v."TMID"
+        WHERE v."RSID" IN (SELECT "RID" FROM samples) AND v."PRID" = ANY($property_rids)
+        GROUP BY v."RSID"
+    )
+    SELECT samples."RID", %(sample_columns)s%(pivot_columns)s
+    FROM samples %(join)s JOIN pivot ON pivot."RSID" = samples."RID"
+    ORDER BY samples.test_series, samples.sample_set, samples.sample
+"""
+
+# Статистика значений свойств по свойству, петротипу и методу испытаний
+_STATS_SQL = """
+    WITH samples AS (%(samples)s)
+    SELECT
+        p."Name",
+        samples.petrotype,
+        m."Name",
+        stddev_pop(v."Value"),
+        avg(v."Value"),
+        min(v."Value"),
+        max(v."Value"),
+        count(*)
+    FROM "PMSamplePropertyValues" v
+        JOIN samples ON samples."RID" = v."RSID"
+        JOIN "PMProperties" p ON p."RID" = v."PRID"
+        JOIN "PMTestMethods" m ON m."RID" = v."TMID"
+    WHERE %(where)s
+    GROUP BY p."RID", samples.petrotype_rid, samples.petrotype, m."RID"
+"""
+
+_SAMPLE_FIELDS = [
+    "test_series",
+    "mine_object",
+    "sample_set",
+    "sample",
+    "test_date",
+    "bore_hole",
+    "petrotype",
+    "mass_air_dry",
+    "length_1",
+    "length_2",
+    "height",
+]
+
+
+def _to_pyformat(sql: str) -> str:
+    """Параметры $name в стиле Pony -> %(name)s для курсора psycopg2"""
+    return re.sub(r"\$(\w+)", r"%(\1)s", sql.replace("%", "%%"))
+
+
+class SummaryCancelled(Exception): ...
+
+
+@dataclass
+class SummaryProperty:
+    rid: int
+    code: str
+    name: str
+    unit: str = None
+
+
+@dataclass
+class SummaryData:
+    properties: List[SummaryProperty] = field(default_factory=list)
+    # Строки таблицы: id столбца -> значение (число для числовых столбцов, строка для остальных)
+    rows: List[Dict] = field(default_factory=list)
+
+
+@dataclass
+class SummaryFrame:
+    """
+    Данные для обеих вкладок сводной таблицы по одному фильтру
+    """
+
+    # Строки в расширенном виде (с методами), компактный режим берет из них только свои столбцы
+    summary: SummaryData
+    stats: List[Dict]
+
+
+def filter_key(filter) -> Tuple:
+    """
+    Канонический ключ фильтра: одинаковые условия дают одинаковый ключ независимо от порядка выбора объектов
+    """
+
+    def rids(objects):
+        return tuple(sorted(o.RID for o in objects)) if objects is not None else None
+
+    if not filter.use_filter:
+        return (False,)
+    return (
+        True,
+        rids(filter.test_series),
+        rids(filter.fields),
+        rids(filter.petrotypes),
+        encode_date(filter.test_date_from) if filter.test_date_from is not None else None,
+        encode_date(filter.test_date_to) if filter.test_date_to is not None else None,
+        filter.exclude_none_test_date,
+        rids(filter.properties),
+        filter.properties_hide_no_values_samples,
+    )
+
+
+def make_samples_where(filter) -> Tuple[str, Dict]:
+    """
+    Условия отбора образцов по фильтру сводной таблицы для запроса _SAMPLES_SQL и его параметры
+    """
+    conditions = ["TRUE"]
+    params = {}
+    if not filter.use_filter:
+        return conditions[0], params
+    if filter.petrotypes is not None:
+        conditions.append('pt."RID" = ANY($petrotype_rids)')
+        params["petrotype_rids"] = [o.RID for o in filter.petrotypes]
+    if filter.fields is not None:
+        conditions.append('ss."MOID" = ANY($field_rids)')
+        params["field_rids"] = [o.RID for o in filter.fields]
+    if filter.test_date_from is not None:
+        conditions.append('ss."TestDate" >= $date_from')
+        params["date_from"] = encode_date(filter.test_date_from)
+    if filter.test_date_to is not None:
+        conditions.append('ss."TestDate" <= $date_to')
+        params["date_to"] = encode_date(filter.test_date_to)
+    if filter.exclude_none_test_date:
+        conditions.append('ss."TestDate" IS NOT NULL')
+    if filter.test_series is not None:
+        conditions.append('ss."TSID" = ANY($test_series_rids)')
+        params["test_series_rids"] = [o.RID for o in filter.test_series]
+    return " AND ".join(conditions), params
+
+
+class PmSummaryData:
+    """
+    Данные сводной таблицы физико-механических свойств. Отбор образцов и разворот значений свойств
+    в столбцы выполняются в БД, в приложение приходят готовые строки таблицы.
+    Выполняющиеся загрузки можно прервать из другого потока методом cancel().
+    """
+
+    def __init__(self, page_size=1000):
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._connections = []
+        self._cancelled = set()
+
+    @db_session(ddl=True)
+    def load_frame(self, filter, on_page: Callable = None) -> SummaryFrame:
+        """
+        Данные для таблицы и статистики. Образцы по фильтру отбираются один раз во временную таблицу,
+        остальные запросы соединяются с ней, а не повторяют отбор или список номеров образцов.
+        Строки таблицы читаются страницами по page_size, после каждой вызывается
+        on_page(properties, rows, loaded, total). При отмене - SummaryCancelled.
+        """
+        connection = db.get_connection()
+        with self._lock:
+            self._connections.append(connection)
+        try:
+            where, params = make_samples_where(filter)
+            db.execute("DROP TABLE IF EXISTS %s" % _SAMPLES_TABLE)
+            db.execute(
+                "CREATE TEMP TABLE %s ON COMMIT DROP AS %s" % (_SAMPLES_TABLE, _SAMPLES_SQL % {"where": where}),
+                params,
+            )
+            db.execute('CREATE INDEX ON %s ("RID")' % _SAMPLES_TABLE)
+            db.execute("ANALYZE %s" % _SAMPLES_TABLE)
+            total = db.select("SELECT count(*) FROM %s" % _SAMPLES_TABLE)[0]
+            samples_sql = "SELECT * FROM %s" % _SAMPLES_TABLE
+            summary = self._load_summary(filter, samples_sql, {}, True, on_page, total, connection)
+            return SummaryFrame(summary, self._load_stats(filter, samples_sql, {}))
+        except SummaryCancelled:
+            raise
+        except Exception as e:
+            if self._is_cancelled(connection):
+                raise SummaryCancelled() from e
+            raise
+        finally:
+            with self._lock:
+                self._connections.remove(connection)
+                self._cancelled.discard(id(connection))
+
+    def cancel(self):
+        """Прерывает все выполняющиеся загрузки (из любого потока)."""
+        with self._lock:
+            for connection in self._connections:
+                self._cancelled.add(id(connection))
+                try:
+                    connection.cancel()
+                except Exception as e:
+                    logging.warning("Не удалось прервать загрузку сводной таблицы: %s" % e)
+
+    def _is_cancelled(self, connection) -> bool:
+        with self._lock:
+            return id(connection) in self._cancelled
+
+    def _load_summary(
+        self, filter, samples_sql, params, extended, on_page=None, total=None, connection=None
+    ) -> SummaryData:
+        params = dict(params)
+        data = SummaryData(properties=self._load_properties(filter, samples_sql, params))
+        aggregates = []
+        pivot_columns = []
+        # Значение и метод берутся из одной и той же (последней добавленной) строки значений свойства
+        for index, property in enumerate(data.properties):
+            aggregates.append(
+                ', (array_agg(v."Value" ORDER BY v."RID" DESC) FILTER (WHERE v."PRID" = %d))[1] AS value_%d'
+                % (property.rid, index)
+            )
+            pivot_columns.append(", pivot.value_%d" % index)
+            if extended:
+                aggregates.append(
+                    ', (array_agg(m."Name" ORDER BY v."RID" DESC) FILTER (WHERE v."PRID" = %d))[1] AS method_%d'
+                    % (property.rid, index)
+                )
+                pivot_columns.append(", pivot.method_%d" % index)
+        sql = _PIVOT_SQL % {
+            "samples": samples_sql,
+            "sample_columns": ", ".join("samples.%s" % name for name in _SAMPLE_FIELDS),
+            "aggregates": "".join(aggregates),
+            "pivot_columns": "".join(pivot_columns),
+            # Образцы без значений выбранных свойств отбрасываются соединением
+            "join": "" if filter.use_filter and filter.properties_hide_no_values_samples else "LEFT",
+        }
+        params["property_rids"] = [property.rid for property in data.properties]
+        first_value = len(_SAMPLE_FIELDS) + 1
+        step = 2 if extended else 1
+        # Именованный (серверный) курсор: строки передаются страницами по мере чтения, а не целиком
+        # при выполнении запроса, поэтому отмена прерывает и передачу
+        cursor = db.get_connection().cursor(name="pm_summary_pivot")
+        try:
+            cursor.itersize = self.page_size
+            cursor.execute(_to_pyformat(sql), params)
+            while True:
+                records = cursor.fetchmany(self.page_size)
+                if len(records) == 0:
+                    break
+                if connection is not None and self._is_cancelled(connection):
+                    raise SummaryCancelled()
+                page = [self._make_row(record, data.properties, extended, first_value, step) for record in records]
+                data.rows.extend(page)
+                if on_page is not None:
+                    on_page(data.properties, page, len(data.rows), total)
+        finally:
+            # После отмены или ошибки транзакция прервана и закрытие курсора тоже падает,
+            # его ошибка не должна скрыть исходную
+            try:
+                cursor.close()
+            except Exception as e:
+                logging.warning("Не удалось закрыть курсор сводной таблицы: %s" % e)
+        return data
+
+    def _make_row(self, record, properties, extended, first_value, step) -> Dict:
+        row = dict(zip(_SAMPLE_FIELDS, record[1:first_value]))
+        row["sample_set"] = str(row["sample_set"])
+        row["sample"] = str(row["sample"])
+        row["test_date"] = str(row["test_date"]) if row["test_date"] is not None else ""
+        for index, property in enumerate(properties):
+            value = record[first_value + index * step]
+            if value is None:
+                continue
+            row[property.code] = value
+            if extended:
+                row["%s_method" % property.code] = record[first_value + index * step + 1]
+        return row
+
+    def _load_stats(self, filter, samples_sql, params) -> List[Dict]:
+        """
+        Строки таблицы статистики: среднее, среднеквадратичное отклонение (по генеральной совокупности),
+        коэффициент вариации, минимум, максимум и количество значений по свойству, петротипу и методу
+        """
+        params = dict(params)
+        if filter.use_filter and filter.properties is not None:
+            properties_where = 'v."PRID" = ANY($selected_property_rids)'
+            params["selected_property_rids"] = [o.RID for o in filter.properties]
+        else:
+            properties_where = "TRUE"
+        sql = _STATS_SQL % {"samples": samples_sql, "where": properties_where}
+        rows = []
+        for property_name, petrotype, method, std, avg, min_value, max_value, count in db.select(sql, params):
+            rows.append(
+                {
+                    "pm_property": property_name,
+                    "litotype": petrotype,
+                    "pm_root_mean_sqr_dev": std,
+                    "pm_variation_coeff": std / avg if avg != 0 else 0.0,
+                    "pm_avg_value": avg,
+                    "pm_min_value": min_value,
+                    "pm_max_value": max_value,
+                    "pm_sample_cnt": count,
+                    "pm_method": method,
+                }
+            )
+        # Сортировка в Python, а не в БД, чтобы порядок не зависел от правил сортировки (collation) сервера
+        rows.sort(key=lambda x: (x["pm_property"], x["litotype"], x["pm_method"]))
+        return rows
+
+    def _load_properties(self, filter, samples_sql, params) -> List[SummaryProperty]:
+        if filter.use_filter and filter.properties is not None:
+            where = 'p."RID" = ANY($selected_property_rids)'
+            params = {**params, "selected_property_rids": [o.RID for o in filter.properties]}
+        else:
+            where = _USED_PROPERTIES_WHERE % {"samples": samples_sql}
+        return [SummaryProperty(*record) for record in db.select(_PROPERTIES_SQL % {"where": where}, params)]
+
+
+class SummaryCache:
+    """
+    Кэш данных сводной таблицы по ключу фильтра, общий для таблицы и статистики.
+    Хранит max_entries последних фильтров, сбрасывается при изменении объектов и значений свойств.
+    """
+
+    def __init__(self, data: PmSummaryData = None, max_entries=8):
+        self._data = data if data is not None else PmSummaryData()
+        self.max_entries = max_entries
+        self._frames: OrderedDict[Tuple, SummaryFrame] = OrderedDict()
+        self._lock = threading.Lock()
+        # Увеличивается при сбросе, чтобы не сохранить данные загрузки, начатой до изменений
+        self._generation = 0
+        pub.subscribe(self._on_values_changed, PM_VALUES_CHANGED)
+        for topic in ("object.added", "object.updated", "object.deleted"):
+            pub.subscribe(self._on_object_changed, topic)
+
+    def get(self, filter, on_page: Callable = None) -> Tuple[SummaryFrame, bool]:
+        """
+        Данные по фильтру из кэша или из БД и признак, что они взяты из кэша.
+        on_page вызывается только при загрузке из БД (см. load_frame)
+        """
+        key = filter_key(filter)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame, True
+            generation = self._generation
+        frame = self._data.load_frame(filter, on_page)
+        with self._lock:
+            if generation != self._generation:
+                return frame, False
+            self._frames[key] = frame
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+        return frame, False
+
+    def invalidate(self):
+        with self._lock:
+            self._frames.clear()
+            self._generation += 1
+
+    def cancel(self):
+        """Прерывает выполняющиеся загрузки из БД"""
+        self._data.cancel()
+
+    def _on_values_changed(self):
+        self.invalidate()
+
+    def _on_object_changed(self, o):
+        self.invalidate()
@@ -1,415 +1,414 @@
 import io
+import itertools
 import os
 import warnings
-from dataclasses import dataclass
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List
 
 import wx
-from pony.orm import commit, db_session, select
-from rapidfuzz import fuzz, process
+from pony.orm import commit, db_session
+from pubsub import pub
 
 from src.database import (
-    FoundationDocument,
-    MineObject,
-    OrigSampleSet,
     Petrotype,
     PetrotypeStruct,
     PmPerformedTask,
-    PmProperty,
     PMSample,
-    PmSamplePropertyValue,
     PMSampleSet,
-    PmTaskMethodForSample,
-    PmTestEquipment,
-    PmTestMethod,
     PMTestSeries,
+    db,
 )
 from src.datetimeutil import encode_date
+from src.ctx import app_ctx
+from src.pm.aliases import NameAliases
+from src.pm.bulk_writer import PmValuesBulkWriter
+from src.pm.fms_reader import FmsWorkbookReader, PmDbHeader
+from src.pm.import_resolver import FmsImportResolver
+from src.pm.summary import PM_VALUES_CHANGED
 from src.ui.icon import get_icon
 from src.ui.task import Task, TaskJob
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-HANDMADE_PROPS = [
-    "Масса в естественно-влажном состоянии",
-    "Масса в воде",
-    "Масса в водонасыщенном состоянии",
-    "Масса в водонасыщенном состоянии в воде",
-    "Масса в сухом состоянии",
-]
-PROPS = [
-    "Естественная влажность",
-    "Водопоглощение",
-    "Плотность",
-    "Удельный вес",
-    "Разрушающая нагрузка при одноосном сжатии",
-    "Предел прочности при одноосном сжатии",
-    "Разрушающая нагрузка при одноосном растяжении",
-    "Предел прочности при одноосном растяжении",
-    "Коэффициент хрупкости",
-    "Модуль упругости",
-    "Модуль деформации",
-    "Модуль спада",
-    "Коэффициент Пуассона",
-    "Коэффициент поперечных деформаций",
-    "Коэффициент удароопасности",
-    "Коэффициент крепости по М.М. Протодьяконову",
-    "Коэффициент бокового распора",
-    "Модуль сдвига",
-    "Боковое давление",
-    "Дифференциальная прочность",
-    "Предел прочности при объемном сжатии",
-    "Показатель абразивности",
-]
+_STORED_VALUES_SQL = """
+    SELECT "RSID", "PRID", "TMID", "Value"
+    FROM "PMSamplePropertyValues"
+    WHERE "RSID" = ANY($rsids)
+"""
 
 
 @dataclass
-class PmDbPropertyHeader:
-    name: str
-    field: int
-    method: int
-    equipment: int
-    is_handmade_property: bool = False
+class FmsImportReport:
+    # Сообщение -> номера строк файла
+    unresolved: Dict[str, List[int]] = field(default_factory=dict)
+    ambiguous: List[str] = field(default_factory=list)
+    changes: List[str] = field(default_factory=list)
+    new_samples: int = 0
+
+    def add_unresolved(self, line, message):
+        self.unresolved.setdefault(message, []).append(line)
+
+    def is_valid(self) -> bool:
+        return len(self.unresolved) == 0
+
+    def format(self) -> str:
+        lines = []
+        if len(self.unresolved) > 0:
+            lines.append("Не найдено в базе данных или содержит ошибки:")
+            for message, rows in self.unresolved.items():
+                numbers = ", ".join(str(row) for row in rows[:10]) + (", ..." if len(rows) > 10 else "")
+                lines.append("    %s (строки: %s)" % (message, numbers))
+        if len(self.ambiguous) > 0:
+            lines.append("Неоднозначные совпадения (выбран первый вариант):")
+            lines.extend("    " + message for message in self.ambiguous)
+        if len(self.changes) > 0:
+            lines.append("Изменение существующих значений:")
+            lines.extend("    " + message for message in self.changes)
+        lines.append("Будет создано образцов: %d" % self.new_samples)
+        return "\n".join(lines)
 
 
 @dataclass
-class PmDbHeader:
-    test_series_field: int
-    doc_date_field: int
-    sample_set_field: int
-    mine_object_field: int
-    sample_set_field: int
-    bore_hole_field: int
-    box_number_field: int
-    depth_start_field: int
-    depth_end_field: int
-    petrotype_field: int
-    petrotype_struct_field: int
-    sample_type_field: int
-    sample_field: int
-    length1_field: int
-    length2_field: int
-    height_field: int
-    mass_air_dry_field: int
-    properties: List[PmDbPropertyHeader]
-
-
-def find_header(df) -> PmDbHeader:
-    h = PmDbHeader(
-        test_series_field=df.columns.get_loc("Отчет по х/д №"),
-        doc_date_field=df.columns.get_loc("Дата заключения х/д"),
-        sample_set_field=df.columns.get_loc("№ пробы"),
-        mine_object_field=df.columns.get_loc("Месторождение"),
-        bore_hole_field=df.columns.get_loc("№ скважины"),
-        box_number_field=df.columns.get_loc("№ ящиков"),
-        depth_start_field=df.columns.get_loc("№ ящиков") + 1,
-        depth_end_field=df.columns.get_loc("№ ящиков") + 2,
-        sample_type_field=df.columns.get_loc("Тип каменного материала"),
-        sample_field=df.columns.get_loc("№ образца"),
-        length1_field=df.columns.get_loc("Диаметр, см"),
-        length2_field=df.columns.get_loc("Высота, см"),
-        height_field=df.columns.get_loc("Высота, см"),
-        petrotype_field=df.columns.get_loc("Петротип"),
-        petrotype_struct_field=df.columns.get_loc("Описание структуры петротипа"),
-        mass_air_dry_field=df.columns.get_loc("Масса в воздушно-сухом состоянии, г"),
-        properties=[],
-    )
-    for prop_name in HANDMADE_PROPS:
-        h.properties.append(
-            PmDbPropertyHeader(
-                name=prop_name, field=df.columns.get_loc(prop_name), method=-1, equipment=-1, is_handmade_property=True
-            )
-        )
-    return h
+class FmsImportPlan:
+    path: str
+    report: FmsImportReport
 
 
-class DoImportTask(TaskJob):
-    def __init__(self, path):
-        super().__init__()
-        self.path = path
-        self.changed_objects = []
+def _iter_import_rows(reader: FmsWorkbookReader):
+    for line, row in reader.rows():
+        if len(row[reader.header.test_series_field]) > 0:
+            yield line, row
 
-    @db_session
-    def run(self):
-        log = io.StringIO()
-        self.do_import(log)
 
-    def do_import(self, log):
-        import pandas as pd
-
-        pm_samples = list(select(s for s in PMSample).prefetch(PMSample.pm_sample_set, PMSampleSet.pm_test_series)[:])
-        pm_properties = list(select(s for s in PmProperty)[:])
-        pm_methods = list(select(s for s in PmTestMethod)[:])
-        pm_equipments = list(select(s for s in PmTestEquipment)[:])
-        pm_test_series = list(select(s for s in PMTestSeries)[:])
-        pm_sample_sets = list(select(s for s in PMSampleSet)[:])
-        pm_property_values = list(select(s for s in PmSamplePropertyValue)[:])
-        petrotypes = list(select(s for s in Petrotype)[:])
-        petrotype_structs = list(select(s for s in PetrotypeStruct)[:])
-
-        threshold = 90
-
-        def find_test_series(name):
-            r = process.extractOne(name, [a.Name for a in pm_test_series], scorer=fuzz.ratio, score_cutoff=threshold)
-            if r is None:
-                return None
-            return pm_test_series[r[2]]
-
-        def find_sample_set(test_series, name):
-            results = process.extract(
-                name, [a.Number for a in pm_sample_sets], scorer=fuzz.ratio, limit=1000, score_cutoff=100
-            )
-            for _, _, index in results:
-                result = pm_sample_sets[index]
-                if result.pm_test_series == test_series:
-                    return result
-            return None
-
-        def find_sample(sample_set, name):
-            results = process.extract(
-                name, [a.Number for a in pm_samples], scorer=fuzz.ratio, limit=1000, score_cutoff=100
-            )
-            for _, _, index in results:
-                result = pm_samples[index]
-                if result.pm_sample_set == sample_set:
-                    return result
-            return None
-
-        @db_session
-        def find_orig_sample_set(mine_object, name, _type):
-            return select(
-                o for o in OrigSampleSet if o.SampleType == _type and o.mine_object == mine_object and name in o.Number
-            ).first()
-
-        def find_property(name):
-            r = process.extractOne(name, [a.Name for a in pm_properties], scorer=fuzz.ratio, score_cutoff=threshold)
-            if r is None:
-                return None
-            return pm_properties[r[2]]
-
-        def find_property_value(sample, property, method):
-            for prop_value in pm_property_values:
-                if (
-                    prop_value.pm_sample == sample
-                    and prop_value.pm_property == property
-                    and prop_value.pm_test_method == method
-                ):
-                    return prop_value
-
-            return None
-
-        def find_method(name):
-            r = process.extractOne(name, [a.Name for a in pm_methods], scorer=fuzz.ratio, score_cutoff=threshold)
-            if r is None:
-                return None
-            return pm_methods[r[2]]
-
-        def find_equipment(name):
-            r = process.extractOne(name, [a.Name for a in pm_equipments], scorer=fuzz.ratio, score_cutoff=threshold)
-            if r is None:
-                return None
-            return pm_equipments[r[2]]
-
-        def find_document(name, date=None):
-            return select(o for o in FoundationDocument if name == o.Number).first()
-
-        def find_petrotype(name):
-            r = process.extractOne(name, [a.Name for a in petrotypes], scorer=fuzz.ratio, score_cutoff=threshold)
-            if r is None:
-                return None
-            return petrotypes[r[2]]
-
-        def find_petrotype_struct(name, petrotype):
-            r = process.extractOne(
-                name,
-                [a.Name for a in petrotype_structs if a.petrotype == petrotype],
-                scorer=fuzz.ratio,
-                score_cutoff=threshold,
-            )
-            if r is None:
-                return None
-            return petrotype_structs[r[2]]
-
-        @db_session
-        def find_mine_object(name):
-            return select(o for o in MineObject if name in o.Name and o.Type == "FIELD").first()
-
-        column_list = []
-        df_column = pd.read_excel(self.path, 0).columns
-        for i in df_column:
-            column_list.append(i)
-        converter = {col: str for col in column_list}
-        df = pd.read_excel(self.path, sheet_name=0, header=0, converters=converter)
-
-        hdr = find_header(df)
-
-        for index, row in enumerate(df.iterrows()):
-            if index == 0:
-                continue
+def _get_aliases():
+    return NameAliases(os.path.join(app_ctx().datadir, "fms_aliases.json"))
 
-            self.set_progress(index, df.shape[0])
 
-            # Выбрать столбцы для серии испытаний найти в БД. Найти в бд договор с таким номером если не выдать ошибку. Если есть создать и связать
-            # Выбрать столбцы для пробы найти в бд или создать и связать с серией испытаний
-            # Выбрать столбцы для набора образцов (скважина, штуф или дисперсный материал) найти в бд или выдать ошибку
-            # Выбрать столбцы для образца найти в БД или создать связать с пробой и набором образцов
-            # Выбрать столбцы для handmade props найти свойство Физическая энциклопедия и связать значение если нет выдать ошибку
-            # Выбрать другие свойства с методами и используемым оборудованием связать с образцом методом испытаний и используемым оборудованием если метода или используемого оборудования нет то выдать ошибку
+def _row_progress(line, total):
+    # Число строк листа известно не всегда, тогда прогресс неопределенный
+    return min(line - 2, total) if total > 0 else -1
 
-            if len(str(row[1][hdr.test_series_field])) == 0 or pd.isna(row[1][hdr.test_series_field]):
-                continue
 
-            test_series_name = (
-                "№"
-                + str(row[1][hdr.test_series_field])
-                + " "
-                + ".".join(reversed(str(row[1][hdr.doc_date_field]).split(" ")[0].split("-")))
-            )
-            test_series = find_test_series(test_series_name)
-            if test_series is None:
-                document = find_document("№" + str(row[1][hdr.test_series_field]))
-                if document is None:
-                    raise Exception("Документ №%s отсутствует в базе данных." % row[1][hdr.test_series_field])
-                test_series = PMTestSeries(Number=test_series_name, foundation_document=document)
-                pm_test_series.append(test_series)
-
-            petrotype = find_petrotype(row[1][hdr.petrotype_field])
-            if petrotype is None:
-                petrotype = Petrotype(Name=row[1][hdr.petrotype_field])
-                petrotypes.append(petrotype)
-
-            petrotype_struct = find_petrotype_struct(row[1][hdr.petrotype_struct_field], petrotype)
-            if petrotype_struct is None:
-                petrotype_struct = PetrotypeStruct(Name=row[1][hdr.petrotype_struct_field], petrotype=petrotype)
-                petrotype_structs.append(petrotype_struct)
-
-            sample_set = find_sample_set(test_series, row[1][hdr.sample_set_field])
-            if sample_set is None:
-                mine_object = find_mine_object(row[1][hdr.mine_object_field])
-                if mine_object is None:
-                    raise Exception("Месторождение %s отсутствует в базе данных." % row[1][hdr.mine_object_field])
-                sample_set = PMSampleSet(
-                    pm_test_series=test_series,
-                    mine_object=mine_object,
-                    Number=row[1][hdr.sample_set_field],
-                    RealDetails=True,
-                    petrotype_struct=petrotype_struct,
-                )
-                pm_sample_sets.append(sample_set)
+def _iter_batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if len(batch) == 0:
+            return
+        yield batch
 
-            sample = find_sample(sample_set, row[1][hdr.sample_field])
-            if sample is None:
-                if row[1][hdr.sample_type_field] == "Керн":
-                    name = row[1][hdr.bore_hole_field]
-                    _type = "CORE"
-                else:
-                    name = test_series_name
-                    if row[1][hdr.sample_type_field] == "Штуф":
-                        _type = "STUFF"
-                    else:
-                        _type = "DISPECE"
-                orig_sample_set = find_orig_sample_set(sample_set.mine_object, name, _type)
-                if orig_sample_set is None:
-                    raise Exception("Набор образцов %s отсутствует в базе данных." % name)
-
-                log.write("Create %s - %s - %s\n" % (test_series.Name, sample_set.Number, row[1][hdr.sample_field]))
-
-                sample = PMSample(
-                    pm_sample_set=sample_set,
-                    orig_sample_set=orig_sample_set,
-                    Number=row[1][hdr.sample_field],
-                    SetDate=encode_date(row[1][hdr.doc_date_field]),
-                    Length1=(
-                        float(row[1][hdr.length1_field])
-                        if len(row[1][hdr.length1_field]) > 0 and row[1][hdr.length1_field] != "-"
-                        else None
-                    ),
-                    Length2=(
-                        float(row[1][hdr.length2_field])
-                        if len(row[1][hdr.length2_field]) > 0 and row[1][hdr.length2_field] != "-"
-                        else None
-                    ),
-                    Height=(
-                        float(row[1][hdr.height_field])
-                        if len(row[1][hdr.height_field]) > 0 and row[1][hdr.height_field] != "-"
-                        else None
-                    ),
-                    MassAirDry=(
-                        float(row[1][hdr.mass_air_dry_field])
-                        if len(row[1][hdr.mass_air_dry_field]) > 0 and row[1][hdr.mass_air_dry_field] != "-"
-                        else None
-                    ),
-                )
 
-                if _type == "CORE":
-                    sample.StartPosition = float(row[1][hdr.depth_start_field])
-                    sample.EndPosition = float(row[1][hdr.depth_end_field])
-                    sample.BoxNumber = str(row[1][hdr.box_number_field])
+def _make_test_series_name(row, hdr: PmDbHeader):
+    return "№" + row[hdr.test_series_field] + " " + ".".join(reversed(row[hdr.doc_date_field].split(" ")[0].split("-")))
 
-                pm_samples.append(sample)
-            else:
-                log.write("Finded %s - %s - %s\n" % (test_series.Name, sample_set.Number, row[1][hdr.sample_field]))
 
-            method_for_handmade_props = find_method("Физическая энцклопедия")
-            for prop_name, prop_index in HANDMADE_PROPS:
-                if len(row[1][prop_index]) == 0 or row[1][prop_index].strip() == "-":
+def _get_orig_sample_set_key(row, hdr: PmDbHeader, test_series_name):
+    if row[hdr.sample_type_field] == "Керн":
+        return row[hdr.bore_hole_field], "CORE"
+    if row[hdr.sample_type_field] == "Штуф":
+        return test_series_name, "STUFF"
+    return test_series_name, "DISPECE"
+
+
+def _is_empty(value: str):
+    return len(value) == 0 or value.strip() == "-"
+
+
+def _parse_float(value: str):
+    return float(value) if not _is_empty(value) else None
+
+
+_SAMPLE_NUMBER_FIELDS = [
+    ("length1_field", "Диаметр"),
+    ("height_field", "Высота"),
+    ("mass_air_dry_field", "Масса в воздушно-сухом состоянии"),
+]
+
+_HANDMADE_PROPS_METHOD = "Физическая энцклопедия"
+
+
+class ValidateImportTask(TaskJob):
+    """
+    Первый этап импорта: разбор файла и поиск всех объектов БД без изменения данных.
+    Нечеткий поиск всех различных названий выполняется заранее в пуле процессов.
+    Возвращает FmsImportPlan с отчетом о ненайденных объектах, неоднозначных совпадениях
+    и изменяемых значениях.
+    """
+
+    def __init__(self, path, batch_rows=1000):
+        super().__init__()
+        self.path = path
+        self.batch_rows = batch_rows
+
+    @db_session
+    def run(self):
+        report = FmsImportReport()
+        resolver = FmsImportResolver(aliases=_get_aliases())
+        workers = os.cpu_count() or 1
+        with FmsWorkbookReader(self.path) as reader, ProcessPoolExecutor(max_workers=workers) as executor:
+            hdr = reader.header
+            total = reader.total_rows()
+            for batch in _iter_batches(_iter_import_rows(reader), self.batch_rows):
+                if self.cancel_event.is_set():
+                    return None
+                resolver.prefetch_names(
+                    executor,
+                    workers,
+                    test_series=[_make_test_series_name(row, hdr) for _, row in batch],
+                    properties=[p.name for p in hdr.properties],
+                    methods=[_HANDMADE_PROPS_METHOD]
+                    + [
+                        row[p.method]
+                        for _, row in batch
+                        for p in hdr.properties
+                        if not p.is_handmade_property and not _is_empty(row[p.method])
+                    ],
+                    equipments=[
+                        row[p.equipment]
+                        for _, row in batch
+                        for p in hdr.properties
+                        if not p.is_handmade_property and not _is_empty(row[p.equipment])
+                    ],
+                    petrotypes=[row[hdr.petrotype_field] for _, row in batch],
+                )
+                values = []
+                for line, row in batch:
+                    self._validate_row(line, row, hdr, resolver, report, values)
+                self._find_changes(values, report)
+                self.set_progress(_row_progress(batch[-1][0], total), total, "Проверено строк: %d" % batch[-1][0])
+        for label, name, candidates in resolver.get_ambiguous():
+            report.ambiguous.append('%s "%s": %s' % (label, name, "; ".join(candidates)))
+        return FmsImportPlan(self.path, report)
+
+    def _validate_row(self, line, row, hdr: PmDbHeader, resolver: FmsImportResolver, report: FmsImportReport, values):
+        test_series_name = _make_test_series_name(row, hdr)
+        test_series = resolver.find_test_series(test_series_name)
+        if test_series is None and resolver.find_document("№" + row[hdr.test_series_field]) is None:
+            report.add_unresolved(line, "Документ №%s отсутствует в базе данных." % row[hdr.test_series_field])
+
+        sample_set = None
+        if test_series is not None:
+            sample_set = resolver.find_sample_set(test_series, row[hdr.sample_set_field])
+        if sample_set is not None:
+            mine_object = sample_set.mine_object
+        else:
+            mine_object = resolver.find_mine_object(row[hdr.mine_object_field])
+            if mine_object is None:
+                report.add_unresolved(line, "Месторождение %s отсутствует в базе данных." % row[hdr.mine_object_field])
+
+        sample = resolver.find_sample(sample_set, row[hdr.sample_field]) if sample_set is not None else None
+        if sample is None:
+            report.new_samples += 1
+            name, _type = _get_orig_sample_set_key(row, hdr, test_series_name)
+            if mine_object is not None and resolver.find_orig_sample_set(mine_object, name, _type) is None:
+                report.add_unresolved(line, "Набор образцов %s отсутствует в базе данных." % name)
+            fields = list(_SAMPLE_NUMBER_FIELDS)
+            if _type == "CORE":
+                fields += [("depth_start_field", "Начало интервала"), ("depth_end_field", "Конец интервала")]
+            for field_name, label in fields:
+                try:
+                    _parse_float(row[getattr(hdr, field_name)])
+                except ValueError:
+                    report.add_unresolved(line, '%s: неверное число "%s".' % (label, row[getattr(hdr, field_name)]))
+            try:
+                encode_date(row[hdr.doc_date_field])
+            except (ValueError, OverflowError):
+                report.add_unresolved(line, 'Дата заключения х/д: неверная дата "%s".' % row[hdr.doc_date_field])
+
+        for prop_header in hdr.properties:
+            if _is_empty(row[prop_header.field]):
+                continue
+            prop = resolver.find_property(prop_header.name)
+            if prop is None:
+                report.add_unresolved(line, "Свойство %s отсутствует в базе данных." % prop_header.name)
+            if prop_header.is_handmade_property:
+                method_name = _HANDMADE_PROPS_METHOD
+            else:
+                method_name = row[prop_header.method]
+                if _is_empty(method_name):
+                    report.add_unresolved(line, "%s: не указан метод испытания." % prop_header.name)
                     continue
+                if not _is_empty(row[prop_header.equipment]):
+                    if resolver.find_equipment(row[prop_header.equipment]) is None:
+                        report.add_unresolved(
+                            line, "Оборудование %s отсутствует в базе данных." % row[prop_header.equipment]
+                        )
+            method = resolver.find_method(method_name)
+            if method is None:
+                report.add_unresolved(line, "Метод %s отсутствует в базе данных." % method_name)
+            try:
+                value = float(row[prop_header.field])
+            except ValueError:
+                report.add_unresolved(line, '%s: неверное число "%s".' % (prop_header.name, row[prop_header.field]))
+                continue
+            if sample is not None and prop is not None and method is not None:
+                values.append((line, sample, prop, method, value))
+
+    def _find_changes(self, values, report: FmsImportReport):
+        rsids = list({sample.RID for _, sample, _, _, _ in values})
+        stored = {}
+        for rsid, prid, tmid, value in db.select(_STORED_VALUES_SQL, {"rsids": rsids}):
+            stored[(rsid, prid, tmid)] = value
+        for line, sample, prop, method, value in values:
+            old = stored.get((sample.RID, prop.RID, method.RID))
+            if old is not None and old != value:
+                report.changes.append(
+                    "Строка %d: образец %s, проба %s, %s, %s: %s -> %s"
+                    % (line, sample.Number, sample.pm_sample_set.Number, prop.Name, method.Name, old, value)
+                )
+
 
-                prop = find_property(prop_name)
-                if prop is None:
-                    raise Exception("Свойство %s отсутствует в базе данных." % prop_name)
+class DoImportTask(TaskJob):
+    """
+    Второй этап импорта: запись строк, проверенных ValidateImportTask
+    """
+
+    def __init__(self, plan: FmsImportPlan):
+        super().__init__()
+        self.plan = plan
+        self.changed_objects = []
+        self.write_message = None
 
-                if PmTaskMethodForSample.get(pm_sample=sample, pm_method=method_for_handmade_props) is None:
-                    PmTaskMethodForSample(
-                        pm_sample=sample, pm_method=method_for_handmade_props, pm_performed_task=PmPerformedTask[1]
+    @db_session(ddl=True)
+    def run(self):
+        log = io.StringIO()
+        self.do_import(log)
+
+    def do_import(self, log):
+        aliases = _get_aliases()
+        resolver = FmsImportResolver(aliases=aliases)
+        writer = PmValuesBulkWriter(on_flush=self._on_values_written)
+        method_for_handmade_props = resolver.find_method(_HANDMADE_PROPS_METHOD)
+        performed_task = PmPerformedTask[1]
+
+        with FmsWorkbookReader(self.plan.path) as reader:
+            hdr = reader.header
+            total = reader.total_rows()
+            for line, row in _iter_import_rows(reader):
+                self.set_progress(_row_progress(line, total), total, self.write_message)
+
+                test_series_name = _make_test_series_name(row, hdr)
+                test_series = resolver.find_test_series(test_series_name)
+                if test_series is None:
+                    document = resolver.find_document("№" + row[hdr.test_series_field])
+                    if document is None:
+                        raise Exception("Документ №%s отсутствует в базе данных." % row[hdr.test_series_field])
+                    test_series = PMTestSeries(Number=test_series_name, foundation_document=document)
+                    resolver.add_test_series(test_series)
+
+                petrotype = resolver.find_petrotype(row[hdr.petrotype_field])
+                if petrotype is None:
+                    petrotype = Petrotype(Name=row[hdr.petrotype_field])
+                    resolver.add_petrotype(petrotype)
+
+                petrotype_struct = resolver.find_petrotype_struct(row[hdr.petrotype_struct_field], petrotype)
+                if petrotype_struct is None:
+                    petrotype_struct = PetrotypeStruct(Name=row[hdr.petrotype_struct_field], petrotype=petrotype)
+                    resolver.add_petrotype_struct(petrotype_struct)
+
+                sample_set = resolver.find_sample_set(test_series, row[hdr.sample_set_field])
+                if sample_set is None:
+                    mine_object = resolver.find_mine_object(row[hdr.mine_object_field])
+                    if mine_object is None:
+                        raise Exception("Месторождение %s отсутствует в базе данных." % row[hdr.mine_object_field])
+                    sample_set = PMSampleSet(
+                        pm_test_series=test_series,
+                        mine_object=mine_object,
+                        Number=row[hdr.sample_set_field],
+                        RealDetails=True,
+                        petrotype_struct=petrotype_struct,
                     )
-                    print("Handmade PmTaskMethodForSample %s, %s" % (str(sample), str(method_for_handmade_props)))
-
-                value = find_property_value(sample, prop, method_for_handmade_props)
-                if value is None:
-                    value = PmSamplePropertyValue(
-                        pm_sample=sample,
-                        pm_test_method=method_for_handmade_props,
-                        pm_property=prop,
-                        Value=float(row[1][prop_index]),
+                    resolver.add_sample_set(sample_set)
+
+                sample = resolver.find_sample(sample_set, row[hdr.sample_field])
+                if sample is None:
+                    name, _type = _get_orig_sample_set_key(row, hdr, test_series_name)
+                    orig_sample_set = resolver.find_orig_sample_set(sample_set.mine_object, name, _type)
+                    if orig_sample_set is None:
+                        raise Exception("Набор образцов %s отсутствует в базе данных." % name)
+
+                    log.write("Create %s - %s - %s\n" % (test_series.Name, sample_set.Number, row[hdr.sample_field]))
+
+                    sample = PMSample(
+                        pm_sample_set=sample_set,
+                        orig_sample_set=orig_sample_set,
+                        Number=row[hdr.sample_field],
+                        SetDate=encode_date(row[hdr.doc_date_field]),
+                        Length1=_parse_float(row[hdr.length1_field]),
+                        Length2=_parse_float(row[hdr.length2_field]),
+                        Height=_parse_float(row[hdr.height_field]),
+                        MassAirDry=_parse_float(row[hdr.mass_air_dry_field]),
                     )
-                    pm_property_values.append(value)
-                else:
-                    value.Value = float(row[1][prop_index])
 
-            for prop_name, prop_value_index, prop_method_index, prop_equipment_index in PROPS:
-                if len(row[1][prop_value_index]) == 0 or row[1][prop_value_index].strip() == "-":
-                    continue
+                    if _type == "CORE":
+                        sample.StartPosition = _parse_float(row[hdr.depth_start_field])
+                        sample.EndPosition = _parse_float(row[hdr.depth_end_field])
+                        sample.BoxNumber = row[hdr.box_number_field]
 
-                prop = find_property(prop_name)
-                if prop is None:
-                    raise Exception("Свойство %s отсутствует в базе данных." % prop_name)
-                prop_method = find_method(row[1][prop_method_index])
-                if prop_method is None:
-                    raise Exception("Метод %s отсутствует в базе данных." % row[1][prop_method_index])
-                if len(row[1][prop_equipment_index]) == 0 or row[1][prop_equipment_index].strip() == "-":
-                    prop_equipment = None
-                else:
-                    prop_equipment = find_equipment(row[1][prop_equipment_index])
-                    if prop_equipment is None:
-                        raise Exception("Оборудование %s отсутствует в базе данных." % row[1][prop_equipment_index])
-                if PmTaskMethodForSample.get(pm_sample=sample, pm_method=prop_method) is None:
-                    PmTaskMethodForSample(pm_sample=sample, pm_method=prop_method, pm_performed_task=PmPerformedTask[1])
-                    print("PmTaskMethodForSample %s, %s" % (str(sample), str(prop_method)))
-
-                value = find_property_value(sample, prop, prop_method)
-                if value is None:
-                    value = PmSamplePropertyValue(
-                        pm_sample=sample,
-                        pm_test_method=prop_method,
-                        pm_property=prop,
-                        Value=float(row[1][prop_value_index]),
-                    )
-                    pm_property_values.append(value)
+                    resolver.add_sample(sample)
                 else:
-                    value.Value = float(row[1][prop_value_index])
-
+                    log.write("Finded %s - %s - %s\n" % (test_series.Name, sample_set.Number, row[hdr.sample_field]))
+
+                for prop_header in hdr.properties:
+                    if _is_empty(row[prop_header.field]):
+                        continue
+
+                    prop = resolver.find_property(prop_header.name)
+                    if prop is None:
+                        raise Exception("Свойство %s отсутствует в базе данных." % prop_header.name)
+                    if prop_header.is_handmade_property:
+                        prop_method = method_for_handmade_props
+                        if prop_method is None:
+                            raise Exception("Метод %s отсутствует в базе данных." % _HANDMADE_PROPS_METHOD)
+                    else:
+                        prop_method = resolver.find_method(row[prop_header.method])
+                        if prop_method is None:
+                            raise Exception("Метод %s отсутствует в базе данных." % row[prop_header.method])
+                        if not _is_empty(row[prop_header.equipment]):
+                            if resolver.find_equipment(row[prop_header.equipment]) is None:
+                                raise Exception(
+                                    "Оборудование %s отсутствует в базе данных." % row[prop_header.equipment]
+                                )
+                    writer.add_task_method(sample, prop_method, performed_task)
+                    writer.set_value(sample, prop, prop_method, float(row[prop_header.field]))
+
+        writer.flush()
         commit()
+        # Принятые нечеткие совпадения запоминаются, чтобы не искать их в следующих файлах
+        resolver.learn_aliases()
+        aliases.flush()
+
+    def _on_values_written(self, written, rows_per_second):
+        self.write_message = "Записано значений: %d (%d в секунду)" % (written, rows_per_second)
+        # Каждый пакет уже зафиксирован в БД, даже если импорт потом прервется
+        wx.CallAfter(pub.sendMessage, PM_VALUES_CHANGED)
+
+
+class FmsImportReportDialog(wx.Dialog):
+    def __init__(self, parent, report: FmsImportReport):
+        super().__init__(parent, style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.SetIcon(wx.Icon(get_icon("logo")))
+        self.SetTitle("Проверка файла")
+        self.SetSize((700, 500))
+        sz = wx.BoxSizer(wx.VERTICAL)
+        if report.is_valid():
+            label = "Ошибок не найдено. Проверьте изменения перед импортом."
+        else:
+            label = "Импорт невозможен: исправьте ошибки в файле или базе данных."
+        sz.Add(wx.StaticText(self, label=label), 0, wx.EXPAND | wx.ALL, border=10)
+        text = wx.TextCtrl(self, value=report.format(), style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+        sz.Add(text, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, border=10)
+        sz_btn = wx.StdDialogButtonSizer()
+        self.ok_btn = wx.Button(self, wx.ID_OK, "Импортировать")
+        self.ok_btn.SetBitmap(get_icon("import"))
+        self.ok_btn.Enable(report.is_valid())
+        sz_btn.AddButton(self.ok_btn)
+        sz_btn.AddButton(wx.Button(self, wx.ID_CANCEL, "Отмена"))
+        sz_btn.Realize()
+        sz.Add(sz_btn, 0, wx.ALIGN_RIGHT | wx.ALL, border=10)
+        self.SetSizer(sz)
+        self.Layout()
 
 
 class FmsImportDialog(wx.Dialog):
@@ -446,12 +445,29 @@ class FmsImportDialog(wx.Dialog):
         self.ok_btn.Enable(os.path.exists(self.file.GetPath()))
 
     def on_import(self, event):
-        self.task = Task("Импорт замеров...", "Идет импорт замеров", DoImportTask(self.file.GetPath()), self)
+        self.task = Task("Проверка файла...", "Идет проверка файла", ValidateImportTask(self.file.GetPath()), self)
+        self.task.then(self.on_validate_resolve, self.on_import_reject)
+        self.task.run()
+
+    def on_validate_resolve(self, plan: FmsImportPlan):
+        if plan is not None:
+            wx.CallAfter(self.show_report, plan)
+
+    def show_report(self, plan: FmsImportPlan):
+        dlg = FmsImportReportDialog(self, plan.report)
+        ret = dlg.ShowModal()
+        dlg.Destroy()
+        if ret != wx.ID_OK:
+            return
+        self.task = Task("Импорт замеров...", "Идет импорт замеров", DoImportTask(plan), self)
         self.task.then(self.on_import_resolve, self.on_import_reject)
         self.task.run()
 
     def on_import_resolve(self, data):
+        pub.sendMessage(PM_VALUES_CHANGED)
         wx.MessageBox("Импорт успешно завершено", "Импорт успешно завершен.")
 
     def on_import_reject(self, e):
+        # Часть данных могла быть записана до ошибки
+        pub.sendMessage(PM_VALUES_CHANGED)
         raise e
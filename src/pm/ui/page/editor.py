@@ -11,6 +11,7 @@ from src.ui.flatnotebook import xFlatNotebook
 from src.ui.grid import (
     EVT_GRID_EDITOR_STATE_CHANGED,
     Column,
+    ColumnStoreModel,
     FloatCellType,
     GridEditor,
     Model,
@@ -23,8 +24,9 @@ from src.ui.validators import DateValidator, TextValidator
 from .samples import SamplesWidget
 
 
-class StatsGridModel(Model):
+class StatsGridModel(ColumnStoreModel):
     def __init__(self):
+        super().__init__()
         self.columns = {
             "pm_property": Column(id="pm_property", name_short="Свойство", cell_type=StringCellType()),
             "pm_root_mean_sqr_dev": Column(
@@ -39,26 +41,8 @@ class StatsGridModel(Model):
             "pm_sample_cnt": Column(id="pm_sample_cnt", name_short="Количество\nобразцов", cell_type=NumberCellType()),
             "pm_method": Column(id="pm_method", name_short="Метод испытаний", cell_type=StringCellType()),
         }
-        self.rows = []
         self.pm_sample_set = None
-
-    def get_columns(self) -> List[Column]:
-        return list(self.columns.values())
-
-    def get_value_at(self, col, row) -> str:
-        col_id = self.get_columns().__getitem__(col).id
-        if col_id in self.rows[row]:
-            return self.rows[row][col_id]
-        return ""
-
-    def get_rows_count(self) -> int:
-        return len(self.rows)
-
-    def is_changed(self) -> bool:
-        return False
-
-    def total_rows(self):
-        return len(self.rows)
+        self.set_columns(self.columns.values())
 
     def set_pm_sample_set(self, pm_sample_set):
         self.pm_sample_set = pm_sample_set
@@ -66,32 +50,25 @@ class StatsGridModel(Model):
 
     @db_session
     def load(self):
-        self.rows = []
         rows = select(o for o in PmSampleSetPropertyValue if o.pm_sample_set == self.pm_sample_set).order_by(
             PmSampleSetPropertyValue.pm_property
         )[:]
-        for row in rows:
-            self.rows.append(
+        self.set_rows(
+            self.columns.values(),
+            (
                 {
                     "pm_property": row.pm_property.Name,
                     "pm_method": row.pm_method.Name,
-                    "pm_min_value": str(row.MinValue),
-                    "pm_max_value": str(row.MaxValue),
-                    "pm_avg_value": str(row.AvgValue),
-                    "pm_sample_cnt": str(row.SampleCnt),
-                    "pm_root_mean_sqr_dev": str(row.RootMeanSqrDev),
-                    "pm_variation_coeff": str(row.VariationCoef),
+                    "pm_min_value": row.MinValue,
+                    "pm_max_value": row.MaxValue,
+                    "pm_avg_value": row.AvgValue,
+                    "pm_sample_cnt": row.SampleCnt,
+                    "pm_root_mean_sqr_dev": row.RootMeanSqrDev,
+                    "pm_variation_coeff": row.VariationCoef,
                 }
-            )
-
-    def set_value_at(self, col, row, value): ...
-    def insert_row(self, row): ...
-    def delete_row(self, row): ...
-    def get_row_state(self, row): ...
-    def validate(self): ...
-    def save(self): ...
-    def have_changes(self):
-        return False
+                for row in rows
+            ),
+        )
 
 
 class StatsWidget(wx.Panel):
@@ -110,7 +87,14 @@ class StatsWidget(wx.Panel):
         sz.Add(self.toolbar, 0, wx.EXPAND)
         self.model = StatsGridModel()
         self.grid = GridEditor(
-            self, self.model, app_ctx().main.menu, self.toolbar, app_ctx().main.statusbar, 35, read_only=True
+            self,
+            self.model,
+            app_ctx().main.menu,
+            self.toolbar,
+            app_ctx().main.statusbar,
+            35,
+            read_only=True,
+            virtual=True,
         )
         self.grid.Bind(EVT_GRID_EDITOR_STATE_CHANGED, self.on_grid_state_changed)
         self.grid.auto_size_columns()
@@ -198,7 +182,14 @@ class SummaryWidget(wx.Panel):
         sz.Add(self.toolbar, 0, wx.EXPAND)
         self.model = SummaryGridModel()
         self.grid = GridEditor(
-            self, self.model, app_ctx().main.menu, self.toolbar, app_ctx().main.statusbar, 35, read_only=True
+            self,
+            self.model,
+            app_ctx().main.menu,
+            self.toolbar,
+            app_ctx().main.statusbar,
+            35,
+            read_only=True,
+            virtual=True,
         )
         self.grid.Bind(EVT_GRID_EDITOR_STATE_CHANGED, self.on_grid_state_changed)
         self.grid.auto_size_columns()
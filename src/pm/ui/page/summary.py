@@ -1,35 +1,35 @@
+import dataclasses
+import logging
 import textwrap
+import threading
 import time
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List
 
 import wx
 import wx.adv
 import wx.dataview
 import wx.lib.agw.flatnotebook
 import wx.lib.newevent
-from pony.orm import db_session, exists, select
+from pony.orm import db_session, select
 
 from src.ctx import app_ctx
 from src.database import (
     MineObject,
     Petrotype,
-    PetrotypeStruct,
     PmProperty,
     PmPropertyClass,
-    PMSample,
-    PmSamplePropertyValue,
-    PMSampleSet,
     PMTestSeries,
 )
-from src.datetimeutil import encode_date
+from src.pm.summary import SummaryCache, SummaryCancelled, SummaryData, SummaryFrame, SummaryProperty
 from src.ui.grid import (
     EVT_GRID_EDITOR_STATE_CHANGED,
     Column,
+    ColumnStoreModel,
     FloatCellType,
     GridEditor,
-    Model,
     NumberCellType,
+    ObservableModel,
     StringCellType,
 )
 from src.ui.icon import get_icon
@@ -405,38 +405,7 @@ class FilterPanel(wx.ScrolledWindow):
         wx.PostEvent(self, FilterChangedEvent())
 
 
-def make_filter(filter):
-    query = (
-        select(o for o in PMSample)
-        .order_by(lambda a: (a.pm_sample_set.pm_test_series.Number, a.pm_sample_set.Number, a.Number))
-        .prefetch(
-            PMSample.pm_sample_property_values,
-            PMSample.pm_sample_set,
-            PMSampleSet.mine_object,
-            PMSampleSet.petrotype_struct,
-            PetrotypeStruct.petrotype,
-        )  # сразу подгружаем связаную таблицу знчений свойств (чтобы в цикле не загружать по отдельности)
-    )
-    date_from = encode_date(filter.test_date_from) if filter.test_date_from is not None else None
-    date_to = encode_date(filter.test_date_to) if filter.test_date_to is not None else None
-
-    if filter.use_filter and filter.petrotypes is not None:
-        query = query.filter(lambda a: a.pm_sample_set.petrotype_struct.petrotype in filter.petrotypes)
-    if filter.use_filter and filter.fields is not None:
-        query = query.filter(lambda a: a.pm_sample_set.mine_object in filter.fields)
-    if filter.use_filter and date_from is not None:
-        query = query.filter(lambda a: a.pm_sample_set.TestDate >= date_from)
-    if filter.use_filter and date_to is not None:
-        query = query.filter(lambda a: a.pm_sample_set.TestDate <= date_to)
-    if filter.use_filter and filter.exclude_none_test_date:
-        query = query.filter(lambda a: a.pm_sample_set.TestDate != None)  # noqa: E711
-    if filter.use_filter and filter.test_series is not None:
-        query = query.filter(lambda a: a.pm_sample_set.pm_test_series in filter.test_series)
-
-    return query
-
-
-class PmGridModel(Model):
+class PmGridModel(ColumnStoreModel, ObservableModel):
     def __init__(self):
         super().__init__()
         self.mode = "compact"
@@ -470,121 +439,59 @@ class PmGridModel(Model):
             ),
         }
         self.property_columns = {}
-        self.columns_cache = list(self.compact_columns.values()) + list(self.property_columns.values())
-        self.rows = []
-        self.filter = Filter()
+        # Методы испытаний хранятся всегда, чтобы смена режима не требовала перезагрузки
+        self.method_columns = {}
+        self.make_columns_cache()
 
     def make_columns_cache(self):
         if self.mode == "compact":
-            self.columns_cache = list(self.compact_columns.values()) + list(self.property_columns.values())
+            self.set_columns(list(self.compact_columns.values()) + list(self.property_columns.values()))
         else:
-            self.columns_cache = list(self.extended_columns.values()) + list(self.property_columns.values())
-
-    def get_columns(self):
-        return self.columns_cache
-
-    def get_value_at(self, col, row) -> str:
-        col_id = self.columns_cache.__getitem__(col).id
-        if col_id in self.rows[row]:
-            return self.rows[row][col_id]
-        return ""
-
-    def get_rows_count(self) -> int:
-        return len(self.rows)
-
-    def is_changed(self) -> bool:
-        return False
-
-    def total_rows(self):
-        return len(self.rows)
-
-    def set_value_at(self, col, row, value): ...
-    def insert_row(self, row): ...
-    def delete_row(self, row): ...
-    def get_row_state(self, row): ...
-    def validate(self): ...
-    def save(self): ...
-    def have_changes(self):
-        return False
-
-    def set_filter(self, filter):
-        self.filter = filter
-        self.load()
+            columns = list(self.extended_columns.values())
+            for code, column in self.property_columns.items():
+                # В расширенном режиме после свойства - метод испытания с кодом "<код_свойства>_method"
+                columns += [column, self.method_columns[code]]
+            self.set_columns(columns)
 
     def change_mode(self, mode="compact"):
         self.mode = mode
-        self.load()
-
-    @db_session
-    def load(self):
-        start_time = time.perf_counter()
-        self.rows = []
-        query = make_filter(self.filter)
-        samples = query[:]
-        # Выбираем все свойства - значения которых записны для выбранных образцов
-
-        if self.filter.use_filter and self.filter.properties is not None:
-            properties = select(o for o in PmProperty if o in self.filter.properties)
-        else:
-            properties = select(
-                o
-                for o in PmProperty
-                if exists(v for v in PmSamplePropertyValue if v.pm_property == o and v.pm_sample in samples)
-            )
-
-        properties = properties[:]
-
-        is_compact = self.mode == "compact"
+        self.make_columns_cache()
 
-        # Добавляем столбцы свойств для выбраных образцов
+    def set_properties(self, properties: List[SummaryProperty]):
+        """Задает столбцы свойств и очищает строки перед загрузкой новых данных"""
         self.property_columns = {}
+        self.method_columns = {}
         for property in properties:
-            name = property.Name + (", " + property.Unit if property.Unit is not None else "")
+            name = property.name + (", " + property.unit if property.unit is not None else "")
             name = textwrap.fill(name, width=20)
-            self.property_columns[property.Code] = Column(
-                property.Code, FloatCellType(), name_short=name, name_long=name
+            self.property_columns[property.code] = Column(
+                property.code, FloatCellType(), name_short=name, name_long=name
             )
-            if not is_compact:
-                # Если расширенный режим - добавляем метод испытания с кодом "<код_свойства>_method"
-                self.property_columns[property.Code + "_method"] = Column(
-                    "%s_method" % property.Code, StringCellType(), name_short="Метод", name_long="Метод"
-                )
-
-        # Добавляем все образцы в строки таблицы
-        for sample in query:
-            if self.filter.properties_hide_no_values_samples:
-                if not any(
-                    [value.pm_property for value in sample.pm_sample_property_values if value.pm_property in properties]
-                ):
-                    continue
-
-            # Набиваем все для обоих режимов, дальше исходя из заголовка таблица заберет то что нужно
-            row = {
-                "test_series": sample.pm_sample_set.pm_test_series.Name,
-                "mine_object": sample.pm_sample_set.mine_object.Name,
-                "sample_set": str(sample.pm_sample_set.Number),
-                "sample": str(sample.Number),
-                "test_date": str(sample.pm_sample_set.TestDate) if sample.pm_sample_set.TestDate is not None else "",
-                "petrotype": sample.pm_sample_set.petrotype_struct.petrotype.Name,
-                "mass_air_dry": str(sample.MassAirDry) if sample.MassAirDry is not None else "",
-                "length_1": str(sample.Length1) if sample.Length1 is not None else "",
-                "length_2": str(sample.Length2) if sample.Length2 is not None else "",
-                "height": str(sample.Height) if sample.Height is not None else "",
-            }
-            if sample.orig_sample_set.SampleType == "CORE":
-                row["bore_hole"] = sample.orig_sample_set.bore_hole.get_number()
-            value = [o for o in sample.pm_sample_property_values if o.pm_property in properties]
-            for value in value:
-                row[value.pm_property.Code] = str(value.Value)
-                row["%s_method" % value.pm_property.Code] = str(value.pm_test_method.Name)
-            self.rows.append(row)
-
+            self.method_columns[property.code] = Column(
+                "%s_method" % property.code, StringCellType(), name_short="Метод", name_long="Метод"
+            )
+        all_columns = {
+            **self.compact_columns,
+            **self.extended_columns,
+            **self.property_columns,
+            **{column.id: column for column in self.method_columns.values()},
+        }
+        self.set_rows(all_columns.values(), [])
         self.make_columns_cache()
-        end_time = time.perf_counter()
-        app_ctx().main.statusbar.SetStatusText("Время генерации: %f с." % (end_time - start_time), 3)
 
+    def append_rows(self, rows):
+        # Таблица узнает о новых строках без полной перерисовки
+        start = self.total_rows()
+        super().append_rows(rows)
+        if self.total_rows() > start:
+            self._notify_rows_inserted(start, self.total_rows() - start)
+
+    def set_data(self, data: SummaryData):
+        self.set_properties(data.properties)
+        self.append_rows(data.rows)
 
-class PmStartGridModel(Model):
+
+class PmStartGridModel(ColumnStoreModel):
     def __init__(self):
         super().__init__()
         self.columns = {
@@ -602,100 +509,10 @@ class PmStartGridModel(Model):
             "pm_sample_cnt": Column(id="pm_sample_cnt", name_short="Количество\nобразцов", cell_type=NumberCellType()),
             "pm_method": Column(id="pm_method", name_short="Метод испытаний", cell_type=StringCellType()),
         }
-        self.filter = Filter()
-        self.rows = []
-
-    def get_columns(self):
-        return list(self.columns.values())
-
-    def get_value_at(self, col, row) -> str:
-        col_id = list(self.columns.values())[col].id
-        if col_id in self.rows[row]:
-            return self.rows[row][col_id]
-        return ""
+        self.set_columns(self.columns.values())
 
-    def get_rows_count(self) -> int:
-        return len(self.rows)
-
-    def is_changed(self) -> bool:
-        return False
-
-    def total_rows(self):
-        return len(self.rows)
-
-    def set_value_at(self, col, row, value): ...
-    def insert_row(self, row): ...
-    def delete_row(self, row): ...
-    def get_row_state(self, row): ...
-    def validate(self): ...
-    def save(self): ...
-    def have_changes(self):
-        return False
-
-    def set_filter(self, filter):
-        self.filter = filter
-        self.load()
-
-    @db_session
-    def load(self):
-        self.rows = []
-
-        from collections import defaultdict
-
-        data = defaultdict(list)
-        query = make_filter(self.filter)
-        samples = query[:]
-        # Выбираем все свойства - значения которых записны для выбранных обраsзцов
-        properties = select(
-            o
-            for o in PmProperty
-            if exists(v for v in PmSamplePropertyValue if v.pm_property == o and v.pm_sample in samples)
-        )
-
-        if self.filter.use_filter and self.filter.properties is not None:
-            properties = properties.filter(lambda a: a in self.filter.properties)
-
-        properties = properties[:]
-
-        property_values = select(
-            v for v in PmSamplePropertyValue if v.pm_sample in samples and v.pm_property in properties
-        )[:]
-
-        for value in property_values:
-            # Аггрегируем значения по свойствам, литотипам и методам испытаний
-            data[
-                (value.pm_property, value.pm_sample.pm_sample_set.petrotype_struct.petrotype, value.pm_test_method)
-            ].append(value.Value)
-
-        for (property, petrotype, method), values in data.items():
-            # Считаем статистику по свойству
-            avg_value = sum(values) / len(values)
-            min_value = min(values)
-            max_value = max(values)
-            root_mean_sqr_dev = (sum((v - avg_value) ** 2 for v in values) / len(values)) ** 0.5
-            variation_coeff = root_mean_sqr_dev / avg_value if avg_value != 0 else 0
-
-            # Считаем количество образцов с этим свойством
-            sample_cnt = len(values)
-
-            # Считаем литотипы для этого свойства
-            litotype = petrotype.Name if petrotype else ""
-
-            self.rows.append(
-                {
-                    "pm_property": property.Name,
-                    "litotype": litotype,
-                    "pm_root_mean_sqr_dev": str(root_mean_sqr_dev),
-                    "pm_variation_coeff": str(variation_coeff),
-                    "pm_avg_value": str(avg_value),
-                    "pm_min_value": str(min_value),
-                    "pm_max_value": str(max_value),
-                    "pm_sample_cnt": str(sample_cnt),
-                    "pm_method": method.Name if method else "",
-                }
-            )
-
-        self.rows.sort(key=lambda x: (x["pm_property"], x["litotype"], x["pm_method"]))
+    def set_data(self, rows: List[Dict]):
+        self.set_rows(self.columns.values(), rows)
 
 
 class PmSummaryTable(wx.Panel):
@@ -704,6 +521,12 @@ class PmSummaryTable(wx.Panel):
         sz = wx.BoxSizer(wx.VERTICAL)
         self.filter = Filter()
         self.started = False
+        # Данные по фильтру загружаются один раз для таблицы и статистики
+        self.cache = SummaryCache()
+        # Номер актуальной фоновой загрузки, результаты с другим номером отбрасываются
+        self._load_generation = 0
+        self._load_start_time = 0
+        self._pages_received = False
         self.model = PmGridModel()
         self.splitter = wx.SplitterWindow(self, style=wx.SP_LIVE_UPDATE)
         right = wx.Notebook(self.splitter, style=wx.NB_LEFT)
@@ -715,8 +538,26 @@ class PmSummaryTable(wx.Panel):
         self.toolbar.AddTool(wx.ID_OPEN, "Открыть в Excell", get_icon("excel"))
         self.toolbar.Realize()
         p_sz.Add(self.toolbar, 0, wx.EXPAND)
+        self.progress = wx.Panel(p)
+        progress_sz = wx.BoxSizer(wx.HORIZONTAL)
+        self.progress_label = wx.StaticText(self.progress, label="Загрузка...")
+        progress_sz.Add(self.progress_label, 0, wx.ALIGN_CENTER_VERTICAL | wx.LEFT | wx.RIGHT, border=5)
+        self.progress_gauge = wx.Gauge(self.progress, size=wx.Size(200, -1))
+        progress_sz.Add(self.progress_gauge, 1, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, border=5)
+        self.progress_cancel = wx.Button(self.progress, label="Отменить")
+        progress_sz.Add(self.progress_cancel, 0, wx.ALL, border=2)
+        self.progress.SetSizer(progress_sz)
+        self.progress.Hide()
+        p_sz.Add(self.progress, 0, wx.EXPAND)
         self.table = GridEditor(
-            p, self.model, app_ctx().main.menu, self.toolbar, app_ctx().main.statusbar, header_height=70, read_only=True
+            p,
+            self.model,
+            app_ctx().main.menu,
+            self.toolbar,
+            app_ctx().main.statusbar,
+            header_height=70,
+            read_only=True,
+            virtual=True,
         )
         p_sz.Add(self.table, 1, wx.EXPAND)
         p.SetSizer(p_sz)
@@ -732,6 +573,7 @@ class PmSummaryTable(wx.Panel):
             app_ctx().main.statusbar,
             header_height=40,
             read_only=True,
+            virtual=True,
         )
         self.stats_table.auto_size_columns()
         p_stats_sz.Add(self.stats_table, 1, wx.EXPAND)
@@ -760,10 +602,11 @@ class PmSummaryTable(wx.Panel):
         self.toolbar.Bind(wx.EVT_TOOL, self.on_copy, id=wx.ID_COPY)
         self.filter_panel.Bind(EVT_FILTER_CHANGED, self.on_filter_changed)
         self.toolbar.Bind(wx.EVT_TOOL, self.on_open_in_excell, id=wx.ID_OPEN)
+        self.progress_cancel.Bind(wx.EVT_BUTTON, self.on_cancel_load)
         self.table.Bind(EVT_GRID_EDITOR_STATE_CHANGED, self.on_editor_state_changed)
 
     def on_open_in_excell(self, event):
-        self.table.open_in_excell(only_selection=False)
+        self.table.open_in_excell()
 
     def on_copy(self, event):
         self.table.copy()
@@ -781,14 +624,99 @@ class PmSummaryTable(wx.Panel):
 
     def on_filter_changed(self, event):
         self.filter = self.filter_panel.filter
-        self.model.set_filter(self.filter)
-        self.model.load()
-        self.table._render()
-        self.table.auto_size_columns()
-        self.stats_model.set_filter(self.filter)
-        self.stats_model.load()
+        self.load()
+
+    def load(self):
+        """
+        Загружает данные по текущему фильтру в фоне, строки таблицы появляются по мере чтения.
+        Выполняющаяся загрузка по предыдущему фильтру прерывается.
+        """
+        self._load_generation += 1
+        generation = self._load_generation
+        self.cache.cancel()
+        # Панель фильтра заменяет списки в своем фильтре, поэтому поверхностной копии достаточно
+        filter = dataclasses.replace(self.filter)
+        self._load_start_time = time.perf_counter()
+        self._pages_received = False
+        self.progress_label.SetLabelText("Загрузка...")
+        self.progress_gauge.Pulse()
+        self.progress.Show()
+        self.progress.GetParent().Layout()
+
+        def on_page(properties, rows, loaded, total):
+            wx.CallAfter(self._on_page_loaded, generation, properties, rows, loaded, total)
+
+        def load():
+            try:
+                frame, from_cache = self.cache.get(filter, on_page)
+            except SummaryCancelled:
+                return
+            except Exception as e:
+                wx.CallAfter(self._on_load_failed, generation, e)
+            else:
+                wx.CallAfter(self._on_loaded, generation, frame, from_cache)
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def _is_actual_load(self, generation) -> bool:
+        return self.__nonzero__() and generation == self._load_generation
+
+    def _on_page_loaded(self, generation, properties, rows, loaded, total):
+        if not self._is_actual_load(generation):
+            return
+        if not self._pages_received:
+            self._pages_received = True
+            self.model.set_properties(properties)
+            self.model.append_rows(rows)
+            self.table.auto_size_columns()
+        else:
+            self.model.append_rows(rows)
+        self.progress_label.SetLabelText("Загружено строк: %d из %d" % (loaded, total))
+        self.progress_gauge.SetRange(max(total, 1))
+        self.progress_gauge.SetValue(min(loaded, total))
+
+    def _on_loaded(self, generation, frame: SummaryFrame, from_cache: bool):
+        if not self._is_actual_load(generation):
+            return
+        if not self._pages_received:
+            # Данные из кэша приходят сразу целиком, из БД без строк - без вызовов on_page
+            self.model.set_data(frame.summary)
+            self.table.auto_size_columns()
+        self.stats_model.set_data(frame.stats)
         self.stats_table._render()
         self.stats_table.auto_size_columns()
+        self._hide_progress()
+        app_ctx().main.statusbar.SetStatusText(
+            "Время генерации: %f с., строк: %d%s"
+            % (
+                time.perf_counter() - self._load_start_time,
+                len(frame.summary.rows),
+                " (из кэша)" if from_cache else "",
+            ),
+            3,
+        )
+
+    def _on_load_failed(self, generation, e: Exception):
+        if not self._is_actual_load(generation):
+            return
+        self._hide_progress()
+        logging.error("Не удалось загрузить сводную таблицу: %s" % e, exc_info=e)
+        app_ctx().main.statusbar.SetStatusText("Ошибка загрузки сводной таблицы", 3)
+        wx.MessageBox(
+            "Не удалось загрузить сводную таблицу:\n%s" % e, "Ошибка загрузки", wx.OK | wx.CENTRE | wx.ICON_ERROR
+        )
+
+    def on_cancel_load(self, event):
+        self._load_generation += 1
+        self.cache.cancel()
+        self._hide_progress()
+        app_ctx().main.statusbar.SetStatusText("Загрузка сводной таблицы отменена", 3)
+
+    def _hide_progress(self):
+        self.progress_gauge.SetValue(0)
+        self.progress_label.SetLabelText("")
+        self.progress.Hide()
+        self.progress.GetParent().Layout()
 
     def on_toggle_extended_mode(self, event=None):
         if self.toolbar.GetToolState(wx.ID_PREVIEW):
@@ -798,12 +726,8 @@ class PmSummaryTable(wx.Panel):
         app_ctx().config.pm_extended_mode = self.toolbar.GetToolState(wx.ID_PREVIEW)
 
     def on_refresh(self, event):
-        self.model.load()
-        self.table._render()
-        self.table.auto_size_columns()
-        self.stats_model.load()
-        self.stats_table._render()
-        self.stats_table.auto_size_columns()
+        self.cache.invalidate()
+        self.load()
 
     def start(self):
         if not self.started:
@@ -811,13 +735,9 @@ class PmSummaryTable(wx.Panel):
                 self.toolbar.ToggleTool(wx.ID_PREVIEW, True)
                 self.toolbar.Realize()
                 self.switch_to_extended_mode()
-            self.model.load()
-            self.table._render()
-            self.stats_model.load()
-            self.stats_table._render()
             self.started = True
             self.table.apply_controls()
-            self.table.auto_size_columns()
+            self.load()
 
     def end(self):
         self.table.remove_controls()
@@ -5,7 +5,9 @@ from pony.orm import db_session, select
 
 from src.ctx import app_ctx
 from src.database import PMSampleSet, PMTestSeries
+from src.pm.aggregates import sample_set_aggregates
 from src.ui.icon import get_icon
+from src.ui.task import Task, TaskJob
 from src.ui.tree import (
     EVT_WIDGET_TREE_ACTIVATED,
     EVT_WIDGET_TREE_MENU,
@@ -17,6 +19,11 @@ from src.ui.tree import (
 from ..db_import import FmsImportDialog
 
 
+class _RebuildAggregatesJob(TaskJob):
+    def run(self):
+        sample_set_aggregates.rebuild()
+
+
 class _PmSampleSet_Node(TreeNode):
     def __init__(self, o):
         self.o = o
@@ -105,7 +112,7 @@ class _Root_Node(TreeNode):
 
 class _Tree(TreeWidget):
     def __init__(self, parent):
-        super().__init__(parent)
+        super().__init__(parent, async_load=True)
         self.bind_all()
         self.set_root_node(_Root_Node())
 
@@ -121,6 +128,8 @@ class TreePage(wx.Panel):
         self.toolbar.AddSeparator()
         self.toolbar.AddTool(wx.ID_CONVERT, "Импорт", get_icon("import"))
         self.toolbar.Bind(wx.EVT_TOOL, self.on_import, id=wx.ID_CONVERT)
+        self.toolbar.AddTool(wx.ID_REFRESH, "Пересчитать статистику проб", get_icon("update"))
+        self.toolbar.Bind(wx.EVT_TOOL, self.on_rebuild_aggregates, id=wx.ID_REFRESH)
         self.toolbar.Bind(wx.EVT_TOOL, self.on_delete, id=wx.ID_DELETE)
         self.toolbar.EnableTool(wx.ID_EDIT, False)
         self.toolbar.EnableTool(wx.ID_DELETE, False)
@@ -150,6 +159,21 @@ class TreePage(wx.Panel):
 
         dlg.Destroy()
 
+    def on_rebuild_aggregates(self, event):
+        self.rebuild_task = Task(
+            "Пересчет статистики...", "Идет пересчет статистики проб", _RebuildAggregatesJob(), self, can_abort=False
+        )
+        self.rebuild_task.then(self.on_rebuild_aggregates_resolve, self.on_rebuild_aggregates_reject)
+        self.rebuild_task.run()
+
+    def on_rebuild_aggregates_resolve(self, data):
+        self.rebuild_task.Destroy()
+        wx.MessageBox("Статистика проб пересчитана", "Пересчет завершен")
+
+    def on_rebuild_aggregates_reject(self, e):
+        self.rebuild_task.Destroy()
+        raise e
+
     def on_activate(self, event):
         if isinstance(event.node, _PmSampleSet_Node):
             app_ctx().main.open("pm_sample_set_editor", is_new=False, o=event.node.o)
@@ -2,11 +2,15 @@ from .grid import (
     EVT_GRID_COLUMN_RESIZED,  # noqa: F401
     EVT_GRID_EDITOR_STATE_CHANGED,  # noqa: F401
     EVT_GRID_MODEL_STATE_CHANGED,  # noqa: F401
+    CellBlock,  # noqa: F401
     CellType,  # noqa: F401
     Column,  # noqa: F401
     FloatCellType,  # noqa: F401
     GridEditor,  # noqa: F401
     Model,  # noqa: F401
+    ModelChange,  # noqa: F401
     NumberCellType,  # noqa: F401
+    ObservableModel,  # noqa: F401
     StringCellType,  # noqa: F401
 )
+from .column_store import ColumnStoreModel  # noqa: F401
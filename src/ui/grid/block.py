@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class CellBlock:
+    """
+    Прямоугольный блок ячеек, границы включительно
+    """
+
+    top: int
+    left: int
+    bottom: int
+    right: int
+
+    def rows(self) -> range:
+        return range(self.top, self.bottom + 1)
+
+    def cols(self) -> range:
+        return range(self.left, self.right + 1)
+
+
+def cells_to_blocks(cells) -> List[CellBlock]:
+    """
+    Собирает ячейки (row, col) в блоки из соседних ячеек одной строки
+    """
+    blocks = []
+    for row, col in sorted(set(cells)):
+        if len(blocks) > 0 and blocks[-1].top == row and blocks[-1].right == col - 1:
+            blocks[-1].right = col
+        else:
+            blocks.append(CellBlock(row, col, row, col))
+    return blocks
@@ -0,0 +1,307 @@
+import operator
+import re
+from typing import Any, Callable, Dict, Iterable, List
+
+import numpy as np
+
+from .grid import CellBlock, Column, FloatCellType, Model, NumberCellType
+
+
+class ColumnStoreModel(Model):
+    """
+    Модель только для чтения, значения которой хранятся по столбцам в массивах NumPy.
+    Числовые столбцы хранятся в float64 (NaN - нет значения), строковые - кодами словаря (-1 - нет значения).
+    Строковое представление значения формируется только при обращении к ячейке.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._columns: List[Column] = []
+        self._column_ids = []
+        self._arrays: Dict[Any, np.ndarray] = {}
+        self._categories: Dict[Any, List[str]] = {}
+        self._category_codes: Dict[Any, Dict[Any, int]] = {}
+        self._stored_columns: List[Column] = []
+        self._int_columns = set()
+        self._rows_count = 0
+        # Сортировка (id столбца, по возрастанию) и фильтры по id столбца
+        self._sort = None
+        self._column_filters: Dict[Any, str] = {}
+        self._column_masks: Dict[Any, np.ndarray] = {}
+        # Номера хранимых строк в порядке отображения, None - все строки по порядку
+        self._index: np.ndarray | None = None
+
+    def set_columns(self, columns: List[Column]):
+        """Задает отображаемые столбцы, хранимые значения при этом не меняются"""
+        self._columns = list(columns)
+        self._column_ids = [column.id for column in self._columns]
+
+    def set_rows(self, columns: Iterable[Column], rows: Iterable[Dict]):
+        """
+        Заменяет данные модели. columns - все хранимые столбцы (не только отображаемые),
+        rows - словари id столбца -> значение: число для числовых столбцов, строка для остальных, None если нет.
+        """
+        self._stored_columns = list(columns)
+        self._categories = {}
+        self._category_codes = {}
+        self._int_columns = set()
+        for column in self._stored_columns:
+            if isinstance(column.cell_type, (FloatCellType, NumberCellType)):
+                if isinstance(column.cell_type, NumberCellType):
+                    self._int_columns.add(column.id)
+            else:
+                self._categories[column.id] = []
+                self._category_codes[column.id] = {}
+        self._arrays, self._rows_count = self._make_arrays(rows)
+        # Сортировка и фильтры сохраняются для новых данных, если их столбцы остались
+        if self._sort is not None and self._sort[0] not in self._arrays:
+            self._sort = None
+        filters = {col_id: expr for col_id, expr in self._column_filters.items() if col_id in self._arrays}
+        self._column_filters = {}
+        self._column_masks = {}
+        for col_id, expr in filters.items():
+            self._column_masks[col_id] = self._make_filter_mask(col_id, expr)
+            self._column_filters[col_id] = expr
+        self._update_index()
+
+    def append_rows(self, rows: Iterable[Dict]):
+        """
+        Добавляет строки в конец хранимых данных, столбцы - те же, что в последнем set_rows.
+        Сортировка и фильтры применяются и к добавленным строкам.
+        """
+        arrays, rows_count = self._make_arrays(rows)
+        if rows_count == 0:
+            return
+        for col_id, values in arrays.items():
+            self._arrays[col_id] = np.concatenate((self._arrays[col_id], values))
+        self._rows_count += rows_count
+        for col_id, expr in self._column_filters.items():
+            self._column_masks[col_id] = self._make_filter_mask(col_id, expr)
+        self._update_index()
+
+    def _make_arrays(self, rows: Iterable[Dict]):
+        values = {column.id: [] for column in self._stored_columns}
+        rows_count = 0
+        for row in rows:
+            for col_id, column_values in values.items():
+                column_values.append(row.get(col_id))
+            rows_count += 1
+        arrays = {}
+        for col_id, column_values in values.items():
+            if col_id in self._categories:
+                arrays[col_id] = _encode(column_values, self._categories[col_id], self._category_codes[col_id])
+            else:
+                arrays[col_id] = np.array(
+                    [np.nan if value is None else value for value in column_values], dtype=np.float64
+                )
+        return arrays, rows_count
+
+    def can_sort(self) -> bool:
+        return True
+
+    def sort(self, col, ascending=True):
+        self._sort = (self._column_ids[col], ascending) if col is not None else None
+        self._update_index()
+
+    def get_sort(self):
+        if self._sort is None or self._sort[0] not in self._column_ids:
+            return None
+        return self._column_ids.index(self._sort[0]), self._sort[1]
+
+    def set_column_filter(self, col, expr: str):
+        col_id = self._column_ids[col]
+        expr = expr.strip()
+        if len(expr) == 0:
+            self._column_filters.pop(col_id, None)
+            self._column_masks.pop(col_id, None)
+        else:
+            self._column_masks[col_id] = self._make_filter_mask(col_id, expr)
+            self._column_filters[col_id] = expr
+        self._update_index()
+
+    def get_column_filter(self, col) -> str:
+        return self._column_filters.get(self._column_ids[col], "")
+
+    def clear_column_filters(self):
+        self._column_filters = {}
+        self._column_masks = {}
+        self._update_index()
+
+    def _make_filter_mask(self, col_id, expr: str) -> np.ndarray:
+        values = self._arrays[col_id]
+        if col_id not in self._categories:
+            return _make_number_filter(expr)(values) & ~np.isnan(values)
+        # Условие проверяется один раз для каждого различного значения, затем переносится на коды строк
+        match = _make_string_filter(expr)
+        matches = np.array([match(category) for category in self._categories[col_id]] + [match("")], dtype=bool)
+        return matches[values]
+
+    def _update_index(self):
+        if self._sort is None and len(self._column_masks) == 0:
+            self._index = None
+            return
+        if len(self._column_masks) > 0:
+            mask = np.ones(self._rows_count, dtype=bool)
+            for column_mask in self._column_masks.values():
+                mask &= column_mask
+            rows = np.flatnonzero(mask)
+        else:
+            rows = np.arange(self._rows_count)
+        if self._sort is not None:
+            key = self._get_sort_key(*self._sort)
+            rows = rows[np.argsort(key[rows], kind="stable")]
+        self._index = rows
+
+    def _get_sort_key(self, col_id, ascending) -> np.ndarray:
+        values = self._arrays[col_id]
+        if col_id not in self._categories:
+            # NaN в обоих направлениях остается в конце
+            return values if ascending else -values
+        categories = self._categories[col_id]
+        count = len(categories)
+        ranks = np.empty(count + 1, dtype=np.int64)
+        ranks[np.array(sorted(range(count), key=lambda i: categories[i].lower()), dtype=np.int64)] = np.arange(count)
+        ranks[count] = count
+        key = ranks[values]
+        if not ascending:
+            key = np.where(values < 0, count, count - 1 - key)
+        return key
+
+    def get_column_values(self, col_id) -> np.ndarray:
+        """
+        Значения столбца в порядке отображения (с учетом сортировки и фильтров):
+        float64 для числовых столбцов, массив строк (object) для остальных
+        """
+        if col_id not in self._arrays:
+            return np.full(self.total_rows(), "", dtype=object)
+        values = self._arrays[col_id]
+        if self._index is not None:
+            values = values[self._index]
+        if col_id not in self._categories:
+            return values
+        # Код -1 указывает на последний элемент - пустую строку
+        return np.array(self._categories[col_id] + [""], dtype=object)[values]
+
+    def get_columns(self):
+        return self._columns
+
+    def get_value_at(self, col, row) -> str:
+        col_id = self._column_ids[col]
+        if col_id not in self._arrays:
+            return ""
+        if self._index is not None:
+            row = self._index[row]
+        value = self._arrays[col_id][row]
+        if col_id in self._categories:
+            return self._categories[col_id][value] if value >= 0 else ""
+        return self._format_number(col_id, float(value))
+
+    def get_values(self, block: CellBlock) -> List[List[str]]:
+        rows = slice(block.top, block.bottom + 1)
+        if self._index is not None:
+            rows = self._index[rows]
+        columns = [self._format_column(col_id, rows) for col_id in self._column_ids[block.left : block.right + 1]]
+        if len(columns) == 0:
+            return [[] for _ in block.rows()]
+        return [list(row) for row in zip(*columns)]
+
+    def _format_column(self, col_id, rows) -> List[str]:
+        if col_id not in self._arrays:
+            return [""] * len(np.arange(self._rows_count)[rows])
+        values = self._arrays[col_id][rows].tolist()
+        if col_id in self._categories:
+            categories = self._categories[col_id]
+            return [categories[value] if value >= 0 else "" for value in values]
+        return [self._format_number(col_id, value) for value in values]
+
+    def _format_number(self, col_id, value: float) -> str:
+        if value != value:
+            return ""
+        if col_id in self._int_columns:
+            return str(int(value))
+        return str(value)
+
+    def get_rows_count(self) -> int:
+        return self.total_rows()
+
+    def is_changed(self) -> bool:
+        return False
+
+    def total_rows(self):
+        return len(self._index) if self._index is not None else self._rows_count
+
+    def stored_rows(self) -> int:
+        """Количество строк без учета фильтров"""
+        return self._rows_count
+
+    def set_value_at(self, col, row, value): ...
+    def insert_row(self, row): ...
+    def delete_row(self, row): ...
+    def get_row_state(self, row): ...
+    def validate(self): ...
+    def save(self): ...
+    def have_changes(self):
+        return False
+
+
+_NUMBER_FILTER_RE = re.compile(r"^(>=|<=|!=|>|<|=)?\s*(\S+)$")
+
+_NUMBER_FILTER_OPS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def _parse_number(value: str) -> float:
+    try:
+        return float(value.strip().replace(",", "."))
+    except ValueError:
+        raise ValueError("Неверное число в условии фильтра: %s" % value.strip())
+
+
+def _make_number_filter(expr: str) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Условие для числового столбца: >5, <=10, =3, !=0, 3 (равно) или диапазон 1..10 (границы включительно)
+    """
+    if ".." in expr:
+        low, high = expr.split("..", 1)
+        low = _parse_number(low) if len(low.strip()) > 0 else -np.inf
+        high = _parse_number(high) if len(high.strip()) > 0 else np.inf
+        return lambda values: (values >= low) & (values <= high)
+    m = _NUMBER_FILTER_RE.match(expr)
+    if m is None:
+        raise ValueError("Неверное условие фильтра: %s" % expr)
+    op = _NUMBER_FILTER_OPS[m.group(1) or "="]
+    number = _parse_number(m.group(2))
+    return lambda values: op(values, number)
+
+
+def _make_string_filter(expr: str) -> Callable[[str], bool]:
+    """
+    Условие для строкового столбца: часть значения без учета регистра или =значение для точного совпадения
+    """
+    if expr.startswith("="):
+        value = expr[1:].strip().lower()
+        return lambda category: category.lower() == value
+    value = expr.lower()
+    return lambda category: value in category.lower()
+
+
+def _encode(values, categories: List[str], index: Dict[Any, int]) -> np.ndarray:
+    """Кодирует значения номерами в словаре categories, новые значения дописываются в словарь"""
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        code = index.get(value)
+        if code is None:
+            code = len(categories)
+            index[value] = code
+            categories.append(str(value))
+        codes[i] = code
+    return codes
@@ -0,0 +1,106 @@
+import csv
+import os
+from typing import List
+
+from src.ui.task import TaskJob
+
+from .block import CellBlock
+
+
+class ExportTask(TaskJob):
+    """
+    Выгрузка таблицы модели в xlsx (openpyxl в режиме write-only) или csv.
+    Строки читаются из модели блоками по chunk_rows и сразу пишутся в файл,
+    поэтому расход памяти не зависит от размера таблицы.
+    """
+
+    def __init__(self, model, path, col_widths: List[int] = None, sheet_name="Таблица", chunk_rows=1000):
+        super().__init__()
+        self.model = model
+        self.path = path
+        self.col_widths = col_widths
+        self.sheet_name = sheet_name
+        self.chunk_rows = chunk_rows
+
+    def run(self):
+        """Возвращает False, если выгрузка отменена (недописанный файл удаляется)"""
+        if os.path.splitext(self.path)[1].lower() == ".csv":
+            completed = self._write_csv()
+        else:
+            completed = self._write_xlsx()
+        if not completed and os.path.exists(self.path):
+            os.remove(self.path)
+        return completed
+
+    def _iter_chunks(self):
+        columns = self.model.get_columns()
+        total = self.model.total_rows()
+        for start in range(0, total, self.chunk_rows):
+            if self.cancel_event.is_set():
+                return
+            end = min(start + self.chunk_rows, total)
+            yield self.model.get_values(CellBlock(start, 0, end - 1, len(columns) - 1))
+            self.set_progress(end, total, "Записано строк: %d из %d" % (end, total))
+
+    def _write_csv(self):
+        columns = self.model.get_columns()
+        # utf-8-sig и ";" - чтобы Excel открывал файл без мастера импорта
+        with open(self.path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow([column.name_short.replace("\n", " ") for column in columns])
+            for rows in self._iter_chunks():
+                writer.writerows(rows)
+        return not self.cancel_event.is_set()
+
+    def _write_xlsx(self):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font
+        from openpyxl.utils import get_column_letter
+
+        columns = self.model.get_columns()
+        converters = [_get_converter(column.cell_type) for column in columns]
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(self.sheet_name)
+        if self.col_widths is not None:
+            for index, width in enumerate(self.col_widths):
+                ws.column_dimensions[get_column_letter(index + 1)].width = int(min(width / 7, 255))
+        ws.freeze_panes = "A2"
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(ws, value=column.name_short)
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(wrap_text=True, vertical="top")
+            header.append(cell)
+        ws.append(header)
+        for rows in self._iter_chunks():
+            for row in rows:
+                ws.append([convert(value) for convert, value in zip(converters, row)])
+        if self.cancel_event.is_set():
+            return False
+        wb.save(self.path)
+        return True
+
+
+def _get_converter(cell_type):
+    # Числа пишутся числовыми ячейками, чтобы в Excel с ними можно было считать
+    if cell_type.get_type_name() == "number":
+        number = int
+    elif cell_type.get_type_name() == "float":
+        number = float
+    else:
+        return _to_text
+
+    def convert(value: str):
+        if value is None or len(value.strip()) == 0:
+            return None
+        try:
+            return number(float(value.replace(",", ".")))
+        except ValueError:
+            return value
+
+    return convert
+
+
+def _to_text(value):
+    return value if value is not None and len(value) > 0 else None
@@ -2,9 +2,13 @@ import wx
 
 from src.ui.icon import get_icon
 
+from .search import FIND_RANGE, FIND_REGEX, FIND_SUBSTRING
+
+_MODES = [FIND_SUBSTRING, FIND_REGEX, FIND_RANGE]
+
 
 class FindDialog(wx.Dialog):
-    def __init__(self, parent, q="", strict_mode=True):
+    def __init__(self, parent, q="", strict_mode=True, mode=FIND_SUBSTRING):
         super().__init__(parent, title="Поиск по таблице")
         self.SetIcon(wx.Icon(get_icon("find")))
         self.CenterOnParent()
@@ -16,6 +20,15 @@ class FindDialog(wx.Dialog):
         top_sizer.Add(main_sizer, 1, wx.EXPAND | wx.ALL, border=10)
         self.field_q = wx.TextCtrl(self, value=q, size=wx.Size(300, -1))
         main_sizer.Add(self.field_q, 0, wx.EXPAND | wx.BOTTOM, border=10)
+        self.field_mode = wx.RadioBox(
+            self,
+            label="Искать",
+            choices=["Текст", "Регулярное выражение", "Диапазон чисел (1..10)"],
+            majorDimension=1,
+            style=wx.RA_SPECIFY_COLS,
+        )
+        self.field_mode.SetSelection(_MODES.index(mode))
+        main_sizer.Add(self.field_mode, 0, wx.EXPAND | wx.BOTTOM, border=10)
         self.field_range_find = wx.CheckBox(self, label="Строгий поиск")
         if strict_mode:
             mode = wx.CHK_CHECKED
@@ -49,3 +62,6 @@ class FindDialog(wx.Dialog):
 
     def is_strict_mode(self):
         return self.field_range_find.IsChecked()
+
+    def get_mode(self):
+        return _MODES[self.field_mode.GetSelection()]
@@ -1,7 +1,12 @@
 import csv
 import io
-from dataclasses import dataclass
-from typing import List, Protocol
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Protocol, Tuple
 
 import wx
 import wx.grid
@@ -11,11 +16,16 @@ import wx.lib.newevent
 from wx.grid import GridCellEditor, GridCellRenderer, GridCellStringRenderer, GridCellTextEditor
 
 from src.ui.icon import get_art, get_icon
-from src.ui.task import Task, TaskJob
+from src.ui.task import Task
 
+from .block import CellBlock, cells_to_blocks
 from .col_label_renderer import ColLabelRenderer
+from .export import ExportTask
 from .find import FindDialog
+from .journal import CellsDiff, CommandJournal, JournalCommand, RleValues
 from .row_label_renderer import RowLabelRenderer
+from .search import FIND_SUBSTRING, GridSearch
+from .table import HIGHTLIGHT_COLOUR, STRIPE_COLOUR, CellAttrProvider, ModelGridTable, get_col_label
 
 
 class CellType(Protocol):
@@ -291,6 +301,18 @@ class ErrorsView(wx.Panel):
         self._main_notebook.SetPageText(0, "Ошибки (%d)" % len(errors))
 
 
+@dataclass
+class ModelChange:
+    """
+    Изменение модели: ячейки (row, col), вставленные и удаленные диапазоны строк (start, count).
+    Диапазоны строк указываются в порядке применения.
+    """
+
+    cells: List[Tuple[int, int]] = field(default_factory=list)
+    inserted_rows: List[Tuple[int, int]] = field(default_factory=list)
+    removed_rows: List[Tuple[int, int]] = field(default_factory=list)
+
+
 class Model(Protocol):
     def get_columns(self) -> List[Column]:
         return []
@@ -308,6 +330,21 @@ class Model(Protocol):
         return 0
 
     def set_value_at(self, col, row, value): ...
+
+    def get_values(self, block: CellBlock) -> List[List[str]]:
+        """
+        Значения блока ячеек построчно
+        """
+        return [[self.get_value_at(col, row) for col in block.cols()] for row in block.rows()]
+
+    def set_values(self, block: CellBlock, table: List[List[str]]):
+        """
+        Записывает table построчно начиная с левого верхнего угла блока
+        """
+        for row, values in zip(block.rows(), table):
+            for col, value in zip(block.cols(), values):
+                self.set_value_at(col, row, value)
+
     def insert_row(self, row): ...
     def delete_row(self, row): ...
     def get_row_state(self, row): ...
@@ -316,78 +353,199 @@ class Model(Protocol):
     def have_changes(self):
         return False
 
+    def can_validate_incrementally(self) -> bool:
+        """
+        True, если validate() не перепроверяет все значения, а собирает заранее посчитанные результаты.
+        Тогда GridEditor обновляет ошибки после каждого изменения.
+        """
+        return False
+
+    def can_sort(self) -> bool:
+        """
+        Поддерживает ли модель сортировку и фильтры по столбцам
+        """
+        return False
+
+    def sort(self, col, ascending=True):
+        """
+        Сортирует строки по столбцу, col=None сбрасывает сортировку
+        """
+        ...
+
+    def get_sort(self):
+        """
+        Текущая сортировка (col, ascending) или None
+        """
+        return None
+
+    def set_column_filter(self, col, expr: str):
+        """
+        Задает условие фильтра для столбца, пустое условие снимает фильтр. При неверном условии - ValueError
+        """
+        ...
+
+    def get_column_filter(self, col) -> str:
+        return ""
+
+    def clear_column_filters(self): ...
+
+    def add_change_listener(self, listener) -> bool:
+        """
+        Подписывает listener(change: ModelChange) на изменения модели.
+        Возвращает False, если модель не сообщает об изменениях.
+        """
+        return False
+
+    def remove_change_listener(self, listener): ...
+
+
+class ObservableModel(Model):
+    """
+    Модель, которая сообщает подписчикам об измененных ячейках и строках
+    """
+
+    def add_change_listener(self, listener) -> bool:
+        self._get_change_listeners().append(listener)
+        return True
+
+    def remove_change_listener(self, listener):
+        listeners = self._get_change_listeners()
+        if listener in listeners:
+            listeners.remove(listener)
+
+    def _get_change_listeners(self):
+        # Наследники не обязаны вызывать __init__ базового класса
+        if "_change_listeners" not in self.__dict__:
+            self._change_listeners = []
+        return self._change_listeners
+
+    def _notify_changed(self, change: ModelChange):
+        for listener in list(self._get_change_listeners()):
+            listener(change)
+
+    def _notify_cells_changed(self, cells):
+        self._notify_changed(ModelChange(cells=list(cells)))
+
+    def _notify_rows_inserted(self, row, count=1):
+        self._notify_changed(ModelChange(inserted_rows=[(row, count)]))
+
+    def _notify_rows_removed(self, row, count=1):
+        self._notify_changed(ModelChange(removed_rows=[(row, count)]))
+
 
 GridEditorStateChangedEvent, EVT_GRID_EDITOR_STATE_CHANGED = wx.lib.newevent.NewEvent()
 GridModelStateChangedEvent, EVT_GRID_MODEL_STATE_CHANGED = wx.lib.newevent.NewEvent()
 
 
-class cmdAppendRows(wx.Command):
+# Правки ячеек вводом с клавиатуры с паузой не больше этой отменяются одним шагом
+TYPING_COALESCE_SECONDS = 2.0
+# Примерный размер ячейки удаленной строки в журнале отмены, байт
+_DELETED_CELL_SIZE = 100
+
+
+class cmdAppendRows(JournalCommand):
+    name = "Добавить пустые строки"
+
     def __init__(self, target, number_rows):
-        super().__init__(True, "Добавить пустые строки")
         self.target = target
         self.number_rows = number_rows
 
-    def Do(self):
+    def do(self):
         if self.number_rows == 0:
             return False
         self.target._cmd_append_rows(self.number_rows)
         return True
 
-    def Undo(self):
-        self.target._cmd_undo_append_rows()
-        return True
+    def undo(self):
+        self.target._cmd_undo_append_rows(self.number_rows)
 
 
-class cmdDeleteRows(wx.Command):
+class cmdDeleteRows(JournalCommand):
+    name = "Удалить выбранные строки"
+
     def __init__(self, target, rows_pos):
-        super().__init__(True, "Удалить выбранные строки")
         self.target = target
         self.rows_pos = rows_pos
+        self.rows_data = {}
 
-    def Do(self):
+    def do(self):
         if len(self.rows_pos) == 0:
             return False
-        self.target._cmd_delete_rows(self.rows_pos)
+        self.rows_data = self.target._cmd_delete_rows(self.rows_pos)
         return True
 
-    def Undo(self):
-        self.target._cmd_undo_delete_rows()
-        return True
+    def undo(self):
+        self.target._cmd_undo_delete_rows(self.rows_data)
+
+    def size(self):
+        return len(self.rows_data) * len(self.target._columns) * _DELETED_CELL_SIZE
 
 
-class cmdSetValue(wx.Command):
-    def __init__(self, target, cells, value: str):
-        super().__init__(True, "Установить значение в ячейки")
+class cmdSetValue(JournalCommand):
+    name = "Установить значение в ячейки"
+
+    def __init__(self, target, cells, value: str, typing=False):
         self.target = target
         self.cells = cells
         self.value = value
+        self.typing = typing
+        self.diffs: List[CellsDiff] = []
+        self.time = 0
 
-    def Do(self):
+    def do(self):
         if len(self.cells) == 0:
             return False
-        self.target._cmd_set_cell_value(self.cells, self.value)
+        self.diffs = self.target._cmd_set_cell_value(self.cells, self.value)
+        self.cells = None
+        self.time = time.monotonic()
         return True
 
-    def Undo(self):
-        self.target._cmd_undo_set_cell_value()
+    def undo(self):
+        self.target._cmd_apply_diffs(self.diffs, undo=True)
+
+    def redo(self):
+        self.target._cmd_apply_diffs(self.diffs, undo=False)
+
+    def size(self):
+        return sum(diff.size() for diff in self.diffs)
+
+    def merge(self, command):
+        if (
+            not isinstance(command, cmdSetValue)
+            or not self.typing
+            or not command.typing
+            or command.time - self.time > TYPING_COALESCE_SECONDS
+        ):
+            return False
+        self.diffs.extend(command.diffs)
+        self.time = command.time
         return True
 
 
-class cmdPaste(wx.Command):
+class cmdPaste(JournalCommand):
+    name = "Вставить"
+
     def __init__(self, target, start_row, start_col, table):
-        super().__init__(True, "Вставить")
         self.target = target
         self.start_row = start_row
         self.start_col = start_col
         self.table = table
+        self.diffs: List[CellsDiff] = []
 
-    def Do(self):
-        self.target._cmd_paste(self.start_row, self.start_col, self.table)
+    def do(self):
+        self.diffs = [self.target._cmd_paste(self.start_row, self.start_col, self.table)]
+        # Для повтора достаточно сжатых значений из diffs
+        self.table = None
         return True
 
-    def Undo(self):
-        self.target._cmd_undo_paste()
-        return True
+    def undo(self):
+        self.target._cmd_apply_diffs(self.diffs, undo=True)
+
+    def redo(self):
+        self.target._cmd_apply_diffs(self.diffs, undo=False)
+
+    def size(self):
+        return sum(diff.size() for diff in self.diffs)
 
 
 GridColumnResized, EVT_GRID_COLUMN_RESIZED = wx.lib.newevent.NewEvent()
@@ -399,10 +557,11 @@ ID_CANCEL_SELECTION = ID_ADD_ROW + 3
 ID_TOGGLE_ERRORS = ID_ADD_ROW + 5
 ID_COPY_HEADERS = ID_ADD_ROW + 6
 ID_COPY_WITH_HEADER = ID_ADD_ROW + 7
+ID_FIND_PREV = ID_ADD_ROW + 8
 
 
 class CustomGrid(wx.grid.Grid, wx.lib.mixins.gridlabelrenderer.GridWithLabelRenderersMixin):
-    def __init__(self, *args, **kw):
+    def __init__(self, *args, table: wx.grid.GridTableBase = None, **kw):
         super().__init__(*args, **kw)
         wx.lib.mixins.gridlabelrenderer.GridWithLabelRenderersMixin.__init__(self)
         self.SetScrollRate(1, 100)
@@ -416,7 +575,10 @@ class CustomGrid(wx.grid.Grid, wx.lib.mixins.gridlabelrenderer.GridWithLabelRend
         self.SetSelectionBackground(wx.SystemSettings.GetColour(wx.SYS_COLOUR_HIGHLIGHT))
         self.EnableDragRowSize(True)
         self.SetRowLabelSize(30)
-        self.CreateGrid(0, 0)
+        if table is None:
+            self.CreateGrid(0, 0)
+        else:
+            self.SetTable(table, True)
         self.EnableEditing(True)
         self.SetColMinimalAcceptableWidth(2)
         self.SetRowMinimalAcceptableHeight(20)
@@ -430,7 +592,19 @@ class CustomGrid(wx.grid.Grid, wx.lib.mixins.gridlabelrenderer.GridWithLabelRend
 
 
 class GridEditor(wx.Panel):
-    def __init__(self, parent, model, menubar, toolbar, statusbar, header_height=-1, read_only=False, freezed_cols=0):
+    def __init__(
+        self,
+        parent,
+        model,
+        menubar,
+        toolbar,
+        statusbar,
+        header_height=-1,
+        read_only=False,
+        freezed_cols=0,
+        virtual=False,
+        undo_max_size=32 * 1024 * 1024,
+    ):
         super().__init__(parent)
         self.menubar: wx.MenuBar = menubar
         self.toolbar: wx.ToolBar = toolbar
@@ -438,6 +612,12 @@ class GridEditor(wx.Panel):
         self._model = model
 
         self._read_only = read_only
+        # В виртуальном режиме значения и атрибуты ячеек запрашиваются у модели только для видимой части таблицы
+        self._virtual = virtual
+        self._table = None
+        if virtual:
+            self._attr_provider = CellAttrProvider(read_only)
+            self._table = ModelGridTable(model, self._attr_provider)
 
         main_sizer = wx.BoxSizer(wx.VERTICAL)
         self._splitter = wx.SplitterWindow(self, style=wx.SP_3DSASH | wx.SP_LIVE_UPDATE)
@@ -445,7 +625,11 @@ class GridEditor(wx.Panel):
         self._hor_splitter = wx.SplitterWindow(self._splitter, style=wx.SP_3DSASH | wx.SP_LIVE_UPDATE)
         main_sizer.Add(self._splitter, 1, wx.EXPAND)
 
-        self._view = CustomGrid(self._hor_splitter, style=wx.WANTS_CHARS | wx.BORDER_NONE | wx.WS_EX_PROCESS_UI_UPDATES)
+        self._view = CustomGrid(
+            self._hor_splitter,
+            style=wx.WANTS_CHARS | wx.BORDER_NONE | wx.WS_EX_PROCESS_UI_UPDATES,
+            table=self._table,
+        )
         if header_height == -1:
             height = header_height
         else:
@@ -486,24 +670,40 @@ class GridEditor(wx.Panel):
             "can_find_next": False,
         }
 
-        self._command_processor = wx.CommandProcessor()
+        # Журнал отмены хранит сжатые изменения ячеек, старые записи удаляются при превышении undo_max_size
+        self._journal = CommandJournal(undo_max_size)
         self._bind_all()
 
         self._last_cursor_pos = None
         self._in_edit_mode = False
         self._controls_initialized = False
-        self._append_rows_undo_stack = []
-        self._set_cell_value_undo_stack = []
-        self._delete_rows_undo_stack = []
-        self._past_undo_stack = []
         self._hightlight_cells = []
+        # Ошибки последней проверки: (id столбца, строка, сообщение)
+        self._last_errors = set()
+        # После проверки с ошибками они обновляются при каждом изменении, если модель проверяет инкрементально
+        self._live_validation = False
+        # Строки, полосы которых нужно поправить после команды: [(начало, конец или None - до конца)]
+        self._restripe = []
+        self._in_model_change = False
         self._freezed_cols = freezed_cols
 
         self._q = ""
         self._strict_mode = True
-        self._find_pos = (0, 0)
+        self._find_mode = FIND_SUBSTRING
+        self._search = GridSearch(model)
+        # Найденные ячейки (row, col) последнего поиска, None - нужно повторить поиск (модель изменилась)
+        self._find_hits = []
+        self._find_hit_pos = -1
+        # Если модель сообщает об изменениях, команды обновляют только затронутые ячейки и строки
+        self._incremental = model.add_change_listener(self._on_model_changed)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self._on_destroy)
         self._render(initial=True)
 
+    def _on_destroy(self, event):
+        if event.GetEventObject() is self and self._incremental:
+            self._model.remove_change_listener(self._on_model_changed)
+        event.Skip()
+
     def _bind_cell_changing(self):
         if not self._cell_changed_binded:
             self._cell_changed_binded = True
@@ -525,6 +725,7 @@ class GridEditor(wx.Panel):
         self._view.GetGridWindow().Bind(wx.EVT_LEFT_DOWN, self._on_left_click)
         self._view.GetGridWindow().Bind(wx.EVT_RIGHT_DOWN, self._on_right_click)
         self._view.Bind(wx.grid.EVT_GRID_LABEL_RIGHT_CLICK, self._on_label_context_menu)
+        self._view.Bind(wx.grid.EVT_GRID_LABEL_LEFT_CLICK, self._on_label_click)
         self._errors_view._main_notebook.Bind(
             wx.lib.agw.flatnotebook.EVT_FLATNOTEBOOK_PAGE_CLOSING,
             self._on_errors_view_closing,
@@ -588,8 +789,75 @@ class GridEditor(wx.Panel):
             item = menu.Append(ID_COPY_HEADERS, "Копировать заголовки")
             menu.Bind(wx.EVT_MENU, self._on_copy_headers, item)
             item.SetBitmap(get_art(wx.ART_COPY))
+            col = event.GetCol()
+            if col != -1 and self._model.can_sort():
+                menu.AppendSeparator()
+                item = menu.Append(wx.ID_ANY, "Сортировать по возрастанию")
+                menu.Bind(wx.EVT_MENU, lambda e: self.sort_by(col, True), item)
+                item = menu.Append(wx.ID_ANY, "Сортировать по убыванию")
+                menu.Bind(wx.EVT_MENU, lambda e: self.sort_by(col, False), item)
+                item = menu.Append(wx.ID_ANY, "Сбросить сортировку")
+                item.Enable(self._model.get_sort() is not None)
+                menu.Bind(wx.EVT_MENU, lambda e: self.sort_by(None), item)
+                menu.AppendSeparator()
+                item = menu.Append(wx.ID_ANY, "Фильтр...")
+                menu.Bind(wx.EVT_MENU, lambda e: self._on_column_filter(col), item)
+                item = menu.Append(wx.ID_ANY, "Сбросить фильтры")
+                menu.Bind(wx.EVT_MENU, self._on_clear_column_filters, item)
             self.PopupMenu(menu, event.GetPosition())
 
+    def _on_label_click(self, event: wx.grid.GridEvent):
+        col = event.GetCol()
+        if event.GetRow() != -1 or col == -1 or not self._model.can_sort():
+            event.Skip()
+            return
+        # Повторный щелчок меняет направление сортировки, третий - сбрасывает ее
+        sort = self._model.get_sort()
+        if sort is None or sort[0] != col:
+            self.sort_by(col, True)
+        elif sort[1]:
+            self.sort_by(col, False)
+        else:
+            self.sort_by(None)
+
+    def sort_by(self, col, ascending=True):
+        with wx.BusyCursor():
+            self._model.sort(col, ascending)
+            self._after_view_changed()
+
+    def _on_column_filter(self, col):
+        column = self._columns[col]
+        if isinstance(column.cell_type, (FloatCellType, NumberCellType)):
+            hint = "Условие: >5, <=10, =3, !=0 или диапазон 1..10"
+        else:
+            hint = "Часть значения или =значение для точного совпадения"
+        dlg = wx.TextEntryDialog(
+            self,
+            "%s\n\nПустое условие снимает фильтр." % hint,
+            "Фильтр: %s" % column.name_short.replace("\n", " "),
+            self._model.get_column_filter(col),
+        )
+        if dlg.ShowModal() != wx.ID_OK:
+            return
+        try:
+            with wx.BusyCursor():
+                self._model.set_column_filter(col, dlg.GetValue())
+        except ValueError as e:
+            wx.MessageBox(str(e), "Ошибка фильтра", style=wx.OK | wx.ICON_ERROR)
+            return
+        self._after_view_changed()
+
+    def _on_clear_column_filters(self, event):
+        self._model.clear_column_filters()
+        self._after_view_changed()
+
+    def _after_view_changed(self):
+        # Номера строк после сортировки и фильтра другие, выделение и подсветка к ним не относятся
+        self._view.ClearSelection()
+        self._hightlight_cells = []
+        self._render()
+        self._update_controls_state()
+
     def _on_errors_view_closing(self, event):
         self._splitter.Unsplit(self._errors_view)
         self._update_controls_state()
@@ -635,7 +903,7 @@ class GridEditor(wx.Panel):
 
     def _on_add_rows(self, event: wx.MenuEvent):
         count = event.GetId()
-        self._command_processor.Submit(cmdAppendRows(self, count))
+        self._journal.submit(cmdAppendRows(self, count))
         self._update_controls_state()
 
     def _on_cell_context_menu(self, event: wx.grid.GridEvent):
@@ -694,6 +962,10 @@ class GridEditor(wx.Panel):
         item = menu.Append(wx.ID_ANY, "Убрать значения\tDEL")
         item.Enable(global_enable)
         menu.Bind(wx.EVT_MENU, self._on_remove_values, item)
+        menu.AppendSeparator()
+        item = menu.Append(wx.ID_ANY, "Экспорт в файл...")
+        item.SetBitmap(get_icon("excel"))
+        menu.Bind(wx.EVT_MENU, lambda e: self.export_to_file(), item)
         self.PopupMenu(menu, event.GetPosition())
 
     def _on_remove_values(self, event):
@@ -706,7 +978,7 @@ class GridEditor(wx.Panel):
                 for row_index in range(block.TopRow, block.BottomRow + 1):
                     for col_index in range(block.LeftCol, block.RightCol + 1):
                         cells.append((row_index, col_index))
-        self._command_processor.Submit(cmdSetValue(self, cells, ""))
+        self._journal.submit(cmdSetValue(self, cells, ""))
         self._update_controls_state()
 
     def _on_copy(self, event):
@@ -748,7 +1020,8 @@ class GridEditor(wx.Panel):
         Rerender grid from data provider
         """
         try:
-            self.Hide()
+            if not self._virtual:
+                self.Hide()
             self._unbind_cell_changing()
             self._view.BeginBatch()
             self._do_render()
@@ -757,13 +1030,53 @@ class GridEditor(wx.Panel):
         finally:
             self._view.EndBatch()
             self._bind_cell_changing()
-            self.Show()
+            if not self._virtual:
+                self.Show()
 
     def _do_render(self):
         last_cursor_pos = self._last_cursor_pos
         self._columns = self._model.get_columns()
+        self._reset_find()
+        self._hightlight_cells = []
         # Обновление данных о размеразх столбцов удаление несуществующих столбцов, пересортировка
 
+        if self._virtual:
+            self._attr_provider.set_hightlight_cells([])
+            self._table.reset(self._view)
+        else:
+            self._do_render_cells()
+
+        # self._render_sizing(begin_batch=False)
+
+        if last_cursor_pos is not None and self._view.GetNumberCols() > 0 and self._view.GetNumberRows() > 0:
+            cursor_row, cursor_col = last_cursor_pos
+
+            if cursor_col >= self._view.GetNumberCols():
+                cursor_col = self._view.GetNumberCols() - 1
+            if cursor_row >= self._view.GetNumberRows():
+                cursor_row = self._view.GetNumberRows() - 1
+
+            self._view.SetGridCursor(cursor_row, cursor_col)
+
+        if self._auto_size_columns:
+            if self._virtual:
+                self._auto_size_sampled_columns()
+            else:
+                self._view.AutoSizeColumns()
+
+    def _auto_size_sampled_columns(self, sample_rows=200):
+        # AutoSizeColumns обходит все строки таблицы, для виртуальной таблицы ширина считается по первым строкам
+        dc = wx.ClientDC(self._view)
+        rows = range(min(self._model.total_rows(), sample_rows))
+        for col_index, column in enumerate(self._columns):
+            dc.SetFont(self._view.GetLabelFont())
+            width = dc.GetMultiLineTextExtent(column.name_short)[0]
+            dc.SetFont(self._view.GetDefaultCellFont())
+            for row_index in rows:
+                width = max(width, dc.GetTextExtent(self._model.get_value_at(col_index, row_index))[0])
+            self._view.SetColSize(col_index, max(width + 10, self._view.GetColMinimalAcceptableWidth()))
+
+    def _do_render_cells(self):
         if self._view.GetNumberRows() > 0:
             self._view.DeleteRows(0, self._view.GetNumberRows())
         self._view.AppendRows(self._model.total_rows())
@@ -772,7 +1085,7 @@ class GridEditor(wx.Panel):
         self._view.AppendCols(len(self._columns))
 
         for col_index, column in enumerate(self._columns):
-            self._view.SetColLabelValue(col_index, column.name_short)
+            self._view.SetColLabelValue(col_index, get_col_label(self._model, col_index, column))
             attr = wx.grid.GridCellAttr()
             renderer = column.cell_type.get_grid_renderer()
             attr.SetRenderer(renderer)
@@ -786,22 +1099,7 @@ class GridEditor(wx.Panel):
                 self._view.SetReadOnly(row_index, col_index, self._read_only)
             if row_index % 2 == 0:
                 for col_index, column in enumerate(self._columns):
-                    self._view.GetOrCreateCellAttr(row_index, col_index).SetBackgroundColour(wx.Colour(240, 240, 240))
-
-        # self._render_sizing(begin_batch=False)
-
-        if last_cursor_pos is not None and self._view.GetNumberCols() > 0 and self._view.GetNumberRows() > 0:
-            cursor_row, cursor_col = last_cursor_pos
-
-            if cursor_col >= self._view.GetNumberCols():
-                cursor_col = self._view.GetNumberCols() - 1
-            if cursor_row >= self._view.GetNumberRows():
-                cursor_row = self._view.GetNumberRows() - 1
-
-            self._view.SetGridCursor(cursor_row, cursor_col)
-
-        if self._auto_size_columns:
-            self._view.AutoSizeColumns()
+                    self._view.GetOrCreateCellAttr(row_index, col_index).SetBackgroundColour(STRIPE_COLOUR)
 
     def _render_sizing(self, begin_batch=False):
         if begin_batch:
@@ -859,7 +1157,7 @@ class GridEditor(wx.Panel):
         row_index = event.GetRow()
         col_index = event.GetCol()
         value = event.GetString()
-        self._command_processor.Submit(cmdSetValue(self, [(row_index, col_index)], value))
+        self._journal.submit(cmdSetValue(self, [(row_index, col_index)], value, typing=True))
         self._update_controls_state()
 
     def _set_state(self, state):
@@ -873,73 +1171,49 @@ class GridEditor(wx.Panel):
         if not eq:
             wx.PostEvent(self, GridEditorStateChangedEvent(target=self))
 
-    class OpenInExcellTask(TaskJob):
-        def __init__(self, model, view):
-            super().__init__()
-            self.model = model
-            self.view = view
-
-        def col_letter(self, n):
-            result = ""
-            while n >= 0:
-                result = chr(n % 26 + ord("A")) + result
-                n = n // 26 - 1
-            return result
-
-        def run(self):
-            import pandas as pd
-            import xlwings as xw
-
-            columns = self.model.get_columns()
-            columns_names = list(map(lambda a: a.name_short, columns))
-            rows = []
-            for row_index in range(self.model.total_rows()):
-                row = []
-                for col_index in range(len(columns_names)):
-                    value = self.model.get_value_at(col_index, row_index)
-                    cell_type = columns[col_index].cell_type
-                    if isinstance(cell_type, FloatCellType) and cell_type.test_repr(value):
-                        value = cell_type.from_string(value)
-                    row.append(value)
-                rows.append(row)
-            df = pd.DataFrame(rows, columns=columns_names)
-            wb = xw.Book()  # Открывает новое окно Excel
-            sht: xw.Sheet = wb.sheets[0]
-            sht.name = "Сводка ФМС"
-            rows_len, cols_len = df.shape
-            for index in range(self.view.GetNumberCols()):
-                sht.range("%s:%s" % (self.col_letter(index + 1), self.col_letter(index + 1))).column_width = int(
-                    min(self.view.GetColSize(index) / 7, 255)
-                )
-            sht.range("A1").value = df  # Записывает таблицу в Excel
-            for index, column in enumerate(columns):
-                if not isinstance(column.cell_type, FloatCellType):
-                    sht.range((2, index + 1), (rows_len + 1, index + 1)).number_format = "@"
-            sht.autofit(axis="rows")
-
-    def open_in_excell(self, only_selection=False):
-        self.excell_task = Task(
-            "Экспорт в excell",
-            "Идет экспорт в excell...",
-            self.OpenInExcellTask(self._model, self._view),
+    def open_in_excell(self):
+        """
+        Выгружает таблицу во временный xlsx и открывает его приложением по умолчанию
+        """
+        path = os.path.join(tempfile.mkdtemp(), "table.xlsx")
+        self._run_export(path, lambda: wx.LaunchDefaultApplication(path))
+
+    def export_to_file(self):
+        dlg = wx.FileDialog(
+            self,
+            "Экспорт таблицы",
+            wildcard="Книга Excel (*.xlsx)|*.xlsx|CSV (*.csv)|*.csv",
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        )
+        if dlg.ShowModal() != wx.ID_OK:
+            return
+        self._run_export(dlg.GetPath())
+
+    def _run_export(self, path, on_done=None):
+        col_widths = [self._view.GetColSize(index) for index in range(self._view.GetNumberCols())]
+        self.export_task = Task(
+            "Экспорт таблицы",
+            "Идет экспорт таблицы...",
+            ExportTask(self._model, path, col_widths),
             self,
-            can_abort=False,
-            show_time=False,
         )
+
+        def on_resolve(completed):
+            self.export_task.Destroy()
+            if completed and on_done is not None:
+                on_done()
+
+        def on_reject(e):
+            self.export_task.Destroy()
+            raise e
+
         try:
-            self.excell_task.then(self.on_excell_resolve, self.on_excell_reject)
-            self.excell_task.run()
+            self.export_task.then(on_resolve, on_reject)
+            self.export_task.run()
         except Exception as e:
-            self.excell_task.Destroy()
+            self.export_task.Destroy()
             raise e
 
-    def on_excell_resolve(self, data):
-        self.excell_task.Destroy()
-
-    def on_excell_reject(self, e):
-        self.excell_task.Destroy()
-        raise e
-
     def can_save(self) -> bool:
         return self._state["can_save"]
 
@@ -968,6 +1242,9 @@ class GridEditor(wx.Panel):
         if success:
             self._render()
             self._update_controls_state()
+        else:
+            # Показываем ошибки, из-за которых запись не выполнена
+            self.validate(save_edit_control=False)
 
         return success
 
@@ -993,26 +1270,16 @@ class GridEditor(wx.Panel):
         table = []
 
         if len(blocks) == 1:
-            for row_index in range(blocks[0].TopRow, blocks[0].BottomRow + 1):
-                table.append([])
-                for col_index in range(blocks[0].LeftCol, blocks[0].RightCol + 1):
-                    table[len(table) - 1].append(self._view.GetCellValue(row_index, col_index))
+            table = self._model.get_values(self._to_cell_block(blocks[0]))
         elif blocks[0].TopRow == blocks[1].TopRow and blocks[0].BottomRow == blocks[1].BottomRow:
             blocks = sorted(blocks, key=lambda x: x.LeftCol)
-
-            for row_index in range(blocks[0].TopRow, blocks[0].BottomRow + 1):
-                table.append([])
-                for block in blocks:
-                    for col_index in range(block.LeftCol, block.RightCol + 1):
-                        table[len(table) - 1].append(self._view.GetCellValue(row_index, col_index))
+            parts = [self._model.get_values(self._to_cell_block(block)) for block in blocks]
+            for row_parts in zip(*parts):
+                table.append([value for part in row_parts for value in part])
         elif blocks[0].LeftCol == blocks[1].LeftCol and blocks[0].RightCol == blocks[1].RightCol:
             blocks = sorted(blocks, key=lambda x: x.TopRow)
-
             for block in blocks:
-                for row_index in range(block.TopRow, block.BottomRow + 1):
-                    table.append([])
-                    for col_index in range(block.LeftCol, block.RightCol + 1):
-                        table[len(table) - 1].append(self._view.GetCellValue(row_index, col_index))
+                table.extend(self._model.get_values(self._to_cell_block(block)))
 
         buffer = io.StringIO()
         writer = csv.writer(buffer, dialect="excel-tab")
@@ -1025,6 +1292,9 @@ class GridEditor(wx.Panel):
         wx.TheClipboard.SetData(wx.TextDataObject(buffer.getvalue()))
         wx.TheClipboard.Close()
 
+    def _to_cell_block(self, block: wx.grid.GridBlockCoords) -> CellBlock:
+        return CellBlock(block.TopRow, block.LeftCol, block.BottomRow, block.RightCol)
+
     def cut(self):
         self.copy()
         blocks: List[wx.grid.GridBlockCoords] = [x for x in self._view.GetSelectedBlocks()]
@@ -1036,7 +1306,7 @@ class GridEditor(wx.Panel):
                 for row_index in range(block.TopRow, block.BottomRow + 1):
                     for col_index in range(block.LeftCol, block.RightCol + 1):
                         cells.append((row_index, col_index))
-        self._command_processor.Submit(cmdSetValue(self, cells, ""))
+        self._journal.submit(cmdSetValue(self, cells, ""))
         self._update_controls_state()
 
     def paste(self):
@@ -1082,7 +1352,7 @@ class GridEditor(wx.Panel):
             else:
                 cells.append((cursor_row, cursor_col))
 
-            self._command_processor.Submit(cmdSetValue(self, cells, value))
+            self._journal.submit(cmdSetValue(self, cells, value))
         else:
             if len(blocks) > 1:
                 wx.TheClipboard.Close()
@@ -1111,18 +1381,18 @@ class GridEditor(wx.Panel):
 
             rows_to_append = len(table) - (self._view.GetNumberRows() - start_row)
             if rows_to_append > 0:
-                self._command_processor.Submit(cmdAppendRows(self, rows_to_append))
+                self._journal.submit(cmdAppendRows(self, rows_to_append))
 
-            self._command_processor.Submit(cmdPaste(self, start_row, start_col, table))
+            self._journal.submit(cmdPaste(self, start_row, start_col, table))
 
             wx.TheClipboard.Close()
 
     def undo(self):
-        self._command_processor.Undo()
+        self._journal.undo()
         self._update_controls_state()
 
     def redo(self):
-        self._command_processor.Redo()
+        self._journal.redo()
         self._update_controls_state()
 
     def apply_controls(self):
@@ -1147,6 +1417,14 @@ class GridEditor(wx.Panel):
         self._sep_3 = menu.AppendSeparator()
         self._item_4 = menu.Append(wx.ID_ANY, "Убрать значения\tDEL")
         menu.Bind(wx.EVT_MENU, self._on_remove_values, self._item_4)
+        self._sep_4 = menu.AppendSeparator()
+        self._item_6 = menu.Append(wx.ID_FIND, "Найти...\tCTRL+F")
+        self._item_6.SetBitmap(get_icon("find"))
+        menu.Bind(wx.EVT_MENU, lambda e: self.find(), self._item_6)
+        self._item_7 = menu.Append(wx.ID_ANY, "Найти далее\tF3")
+        menu.Bind(wx.EVT_MENU, lambda e: self.find_next(), self._item_7)
+        self._item_8 = menu.Append(ID_FIND_PREV, "Найти предыдущее\tSHIFT+F3")
+        menu.Bind(wx.EVT_MENU, lambda e: self.find_prev(), self._item_8)
 
         menu: wx.Menu = self.menubar.GetMenu(2)
 
@@ -1178,11 +1456,11 @@ class GridEditor(wx.Panel):
         self._view.ClearSelection()
 
     def _on_add_row(self, event):
-        self._command_processor.Submit(cmdAppendRows(self, 1))
+        self._journal.submit(cmdAppendRows(self, 1))
         self._update_controls_state()
 
     def _on_delete_row(self, event):
-        self._command_processor.Submit(cmdDeleteRows(self, self._view.GetSelectedRows()))
+        self._journal.submit(cmdDeleteRows(self, self._view.GetSelectedRows()))
         self._update_controls_state()
 
     def remove_controls(self):
@@ -1197,6 +1475,10 @@ class GridEditor(wx.Panel):
         menu.Remove(self._item_3).Destroy()
         menu.Remove(self._item_4).Destroy()
         menu.Remove(self._sep_3).Destroy()
+        menu.Remove(self._sep_4).Destroy()
+        menu.Remove(self._item_6).Destroy()
+        menu.Remove(self._item_7).Destroy()
+        menu.Remove(self._item_8).Destroy()
         menu = self.menubar.GetMenu(2)
         menu.Remove(self._item_5).Destroy()
         menu.Remove(self._sep_2).Destroy()
@@ -1211,13 +1493,8 @@ class GridEditor(wx.Panel):
         self.statusbar.SetStatusText("", 2)
 
     def _update_undo_redo_state(self):
-        if (
-            self._state["can_undo"] != self._command_processor.CanUndo()
-            or self._state["can_redo"] != self._command_processor.CanRedo()
-        ):
-            self._set_state(
-                {"can_undo": self._command_processor.CanUndo(), "can_redo": self._command_processor.CanRedo()}
-            )
+        if self._state["can_undo"] != self._journal.can_undo() or self._state["can_redo"] != self._journal.can_redo():
+            self._set_state({"can_undo": self._journal.can_undo(), "can_redo": self._journal.can_redo()})
 
     def _update_controls_state(self):
         """
@@ -1271,198 +1548,299 @@ class GridEditor(wx.Panel):
         self.menubar.Check(ID_TOGGLE_ERRORS, self._splitter.GetWindow2() is not None)
 
     def _cmd_append_rows(self, number_rows):
-        for i in range(number_rows):
-            self._model.insert_row(self._model.total_rows())
-        self._append_rows_undo_stack.append(number_rows)
-        self._render()
+        with self._changing_model():
+            for i in range(number_rows):
+                self._model.insert_row(self._model.total_rows())
         cursor_col = self._view.GetGridCursorCol()
         if cursor_col == -1:
             cursor_col = 0
         self._view.GoToCell(self._view.GetNumberRows() - 1, self._view.GetGridCursorCol())
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
+        self._on_cmd_done()
 
-    def _cmd_undo_append_rows(self):
-        number_rows = self._append_rows_undo_stack.pop()
-        for i in range(number_rows):
-            self._model.delete_row(self._model.total_rows() - 1)
-        self._render()
+    def _cmd_undo_append_rows(self, number_rows):
+        with self._changing_model():
+            for i in range(number_rows):
+                self._model.delete_row(self._model.total_rows() - 1)
         if self._model.total_rows() > 0:
             y = self._view.GetNumberRows() - 1
             x = self._view.GetGridCursorCol()
             self._view.GoToCell(y, x)
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
+        self._on_cmd_done()
 
     def _cmd_delete_rows(self, rows_pos):
         undo = {}
         for row in rows_pos:
             undo[row] = self._model.get_row_state(row)
-        self._delete_rows_undo_stack.append(undo)
         minus = 0
-        for row_pos in rows_pos:
-            self._model.delete_row(row_pos - minus)
-            minus += 1
-        self._render()
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
-
-    def _cmd_undo_delete_rows(self):
-        rows_data = self._delete_rows_undo_stack.pop()
-        for row_index, state in rows_data.items():
-            self._model.restore_row(row_index, state)
-        self._render()
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
-
-    def _cmd_set_cell_value(self, cells, value: str):
-        undo = []
-        for cell_row, cell_col in cells:
-            undo.append((cell_row, cell_col, self._model.get_value_at(cell_col, cell_row)))
-        self._set_cell_value_undo_stack.append(undo)
-
-        for cell_row, cell_col in cells:
-            self._model.set_value_at(cell_col, cell_row, value)
-
-        self._render()
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
-
-    def _cmd_undo_set_cell_value(self):
-        undo = self._set_cell_value_undo_stack.pop()
-        for cell_row, cell_col, value in undo:
-            self._model.set_value_at(cell_col, cell_row, value)
-        self._render()
-
+        with self._changing_model():
+            for row_pos in rows_pos:
+                self._model.delete_row(row_pos - minus)
+                minus += 1
+        self._on_cmd_done()
+        return undo
+
+    def _cmd_undo_delete_rows(self, rows_data):
+        with self._changing_model():
+            for row_index, state in rows_data.items():
+                self._model.restore_row(row_index, state)
+        self._on_cmd_done()
+
+    def _cmd_set_cell_value(self, cells, value: str) -> List[CellsDiff]:
+        diffs = []
+        with self._changing_model():
+            for block in cells_to_blocks(cells):
+                old = RleValues.encode(self._model.get_values(block))
+                self._model.set_values(block, [[value] * len(block.cols())] * len(block.rows()))
+                diffs.append(CellsDiff(block, old, RleValues.encode(self._model.get_values(block))))
+        self._on_cmd_done()
+        return diffs
+
+    def _cmd_paste(self, start_row, start_col, table) -> CellsDiff:
+        width = min(max(len(row) for row in table), len(self._columns) - start_col)
+        block = CellBlock(start_row, start_col, start_row + len(table) - 1, start_col + width - 1)
+        old = RleValues.encode(self._model.get_values(block))
+        with self._changing_model():
+            self._model.set_values(block, table)
+        diff = CellsDiff(block, old, RleValues.encode(self._model.get_values(block)))
+        self._on_cmd_done()
+        return diff
+
+    def _cmd_apply_diffs(self, diffs: List[CellsDiff], undo: bool):
+        with self._changing_model():
+            for diff in reversed(diffs) if undo else diffs:
+                self._model.set_values(diff.block, diff.old.decode() if undo else diff.new.decode())
+        self._on_cmd_done()
+
+    def _on_cmd_done(self):
         _can_save = self._model.have_changes()
         if self._state["can_save"] != _can_save:
             self._set_state({"can_save": _can_save})
         self._notify_model_changed()
 
-    def _cmd_paste(self, start_row, start_col, table):
-        undo = []
-        for row_index in range(len(table)):
-            for col_index in range(len(table[row_index])):
-                undo.append(
-                    (
-                        row_index + start_row,
-                        col_index + start_col,
-                        self._model.get_value_at(col_index + start_col, row_index + start_row),
-                    )
-                )
-                self._model.set_value_at(col_index + start_col, row_index + start_row, table[row_index][col_index])
+    def _notify_model_changed(self):
+        wx.PostEvent(self, GridModelStateChangedEvent(target=self))
 
-        self._past_undo_stack.append(undo)
-        self._render()
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
+    @contextmanager
+    def _changing_model(self):
+        """
+        Изменение модели командой. Если модель сообщает об изменениях, они применяются к таблице
+        по мере поступления в одном пакете отрисовки, иначе таблица перестраивается целиком.
+        """
+        if not self._incremental:
+            yield
+            self._render()
+            return
+        self._view.BeginBatch()
+        self._in_model_change = True
+        try:
+            try:
+                yield
+            finally:
+                self._in_model_change = False
+                self._apply_restripe()
+            if self._live_validation:
+                self.validate(save_edit_control=False, live=True)
+        finally:
+            self._view.EndBatch()
 
-    def _cmd_undo_paste(self):
-        undo = self._past_undo_stack.pop()
-        for row_index, col_index, value in undo:
-            self._model.set_value_at(col_index, row_index, value)
+    def _on_model_changed(self, change: ModelChange):
+        if len(change.inserted_rows) > 0 or len(change.removed_rows) > 0:
+            self._reset_find()
+        else:
+            self._reset_find(set(col_index for _, col_index in change.cells))
+        self._view.BeginBatch()
+        try:
+            for start, count in change.removed_rows:
+                self._shift_hightlight_cells(start, -count)
+                if self._virtual:
+                    self._table.notify_rows_deleted(self._view, start, count)
+                else:
+                    self._view.DeleteRows(start, count)
+                    # Атрибуты сдвигаются вместе со строками, полосы нужно поправить только при нечетном сдвиге
+                    if count % 2 == 1:
+                        self._restripe.append((start, None))
+            for start, count in change.inserted_rows:
+                self._shift_hightlight_cells(start, count)
+                if self._virtual:
+                    self._table.notify_rows_inserted(self._view, start, count)
+                else:
+                    self._view.InsertRows(start, count)
+                    for row_index in range(start, start + count):
+                        for col_index in range(len(self._columns)):
+                            self._view.SetCellValue(
+                                row_index, col_index, self._model.get_value_at(col_index, row_index)
+                            )
+                            self._view.SetReadOnly(row_index, col_index, self._read_only)
+                    self._restripe.append((start, start + count if count % 2 == 0 else None))
+            if len(change.cells) > 0:
+                changed = set((col_index, row_index) for row_index, col_index in change.cells)
+                self._hightlight_cells = [cell for cell in self._hightlight_cells if cell not in changed]
+                if not self._virtual:
+                    for row_index, col_index in change.cells:
+                        self._view.SetCellValue(row_index, col_index, self._model.get_value_at(col_index, row_index))
+                        self._view.SetCellBackgroundColour(row_index, col_index, self._get_stripe_colour(row_index))
+            if self._virtual:
+                self._attr_provider.set_hightlight_cells(self._hightlight_cells)
+                self._view.ForceRefresh()
+            elif not self._in_model_change:
+                self._apply_restripe()
+        finally:
+            self._view.EndBatch()
 
-        self._render()
-        _can_save = self._model.have_changes()
-        if self._state["can_save"] != _can_save:
-            self._set_state({"can_save": _can_save})
-        self._notify_model_changed()
+    def _apply_restripe(self):
+        """
+        Перекрашивает полосы один раз после всех изменений команды: точный диапазон для одного изменения,
+        иначе от первой затронутой строки до конца, так как последующие изменения сдвигают строки
+        """
+        if len(self._restripe) == 0:
+            return
+        if len(self._restripe) == 1:
+            start, end = self._restripe[0]
+        else:
+            start, end = min(start for start, _ in self._restripe), None
+        self._restripe = []
+        rows_count = self._view.GetNumberRows()
+        self._stripe_rows(start, min(end, rows_count) if end is not None else rows_count)
 
-    def _notify_model_changed(self):
-        wx.PostEvent(self, GridModelStateChangedEvent(target=self))
+    def _shift_hightlight_cells(self, start, delta):
+        # Подсветка ошибок сдвигается вместе со строками, у удаленных строк убирается
+        cells = []
+        for col_index, row_index in self._hightlight_cells:
+            if row_index >= start:
+                if delta < 0 and row_index < start - delta:
+                    continue
+                row_index += delta
+            cells.append((col_index, row_index))
+        self._hightlight_cells = cells
+
+    def _get_stripe_colour(self, row_index) -> wx.Colour:
+        return STRIPE_COLOUR if row_index % 2 == 0 else self._view.GetDefaultCellBackgroundColour()
+
+    def _stripe_rows(self, start, end):
+        hightlight = set(self._hightlight_cells)
+        for row_index in range(start, end):
+            colour = self._get_stripe_colour(row_index)
+            for col_index in range(len(self._columns)):
+                if (col_index, row_index) in hightlight:
+                    self._view.SetCellBackgroundColour(row_index, col_index, HIGHTLIGHT_COLOUR)
+                else:
+                    self._view.SetCellBackgroundColour(row_index, col_index, colour)
 
     def is_changed(self):
         return self._model.have_changes()
 
     def end(self): ...
 
-    def _do_hightlight_cells(self):
+    def _do_hightlight_cells(self, removed, added):
+        if self._virtual:
+            self._attr_provider.set_hightlight_cells(self._hightlight_cells)
+            self._view.ForceRefresh()
+            return
+        rows_count = self._view.GetNumberRows()
+        cols_count = self._view.GetNumberCols()
         self._view.BeginBatch()
-        for col_index, row_index in self._hightlight_cells:
-            if col_index < self._view.GetNumberCols() and row_index < self._view.GetNumberRows():
-                self._view.SetCellBackgroundColour(row_index, col_index, wx.Colour(255, 210, 210))
+        for col_index, row_index in removed:
+            if col_index < cols_count and row_index < rows_count:
+                self._view.SetCellBackgroundColour(row_index, col_index, self._get_stripe_colour(row_index))
+        for col_index, row_index in added:
+            if col_index < cols_count and row_index < rows_count:
+                self._view.SetCellBackgroundColour(row_index, col_index, HIGHTLIGHT_COLOUR)
         self._view.EndBatch()
+        self._view.ForceRefresh()
 
-    def validate(self, save_edit_control=True):
+    def validate(self, save_edit_control=True, live=False):
+        """
+        Проверяет модель и подсвечивает ошибки. При live (после изменения) панель ошибок,
+        закрытую пользователем, открывает только появление новых ошибок, иначе обновляется ее содержимое.
+        """
         if save_edit_control:
             self._view.SaveEditControlValue()
             self._view.HideCellEditControl()
         errors = self._model.validate()
-        if len(errors) > 0 and self._splitter.GetWindow2() is None:
+        last_errors = self._last_errors
+        self._last_errors = set((column.id, row, msg) for column, row, msg in errors)
+        has_new_errors = len(self._last_errors - last_errors) > 0
+        if len(errors) > 0 and (not live or has_new_errors) and self._splitter.GetWindow2() is None:
             self._on_toggle_errors()
             self.menubar.Check(ID_TOGGLE_ERRORS, True)
         self._errors_view.set_errors(errors)
         hightlight = []
-        ids = list(map(lambda x: x.id, self._columns))
+        col_indexes = {column.id: index for index, column in enumerate(self._columns)}
         for column, row, msg in errors:
-            try:
-                col_index = ids.index(column.id)
-            except Exception:
-                continue
-            else:
-                hightlight.append((col_index, row))
+            if column.id in col_indexes:
+                hightlight.append((col_indexes[column.id], row))
+        # Перекрашиваются только ячейки, у которых подсветка изменилась
+        old_cells = set(self._hightlight_cells)
+        new_cells = set(hightlight)
         self._hightlight_cells = hightlight
-        self._do_hightlight_cells()
+        self._do_hightlight_cells(old_cells - new_cells, new_cells - old_cells)
+        self._live_validation = len(errors) > 0 and self._model.can_validate_incrementally()
         return len(errors) == 0
 
     def can_find(self) -> bool:
         return True
 
     def can_find_next(self) -> bool:
-        row, col = self._find_pos
-        return self._view.GetNumberRows() > row and len(self._q) > 0
-
-    def _find_go_next_cell(self):
-        _row, _col = self._find_pos
-        _col += 1
-        if _col > self._view.GetNumberCols() - 1:
-            _col = 0
-            _row += 1
-        self._find_pos = (_row, _col)
-
-    def _find_have_next_cell(self):
-        _row, _col = self._find_pos
-        return _row < self._view.GetNumberRows() - 1 or (
-            _row == self._view.GetNumberRows() - 1 and _col < self._view.GetNumberCols() - 1
-        )
+        return len(self._q) > 0 and (self._find_hits is None or len(self._find_hits) > 0)
 
-    def _do_find(self):
-        while self._find_have_next_cell():
-            _row, _col = self._find_pos
-            if self._view.GetCellValue(_row, _col) == self._q:
-                self._view.SelectBlock(_row, _col, _row, _col)
-                self._view.GoToCell(_row, _col)
+    def _reset_find(self, cols=None):
+        self._search.reset(cols)
+        if len(self._q) > 0:
+            self._find_hits = None
+
+    def _do_find(self, step=1):
+        """
+        Переходит к следующему (step=1) или предыдущему (step=-1) найденному значению относительно курсора
+        """
+        if self._find_hits is None:
+            try:
+                self._find_hits = self._search.find_all(self._q, self._find_mode, self._strict_mode)
+            except ValueError as e:
+                self._find_hits = []
+                wx.MessageBox(str(e), "Ошибка поиска", style=wx.OK | wx.ICON_ERROR)
                 return
-            self._find_go_next_cell()
+            self._find_hit_pos = -1
+        self._set_state({"can_find_next": self.can_find_next()})
+        if len(self._find_hits) == 0:
+            self.statusbar.SetStatusText("Не найдено: %s" % self._q, 3)
+            wx.Bell()
+            return
 
-        wx.Bell()
+        if self._find_hit_pos == -1:
+            # Первый переход - к ближайшему совпадению от курсора
+            cursor = (max(self._view.GetGridCursorRow(), 0), max(self._view.GetGridCursorCol(), 0))
+            pos = bisect_left(self._find_hits, cursor)
+            if step < 0:
+                pos -= 1
+        else:
+            pos = self._find_hit_pos + step
+        self._find_hit_pos = pos % len(self._find_hits)
+        _row, _col = self._find_hits[self._find_hit_pos]
+        self._view.SelectBlock(_row, _col, _row, _col)
+        self._view.GoToCell(_row, _col)
+        self.statusbar.SetStatusText(
+            "Найдено: %d (%d из %d)" % (len(self._find_hits), self._find_hit_pos + 1, len(self._find_hits)), 3
+        )
 
     def find(self):
-        dlg = FindDialog(self, q=self._q, strict_mode=self._strict_mode)
+        dlg = FindDialog(self, q=self._q, strict_mode=self._strict_mode, mode=self._find_mode)
         if dlg.ShowModal() == wx.ID_OK:
             self._q = dlg.get_q()
             self._strict_mode = dlg.is_strict_mode()
-            self._find_pos = (0, 0)
+            self._find_mode = dlg.get_mode()
+            self._find_hits = None if len(self._q) > 0 else []
             self._set_state({"can_find_next": self.can_find_next()})
-            self._do_find()
+            if len(self._q) > 0:
+                self._do_find()
 
     def find_next(self):
-        _row, _col = self._find_pos
-        _col += 1
-        if _col > self._view.GetNumberCols() - 1:
-            _col = 0
-            _row += 1
-        self._find_pos = (_row, _col)
-        self._do_find()
+        self._do_find(1)
+
+    def find_prev(self):
+        self._do_find(-1)
+
+    def get_find_hits(self):
+        """
+        Все найденные ячейки (row, col) последнего поиска
+        """
+        return list(self._find_hits) if self._find_hits is not None else []
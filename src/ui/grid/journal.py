@@ -0,0 +1,153 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Protocol, Tuple
+
+from .block import CellBlock
+
+# Примерный размер одной серии значений в памяти (кортеж, ссылка, int), байт
+_RUN_OVERHEAD = 72
+
+
+@dataclass
+class RleValues:
+    """
+    Значения блока ячеек построчно, сжатые в серии одинаковых значений (значение, количество)
+    """
+
+    width: int
+    runs: List[Tuple[str, int]]
+
+    @staticmethod
+    def encode(table: List[List[str]]) -> "RleValues":
+        runs = []
+        width = len(table[0]) if len(table) > 0 else 0
+        for row in table:
+            for value in row:
+                if len(runs) > 0 and runs[-1][0] == value:
+                    runs[-1] = (value, runs[-1][1] + 1)
+                else:
+                    runs.append((value, 1))
+        return RleValues(width, runs)
+
+    def decode(self) -> List[List[str]]:
+        values = []
+        for value, count in self.runs:
+            values.extend([value] * count)
+        if self.width == 0:
+            return []
+        return [values[i : i + self.width] for i in range(0, len(values), self.width)]
+
+    def size(self) -> int:
+        return sum(_RUN_OVERHEAD + len(value) for value, _ in self.runs)
+
+
+@dataclass
+class CellsDiff:
+    """
+    Изменение значений блока ячеек: значения до и после
+    """
+
+    block: CellBlock
+    old: RleValues
+    new: RleValues
+
+    def size(self) -> int:
+        return self.old.size() + self.new.size()
+
+
+class JournalCommand(Protocol):
+    name = ""
+
+    def do(self) -> bool:
+        """
+        Выполняет команду. False - команда ничего не изменила и в журнал не попадает
+        """
+        ...
+
+    def undo(self): ...
+
+    def redo(self):
+        self.do()
+
+    def size(self) -> int:
+        """
+        Примерный объем памяти данных для отмены, байт
+        """
+        return 0
+
+    def merge(self, command) -> bool:
+        """
+        Пытается присоединить следующую выполненную команду к этой, чтобы отменять их одним шагом
+        """
+        return False
+
+
+class CommandJournal:
+    """
+    Журнал команд для отмены и повтора. Объем данных для отмены ограничен max_size байт:
+    при превышении удаляются самые старые записи (последняя остается всегда).
+    """
+
+    def __init__(self, max_size=32 * 1024 * 1024):
+        self.max_size = max_size
+        self._undo = deque()
+        self._redo = []
+        self._size = 0
+        # После отмены или повтора следующая команда не присоединяется к предыдущей
+        self._can_merge = False
+
+    def submit(self, command: JournalCommand) -> bool:
+        if not command.do():
+            return False
+        for redo_command in self._redo:
+            self._size -= redo_command.size()
+        self._redo = []
+        last = self._undo[-1] if len(self._undo) > 0 else None
+        if self._can_merge and last is not None:
+            last_size = last.size()
+            if last.merge(command):
+                self._size += last.size() - last_size
+                self._evict()
+                return True
+        self._undo.append(command)
+        self._size += command.size()
+        self._can_merge = True
+        self._evict()
+        return True
+
+    def undo(self) -> bool:
+        if len(self._undo) == 0:
+            return False
+        command = self._undo.pop()
+        command.undo()
+        self._redo.append(command)
+        self._can_merge = False
+        return True
+
+    def redo(self) -> bool:
+        if len(self._redo) == 0:
+            return False
+        command = self._redo.pop()
+        command.redo()
+        self._undo.append(command)
+        self._can_merge = False
+        return True
+
+    def can_undo(self) -> bool:
+        return len(self._undo) > 0
+
+    def can_redo(self) -> bool:
+        return len(self._redo) > 0
+
+    def clear(self):
+        self._undo.clear()
+        self._redo = []
+        self._size = 0
+        self._can_merge = False
+
+    def get_size(self) -> int:
+        return self._size
+
+    def _evict(self):
+        while self._size > self.max_size and len(self._undo) > 1:
+            self._size -= self._undo.popleft().size()
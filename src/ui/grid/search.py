@@ -0,0 +1,113 @@
+import re
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Tuple
+
+from .block import CellBlock
+
+FIND_SUBSTRING = "substring"
+FIND_REGEX = "regex"
+FIND_RANGE = "range"
+
+
+class GridSearch:
+    """
+    Поиск по значениям модели таблицы. Для каждого столбца при первом поиске по нему строится индекс
+    значение -> строки (и отсортированный список чисел для поиска по диапазону), повторные поиски
+    проверяют только различные значения столбца. Индекс сбрасывается при изменении модели.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._values: Dict[int, Dict[str, List[int]]] = {}
+        self._numbers: Dict[int, Tuple[List[float], List[int]]] = {}
+
+    def reset(self, cols=None):
+        if cols is None:
+            self._values.clear()
+            self._numbers.clear()
+            return
+        for col in cols:
+            self._values.pop(col, None)
+            self._numbers.pop(col, None)
+
+    def find_all(self, q: str, mode=FIND_SUBSTRING, strict=False) -> List[Tuple[int, int]]:
+        """
+        Возвращает все найденные ячейки (row, col) в порядке строк.
+        При неверном регулярном выражении или диапазоне - ValueError.
+        """
+        hits = []
+        cols = range(len(self._model.get_columns()))
+        if mode == FIND_RANGE:
+            low, high = parse_range(q)
+            for col in cols:
+                numbers, rows = self._get_numbers(col)
+                hits.extend((row, col) for row in rows[bisect_left(numbers, low) : bisect_right(numbers, high)])
+        else:
+            match = make_matcher(q, mode, strict)
+            for col in cols:
+                for value, rows in self._get_values(col).items():
+                    if match(value):
+                        hits.extend((row, col) for row in rows)
+        hits.sort()
+        return hits
+
+    def _get_values(self, col) -> Dict[str, List[int]]:
+        values = self._values.get(col)
+        if values is None:
+            values = {}
+            rows_count = self._model.total_rows()
+            if rows_count > 0:
+                for row, (value,) in enumerate(self._model.get_values(CellBlock(0, col, rows_count - 1, col))):
+                    values.setdefault(value, []).append(row)
+            self._values[col] = values
+        return values
+
+    def _get_numbers(self, col) -> Tuple[List[float], List[int]]:
+        numbers = self._numbers.get(col)
+        if numbers is None:
+            pairs = []
+            for value, rows in self._get_values(col).items():
+                try:
+                    number = float(value.replace(",", "."))
+                except ValueError:
+                    continue
+                if number != number:
+                    continue
+                pairs.extend((number, row) for row in rows)
+            pairs.sort()
+            numbers = ([number for number, _ in pairs], [row for _, row in pairs])
+            self._numbers[col] = numbers
+        return numbers
+
+
+def make_matcher(q: str, mode=FIND_SUBSTRING, strict=False) -> Callable[[str], bool]:
+    """
+    Строгий поиск - совпадение значения целиком с учетом регистра, иначе - вхождение без учета регистра
+    """
+    if mode == FIND_REGEX:
+        try:
+            pattern = re.compile(q, 0 if strict else re.IGNORECASE)
+        except re.error as e:
+            raise ValueError("Неверное регулярное выражение: %s" % e)
+        return pattern.fullmatch if strict else pattern.search
+    if strict:
+        return lambda value: value == q
+    q = q.lower()
+    return lambda value: q in value.lower()
+
+
+def parse_range(q: str) -> Tuple[float, float]:
+    """
+    Диапазон чисел "1..10" (границы включительно, одну можно опустить) или одно число
+    """
+    try:
+        if ".." in q:
+            low, high = q.split("..", 1)
+            return (
+                float(low.strip().replace(",", ".")) if len(low.strip()) > 0 else float("-inf"),
+                float(high.strip().replace(",", ".")) if len(high.strip()) > 0 else float("inf"),
+            )
+        number = float(q.strip().replace(",", "."))
+    except ValueError:
+        raise ValueError("Неверный диапазон чисел: %s. Ожидается, например, 1..10" % q)
+    return number, number
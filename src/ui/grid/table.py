@@ -0,0 +1,139 @@
+from typing import Dict, Set, Tuple
+
+import wx
+import wx.grid
+
+STRIPE_COLOUR = wx.Colour(240, 240, 240)
+HIGHTLIGHT_COLOUR = wx.Colour(255, 210, 210)
+
+
+def get_col_label(model, col_index, column) -> str:
+    """Заголовок столбца с отметками сортировки и фильтра"""
+    label = column.name_short
+    if not model.can_sort():
+        return label
+    sort = model.get_sort()
+    if sort is not None and sort[0] == col_index:
+        label += " ▲" if sort[1] else " ▼"
+    if len(model.get_column_filter(col_index)) > 0:
+        label += " *"
+    return label
+
+
+class CellAttrProvider:
+    """
+    Атрибуты ячеек виртуальной таблицы: рендерер и редактор столбца, только чтение,
+    полосы по четным строкам и подсветка ошибок. Атрибуты кэшируются по сочетанию
+    признаков, поэтому их число не зависит от размера таблицы.
+    """
+
+    def __init__(self, read_only=False):
+        self.read_only = read_only
+        self._columns = []
+        self._hightlight_cells: Set[Tuple[int, int]] = set()
+        self._cache: Dict[Tuple[int, bool, bool], wx.grid.GridCellAttr] = {}
+
+    def set_columns(self, columns):
+        self._columns = columns
+        self._cache.clear()
+
+    def set_hightlight_cells(self, cells):
+        """cells - список (col, row)"""
+        self._hightlight_cells = set(cells)
+
+    def get_attr(self, row, col) -> wx.grid.GridCellAttr:
+        key = (col, row % 2 == 0, (col, row) in self._hightlight_cells)
+        attr = self._cache.get(key)
+        if attr is None:
+            attr = self._make_attr(*key)
+            self._cache[key] = attr
+        return attr
+
+    def _make_attr(self, col, striped, hightlighted) -> wx.grid.GridCellAttr:
+        attr = wx.grid.GridCellAttr()
+        if col < len(self._columns):
+            column = self._columns[col]
+            attr.SetRenderer(column.cell_type.get_grid_renderer())
+            attr.SetEditor(column.cell_type.get_grid_editor())
+        attr.SetReadOnly(self.read_only)
+        if hightlighted:
+            attr.SetBackgroundColour(HIGHTLIGHT_COLOUR)
+        elif striped:
+            attr.SetBackgroundColour(STRIPE_COLOUR)
+        return attr
+
+
+class ModelGridTable(wx.grid.GridTableBase):
+    """
+    Виртуальная таблица: значения запрашиваются у модели только для отображаемых ячеек.
+    Изменения в модель вносятся командами GridEditor, поэтому SetValue ничего не делает.
+    """
+
+    def __init__(self, model, attr_provider: CellAttrProvider):
+        super().__init__()
+        self.model = model
+        self.attr_provider = attr_provider
+        self._columns = model.get_columns()
+        self._rows_count = model.total_rows()
+
+    def GetNumberRows(self):
+        return self._rows_count
+
+    def GetNumberCols(self):
+        return len(self._columns)
+
+    def GetValue(self, row, col):
+        return self.model.get_value_at(col, row)
+
+    def SetValue(self, row, col, value): ...
+
+    def IsEmptyCell(self, row, col):
+        return False
+
+    def GetColLabelValue(self, col):
+        return get_col_label(self.model, col, self._columns[col])
+
+    def GetAttr(self, row, col, kind):
+        attr = self.attr_provider.get_attr(row, col)
+        attr.IncRef()
+        return attr
+
+    def reset(self, view: wx.grid.Grid):
+        """Синхронизирует размеры таблицы в view с моделью и перерисовывает видимую часть."""
+        self._columns = self.model.get_columns()
+        self._rows_count = self.model.total_rows()
+        self.attr_provider.set_columns(self._columns)
+        view.BeginBatch()
+        try:
+            self._notify_size(
+                view,
+                view.GetNumberRows(),
+                self._rows_count,
+                wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED,
+                wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
+            )
+            self._notify_size(
+                view,
+                view.GetNumberCols(),
+                len(self._columns),
+                wx.grid.GRIDTABLE_NOTIFY_COLS_DELETED,
+                wx.grid.GRIDTABLE_NOTIFY_COLS_APPENDED,
+            )
+        finally:
+            view.EndBatch()
+        view.ForceRefresh()
+
+    def notify_rows_inserted(self, view: wx.grid.Grid, pos, count):
+        self._rows_count += count
+        msg = wx.grid.GridTableMessage(self, wx.grid.GRIDTABLE_NOTIFY_ROWS_INSERTED, pos, count)
+        view.ProcessTableMessage(msg)
+
+    def notify_rows_deleted(self, view: wx.grid.Grid, pos, count):
+        self._rows_count -= count
+        view.ProcessTableMessage(wx.grid.GridTableMessage(self, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED, pos, count))
+
+    def _notify_size(self, view: wx.grid.Grid, current, new, delete_msg, append_msg):
+        if new < current:
+            view.ProcessTableMessage(wx.grid.GridTableMessage(self, delete_msg, new, current - new))
+        elif new > current:
+            view.ProcessTableMessage(wx.grid.GridTableMessage(self, append_msg, new - current))
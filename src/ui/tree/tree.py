@@ -1,4 +1,6 @@
 import dataclasses
+import logging
+import threading
 import typing
 
 import wx
@@ -16,6 +18,11 @@ class Context:
     node: TreeNode
     subnodes: typing.List[TreeNode] = dataclasses.field(default_factory=lambda: [])
     is_subnodes_loaded: bool = False
+    is_subnodes_loading: bool = False
+    # Номер актуальной фоновой загрузки, результаты с другим номером отбрасываются
+    loading_token: int = 0
+    # Сколько уровней первых дочерних узлов раскрыть после фоновой загрузки
+    expand_depth: int = 0
 
 
 @dataclasses.dataclass
@@ -24,7 +31,7 @@ class DeputyContext:
 
 
 class TreeWidget(wx.Panel):
-    def __init__(self, parent, use_icons=True):
+    def __init__(self, parent, use_icons=True, async_load=False):
         super().__init__(parent)
         self.SetDoubleBuffered(True)
 
@@ -41,58 +48,115 @@ class TreeWidget(wx.Panel):
         self.SetSizer(main_sizer)
 
         self._root_node = None
+        # Индекс ключ узла -> элемент дерева, поддерживается при добавлении и удалении элементов
+        self._items: typing.Dict[typing.Hashable, wx.TreeItemId] = {}
+        self._async_load = async_load
+        # Увеличивается при смене корня, чтобы отбросить результаты загрузок для старого дерева
+        self._load_generation = 0
 
         self.Layout()
 
         self._synthetic_expand = False
+        # Обработчик нужен всегда, чтобы индекс элементов не ссылался на удаленные элементы
+        self._tree.Bind(wx.EVT_TREE_DELETE_ITEM, self._on_native_item_deleted)
 
     def bind_all(self):
         self._tree.Bind(wx.EVT_TREE_ITEM_EXPANDED, self._on_native_item_expanded)
+        self._tree.Bind(wx.EVT_TREE_ITEM_COLLAPSED, self._on_native_item_collapsed)
         self._tree.Bind(wx.EVT_TREE_SEL_CHANGED, self._on_native_item_selection_changed)
         self._tree.Bind(wx.EVT_TREE_ITEM_ACTIVATED, self._on_native_item_activated)
         self._tree.Bind(wx.EVT_TREE_ITEM_MENU, self._on_native_item_menu)
 
     def unbind_all(self):
         self._tree.Unbind(wx.EVT_TREE_ITEM_EXPANDED, handler=self._on_native_item_expanded)
+        self._tree.Unbind(wx.EVT_TREE_ITEM_COLLAPSED, handler=self._on_native_item_collapsed)
         self._tree.Unbind(wx.EVT_TREE_SEL_CHANGED, handler=self._on_native_item_selection_changed)
         self._tree.Unbind(wx.EVT_TREE_ITEM_ACTIVATED, handler=self._on_native_item_activated)
         self._tree.Unbind(wx.EVT_TREE_ITEM_MENU, handler=self._on_native_item_menu)
 
     def set_root_node(self, root_node: TreeNode):
+        self._load_generation += 1
         if self._root_node is not None:
             self._tree.DeleteAllItems()
+        self._items.clear()
         self._root_node = root_node
-        self._tree.AddRoot("Объекты")
-        self._tree.SetItemData(self._tree.GetRootItem(), Context(root_node))
-        self._load_subnodes(self._tree.GetRootItem())
+        root_item = self._tree.AddRoot("Объекты")
+        self._tree.SetItemData(root_item, Context(root_node))
+        self._items[root_node.get_key()] = root_item
+        if self._async_load and not root_node.is_leaf():
+            self._tree.AppendItem(root_item, "[Загрузка]", data=DeputyContext())
+            self._load_subnodes_async(root_item)
+        else:
+            self._load_subnodes(root_item)
 
-    def _find_native_item(self, node: TreeNode, root_native_item=None, depth=-1):
-        if depth == 0:
+    def _find_native_item(self, node: TreeNode, parent_native_item=None):
+        item = self._items.get(node.get_key())
+        if item is None or not item.IsOk():
             return None
-
-        p = root_native_item if root_native_item is not None else self._tree.GetRootItem()
-        p_context = self._tree.GetItemData(p)
-        if isinstance(p_context, Context) and p_context.node.__eq__(node):
-            return p
-
-        item, _ = self._tree.GetFirstChild(p)
-
-        while item.IsOk():
-            context = self._tree.GetItemData(item)
-            if isinstance(context, Context) and context.node.__eq__(node):
-                return item
-            child_item = self._find_native_item(node, item, depth - 1 if depth != -1 else -1)
-            if child_item is not None:
-                return child_item
-            item = self._tree.GetNextSibling(item)
-
-        return None
+        if parent_native_item is not None and self._tree.GetItemParent(item) != parent_native_item:
+            return None
+        return item
 
     def _load_subnodes(self, native_item: wx.TreeItemId):
         context: Context = self._tree.GetItemData(native_item)
         if not context.is_subnodes_loaded and not context.node.is_leaf():
+            # Синхронная загрузка отменяет фоновую, если она еще идет
+            context.loading_token += 1
+            context.is_subnodes_loading = False
             context.subnodes = context.node.get_subnodes()
             context.is_subnodes_loaded = True
+            self._apply_subnodes(native_item, context)
+
+    def _load_subnodes_async(self, native_item: wx.TreeItemId, expand_depth=0):
+        context: Context = self._tree.GetItemData(native_item)
+        if context.is_subnodes_loaded or context.node.is_leaf():
+            self._expand_first_child(native_item, expand_depth)
+            return
+        context.expand_depth = expand_depth
+        if context.is_subnodes_loading:
+            return
+        context.is_subnodes_loading = True
+        context.loading_token += 1
+        token = (self._load_generation, context.loading_token)
+        node = context.node
+
+        def load():
+            try:
+                subnodes = node.get_subnodes()
+            except Exception as e:
+                wx.CallAfter(self._on_subnodes_load_failed, native_item, context, token, e)
+            else:
+                wx.CallAfter(self._on_subnodes_loaded, native_item, context, token, subnodes)
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def _is_actual_load(self, context: Context, token) -> bool:
+        return self.__nonzero__() and token == (self._load_generation, context.loading_token)
+
+    def _on_subnodes_loaded(self, native_item: wx.TreeItemId, context: Context, token, subnodes):
+        if not self._is_actual_load(context, token) or context.is_subnodes_loaded:
+            return
+        context.is_subnodes_loading = False
+        context.subnodes = subnodes
+        context.is_subnodes_loaded = True
+        self._apply_subnodes(native_item, context)
+        if native_item == self._tree.GetRootItem() or self._tree.IsExpanded(native_item):
+            self._expand_first_child(native_item, context.expand_depth)
+
+    def _on_subnodes_load_failed(self, native_item: wx.TreeItemId, context: Context, token, e: Exception):
+        if not self._is_actual_load(context, token):
+            return
+        context.is_subnodes_loading = False
+        context.expand_depth = 0
+        # Заместитель остается на месте, узел сворачивается, чтобы следующее раскрытие повторило загрузку
+        if native_item != self._tree.GetRootItem() and self._tree.IsExpanded(native_item):
+            self._tree.Collapse(native_item)
+        logging.error("Не удалось загрузить дочерние объекты: %s" % e, exc_info=e)
+        wx.MessageBox(
+            "Не удалось загрузить дочерние объекты:\n%s" % e, "Ошибка загрузки", wx.OK | wx.CENTRE | wx.ICON_ERROR
+        )
+
+    def _apply_subnodes(self, native_item: wx.TreeItemId, context: Context):
         first_item, cookies = self._tree.GetFirstChild(native_item)
         _item_deputy = None
         if first_item.IsOk():
@@ -180,21 +244,21 @@ class TreeWidget(wx.Panel):
                 _subnodes_to_delete = []
 
                 subnodes = context.node.get_subnodes()
+                subnodes_keys = set()
 
                 for index, node in enumerate(subnodes):
-                    item = self._find_native_item(node, native_item, 1)
+                    subnodes_keys.add(node.get_key())
+                    item = self._find_native_item(node, native_item)
                     if item is None:
                         self._append_node(native_item, node, index)
 
                 item, cookie = self._tree.GetFirstChild(native_item)
-                i = 0
                 while item.IsOk():
                     context: Context = self._tree.GetItemData(item)
-                    if context.node not in subnodes:
+                    if not isinstance(context, Context) or context.node.get_key() not in subnodes_keys:
                         _subnodes_to_delete.append(item)
 
                     item = self._tree.GetNextSibling(item)
-                    i += 1
 
                 for item in _subnodes_to_delete:
                     self._tree.Delete(item)
@@ -216,6 +280,7 @@ class TreeWidget(wx.Panel):
             item = native_item
             self._tree.SetItemText(item, node.get_name())
             self._tree.SetItemData(item, Context(node))
+        self._items[node.get_key()] = item
 
         if self._use_icons:
             icon = node.get_icon()
@@ -226,27 +291,55 @@ class TreeWidget(wx.Panel):
                 self._tree.SetItemImage(item, self._apply_icon(icon_open[0], icon_open[1]), wx.TreeItemIcon_Expanded)
         if node.is_name_bold():
             self._tree.SetItemBold(item)
-        if not node.is_leaf():
+        # Узлы, про которые заранее известно, что они пусты, показываются как листья
+        if not node.is_leaf() and node.get_subnodes_count() != 0:
             self._tree.AppendItem(item, "[Загрузка]", data=DeputyContext())
 
     def _on_native_item_expanded(self, event):
-        context: Context = self._tree.GetItemData(event.GetItem())
+        item = event.GetItem()
+        context: Context = self._tree.GetItemData(item)
+        expand_depth = 0 if self._synthetic_expand else 2
         if not context.is_subnodes_loaded:
-            self._load_subnodes(event.GetItem())
+            if self._async_load:
+                self._load_subnodes_async(item, expand_depth)
+                return
+            self._load_subnodes(item)
+        self._expand_first_child(item, expand_depth)
 
-        if self._synthetic_expand:
+    def _expand_first_child(self, native_item: wx.TreeItemId, depth: int):
+        if depth <= 0:
+            return
+        item, _ = self._tree.GetFirstChild(native_item)
+        if not item.IsOk() or not isinstance(self._tree.GetItemData(item), Context):
             return
-
-        item, _ = self._tree.GetFirstChild(event.GetItem())
-        i = 0
         self._synthetic_expand = True
         try:
-            while item.IsOk() and i < 2:
-                self._tree.Expand(item)
-                item, _ = self._tree.GetFirstChild(item)
-                i += 1
+            self._tree.Expand(item)
         finally:
             self._synthetic_expand = False
+        context: Context = self._tree.GetItemData(item)
+        if context.is_subnodes_loaded:
+            self._expand_first_child(item, depth - 1)
+        else:
+            context.expand_depth = depth - 1
+
+    def _on_native_item_collapsed(self, event: wx.TreeEvent):
+        context = self._tree.GetItemData(event.GetItem())
+        if isinstance(context, Context) and context.is_subnodes_loading:
+            context.loading_token += 1
+            context.is_subnodes_loading = False
+        event.Skip()
+
+    def _on_native_item_deleted(self, event: wx.TreeEvent):
+        item = event.GetItem()
+        context = self._tree.GetItemData(item)
+        if isinstance(context, Context):
+            context.loading_token += 1
+            context.is_subnodes_loading = False
+            key = context.node.get_key()
+            if self._items.get(key) == item:
+                del self._items[key]
+        event.Skip()
 
     def _on_native_item_selection_changed(self, event: wx.TreeEvent):
         if not self.__nonzero__():
@@ -1,4 +1,4 @@
-from typing import List, Protocol, Tuple
+from typing import Hashable, List, Protocol, Tuple
 
 import wx
 
@@ -28,11 +28,22 @@ class TreeNode(Protocol):
     def get_subnodes(self) -> List["TreeNode"]:
         return []
 
+    def get_subnodes_count(self) -> int | None:
+        """Количество дочерних узлов, если оно известно заранее, иначе None."""
+        return None
+
     def is_leaf(self) -> bool:
         return False
 
     def is_root(self) -> bool:
         return False
 
+    def get_key(self) -> Hashable:
+        """Стабильный ключ узла: класс узла, класс сущности и ее RID. Должен быть согласован с __eq__."""
+        o = getattr(self, "o", None)
+        if o is None:
+            return (self.__class__.__name__,)
+        return (self.__class__.__name__, o.__class__.__name__, o.RID)
+
     def __eq__(self, o):
         raise NotImplementedError("Method __eq__() not implemented.")
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from src.pm.aliases import NameAliases
+
+
+class NameAliasesTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self._dir.name, "aliases", "pm.json")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_round_trip(self):
+        aliases = NameAliases(self.filename)
+        aliases.add("property", "Плотн.", 3)
+        aliases.add("method", "ГОСТ 21153", 7)
+        aliases.flush()
+
+        loaded = NameAliases(self.filename)
+        self.assertEqual(loaded.get("property", "Плотн."), 3)
+        self.assertEqual(loaded.get("method", "ГОСТ 21153"), 7)
+        self.assertIsNone(loaded.get("property", "ГОСТ 21153"))
+        self.assertIsNone(loaded.get("equipment", "Плотн."))
+
+    def test_remove(self):
+        aliases = NameAliases(self.filename)
+        aliases.add("property", "Плотн.", 3)
+        aliases.flush()
+
+        aliases.remove("property", "Плотн.")
+        aliases.flush()
+        self.assertIsNone(NameAliases(self.filename).get("property", "Плотн."))
+
+    def test_flush_without_changes(self):
+        aliases = NameAliases(self.filename)
+        aliases.remove("property", "Плотн.")
+        aliases.flush()
+        self.assertFalse(os.path.exists(self.filename))
+
+        aliases.add("property", "Плотн.", 3)
+        aliases.flush()
+        os.utime(self.filename, (0, 0))
+        # Повторное добавление того же сопоставления файл не перезаписывает
+        aliases.add("property", "Плотн.", 3)
+        aliases.flush()
+        self.assertEqual(os.path.getmtime(self.filename), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
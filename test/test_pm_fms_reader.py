@@ -0,0 +1,78 @@
+import unittest
+
+from src.pm.fms_reader import HANDMADE_PROPS, PROPS, _cell_text, find_header
+
+_SAMPLE_COLUMNS = [
+    "Отчет по х/д №",
+    "Дата заключения х/д",
+    "№ пробы",
+    "Месторождение",
+    "№ скважины",
+    "№ ящиков",
+    "",
+    "",
+    "Тип каменного материала",
+    "№ образца",
+    "Диаметр, см",
+    "Высота, см",
+    "Петротип",
+    "Описание структуры петротипа",
+    "Масса в воздушно-сухом состоянии, г",
+]
+
+
+def _make_columns():
+    return _SAMPLE_COLUMNS + HANDMADE_PROPS + [""] * (max(offset for _, _, _, offset in PROPS) + 1)
+
+
+class FindHeaderTest(unittest.TestCase):
+    def test_sample_fields(self):
+        h = find_header(_make_columns())
+        self.assertEqual(h.test_series_field, 0)
+        self.assertEqual(h.doc_date_field, 1)
+        self.assertEqual(h.box_number_field, 5)
+        self.assertEqual((h.depth_start_field, h.depth_end_field), (6, 7))
+        self.assertEqual(h.sample_field, 9)
+        self.assertEqual(h.mass_air_dry_field, 14)
+
+    def test_properties(self):
+        h = find_header(_make_columns())
+        self.assertEqual(len(h.properties), len(HANDMADE_PROPS) + len(PROPS))
+        handmade = h.properties[: len(HANDMADE_PROPS)]
+        self.assertTrue(all(p.is_handmade_property for p in handmade))
+        self.assertEqual([p.field for p in handmade], list(range(15, 15 + len(HANDMADE_PROPS))))
+
+        measured = {p.name: p for p in h.properties[len(HANDMADE_PROPS) :]}
+        self.assertFalse(any(p.is_handmade_property for p in measured.values()))
+        moisture = measured["Естественная влажность"]
+        self.assertEqual((moisture.field, moisture.method, moisture.equipment), (20, 21, 22))
+        # Нагрузка и предел прочности при сжатии - одно испытание с общими методом и оборудованием
+        load = measured["Разрушающая нагрузка при одноосном сжатии"]
+        strength = measured["Предел прочности при одноосном сжатии"]
+        self.assertEqual(strength.field, load.field + 1)
+        self.assertEqual((strength.method, strength.equipment), (load.method, load.equipment))
+        abrasion = measured["Показатель абразивности"]
+        self.assertEqual(abrasion.equipment, len(_make_columns()) - 1)
+
+    def test_missing_column(self):
+        columns = _make_columns()
+        columns.remove("Петротип")
+        with self.assertRaises(ValueError):
+            find_header(columns)
+
+    def test_missing_property_columns(self):
+        with self.assertRaises(ValueError):
+            find_header(_make_columns()[:-1])
+
+
+class CellTextTest(unittest.TestCase):
+    def test_cell_text(self):
+        self.assertEqual(_cell_text(None), "")
+        self.assertEqual(_cell_text(12.0), "12")
+        self.assertEqual(_cell_text(1.5), "1.5")
+        self.assertEqual(_cell_text(7), "7")
+        self.assertEqual(_cell_text(" ГОСТ 21153 "), " ГОСТ 21153 ")
+
+
+if __name__ == "__main__":
+    unittest.main()
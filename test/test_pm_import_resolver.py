@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from dataclasses import dataclass
+
+from src.pm.aliases import NameAliases
+from src.pm.import_resolver import _FuzzyIndex
+
+
+@dataclass(frozen=True)
+class _Object:
+    RID: int
+    Name: str
+
+
+class FuzzyIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.aliases = NameAliases(os.path.join(self._dir.name, "aliases.json"))
+        self.density = _Object(1, "Плотность")
+        self.elasticity = _Object(2, "Модуль упругости")
+        self.index = self._make_index([self.density, self.elasticity])
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _make_index(self, objects):
+        return _FuzzyIndex("Свойство", objects, lambda o: o.Name, 90, self.aliases, "property")
+
+    def test_exact(self):
+        self.assertIs(self.index.find("Плотность"), self.density)
+        self.assertEqual(self.index.get_ambiguous(), [])
+
+    def test_alias(self):
+        self.aliases.add("property", "Плотн.", self.density.RID)
+        self.assertIs(self.index.find("Плотн."), self.density)
+
+    def test_fuzzy(self):
+        self.assertIs(self.index.find("Модуль упругостм"), self.elasticity)
+        self.assertIsNone(self.index.find("Коэффициент Пуассона"))
+
+    def test_stale_alias_removed(self):
+        self.aliases.add("property", "Пуассон", 99)
+        self.assertIsNone(self.index.find("Пуассон"))
+        self.assertIsNone(self.aliases.get("property", "Пуассон"))
+
+    def test_add_keeps_matches(self):
+        self.assertIs(self.index.find("Модуль упругостм"), self.elasticity)
+        self.assertIsNone(self.index.find("Коэффициент Пуассонa"))
+
+        poisson = _Object(3, "Коэффициент Пуассона")
+        self.index.add(poisson)
+        # Строка без совпадения ищется заново, найденное ранее совпадение сохраняется
+        self.assertIs(self.index.find("Коэффициент Пуассонa"), poisson)
+        self.index.learn_aliases()
+        self.assertEqual(self.aliases.get("property", "Модуль упругостм"), self.elasticity.RID)
+        # Объекта не было в БД при создании индекса, сопоставление с ним не запоминается
+        self.assertIsNone(self.aliases.get("property", "Коэффициент Пуассонa"))
+
+    def test_ambiguous(self):
+        index = self._make_index([_Object(1, "Модуль упругости"), _Object(2, "Модуль упругости ")])
+        self.assertIsNotNone(index.find("Модуль упругостм"))
+        ambiguous = index.get_ambiguous()
+        self.assertEqual(len(ambiguous), 1)
+        self.assertEqual(ambiguous[0][0], "Модуль упругостм")
+        self.assertEqual(len(ambiguous[0][1]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
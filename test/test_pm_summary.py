@@ -0,0 +1,76 @@
+import unittest
+from dataclasses import dataclass
+from datetime import date
+from types import SimpleNamespace
+
+from src.pm.summary import _to_pyformat, filter_key, make_samples_where
+
+
+@dataclass(frozen=True)
+class _Object:
+    RID: int
+
+
+def _make_filter(**kwargs):
+    fields = {
+        "use_filter": True,
+        "test_series": None,
+        "fields": None,
+        "petrotypes": None,
+        "test_date_from": None,
+        "test_date_to": None,
+        "exclude_none_test_date": False,
+        "properties": None,
+        "properties_hide_no_values_samples": False,
+    }
+    fields.update(kwargs)
+    return SimpleNamespace(**fields)
+
+
+class FilterKeyTest(unittest.TestCase):
+    def test_disabled_filter(self):
+        self.assertEqual(filter_key(_make_filter(use_filter=False)), (False,))
+        self.assertEqual(
+            filter_key(_make_filter(use_filter=False, fields=[_Object(1)])), filter_key(_make_filter(use_filter=False))
+        )
+
+    def test_order_independent(self):
+        a = _make_filter(fields=[_Object(3), _Object(1)], properties=[_Object(5), _Object(4)])
+        b = _make_filter(fields=[_Object(1), _Object(3)], properties=[_Object(4), _Object(5)])
+        self.assertEqual(filter_key(a), filter_key(b))
+
+    def test_none_differs_from_empty(self):
+        self.assertNotEqual(filter_key(_make_filter(fields=None)), filter_key(_make_filter(fields=[])))
+
+    def test_dates(self):
+        a = _make_filter(test_date_from=date(2024, 1, 2))
+        self.assertEqual(filter_key(a), filter_key(_make_filter(test_date_from=date(2024, 1, 2))))
+        self.assertNotEqual(filter_key(a), filter_key(_make_filter(test_date_to=date(2024, 1, 2))))
+        self.assertNotEqual(filter_key(a), filter_key(_make_filter(test_date_from=date(2024, 1, 3))))
+
+
+class MakeSamplesWhereTest(unittest.TestCase):
+    def test_disabled_filter(self):
+        self.assertEqual(make_samples_where(_make_filter(use_filter=False, fields=[_Object(1)])), ("TRUE", {}))
+
+    def test_conditions(self):
+        where, params = make_samples_where(
+            _make_filter(fields=[_Object(2)], test_date_to=date(2024, 1, 2), exclude_none_test_date=True)
+        )
+        self.assertIn('ss."MOID" = ANY($field_rids)', where)
+        self.assertIn('ss."TestDate" <= $date_to', where)
+        self.assertIn('ss."TestDate" IS NOT NULL', where)
+        self.assertNotIn("$date_from", where)
+        self.assertEqual(params, {"field_rids": [2], "date_to": 20240102000000})
+
+
+class ToPyformatTest(unittest.TestCase):
+    def test_params(self):
+        self.assertEqual(
+            _to_pyformat("""SELECT * FROM t WHERE name ILIKE 'a%' AND rid = ANY($rids) AND d >= $date_from"""),
+            """SELECT * FROM t WHERE name ILIKE 'a%%' AND rid = ANY(%(rids)s) AND d >= %(date_from)s""",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()